@@ -11,6 +11,38 @@ import time
 load_dotenv()
 API_BASE = os.getenv('API_BASE')
 # print(API_BASE)
+# how long role-gated page data is reused across reruns before asking the API again
+PAGE_CACHE_TTL = int(os.getenv('PAGE_CACHE_TTL', 30))
+
+
+@st.cache_resource
+def get_session():
+    # one keep-alive connection pool for the whole Streamlit server instead of a new TCP connection per call.
+    # only bearer headers are sent per request, nothing user specific is kept on the session
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=32)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+api = get_session()
+
+
+class PageError(Exception):
+    def __init__(self, status_code):
+        super().__init__(status_code)
+        self.status_code = status_code
+
+
+@st.cache_data(ttl=PAGE_CACHE_TTL, show_spinner=False)
+def fetch_page(path, token):
+    # cached per (path, token), so every user only sees their own data; errors raise and are not cached
+    response = api.get(f"{API_BASE}{path}", headers={"Authorization": f"Bearer {token}"})
+    if response.status_code != 200:
+        raise PageError(response.status_code)
+    return response.json()
+
+
 if "page" not in st.session_state:
     st.session_state.page = "home"
 
@@ -64,9 +96,10 @@ def login():
         # with st.spinner("Authenticating..."):
         placeholder = st.empty()
         placeholder.info("Authenticating...")
-        response = requests.post(
+        # include_profile returns the profile with the tokens, no second request to /profile
+        response = api.post(
             f"{API_BASE}/token",
-            {
+            data={
                 "grant_type": "password",
                 "username": username,
                 "password": password,
@@ -74,6 +107,7 @@ def login():
                 "client_id": "",
                 "client_secret": ""
             },
+            params={"include_profile": "true"},
             headers={"Content-Type": "application/x-www-form-urlencoded"}
         )
 
@@ -82,14 +116,18 @@ def login():
             time.sleep(1)  # simulate delay
 
             token_response = response.json()
-            get_response = requests.get(f"{API_BASE}/profile",
-                        headers={"Authorization": f"Bearer {token_response['access_token']}"}
-                        )
-            if get_response.status_code == 200:
+            profile_data = token_response.get("profile")
+            if profile_data is None:
+                # older backend without include_profile
+                get_response = api.get(f"{API_BASE}/profile",
+                            headers={"Authorization": f"Bearer {token_response['access_token']}"}
+                            )
+                profile_data = get_response.json() if get_response.status_code == 200 else None
+            if profile_data is not None:
                 #Save token and profile data to session state
                 st.session_state.token = token_response['access_token']
                 print(st.session_state.token)
-                st.session_state.profile_data = get_response.json()
+                st.session_state.profile_data = profile_data
                 st.session_state.page = "profile"
                 st.rerun()
             else:
@@ -120,7 +158,7 @@ def signup():
         placeholder.info("Signing In...")
         if new_password == confirm_password:
             payload = {"username": new_user, "hashed_password": new_password, "full_name":fullname, "email":emailId, "role":"user"}
-            response = requests.post(f"{API_BASE}/signup", json=payload)
+            response = api.post(f"{API_BASE}/signup", json=payload)
             if response.status_code == 200:
                 placeholder.success("User created successfully. Please log in.")
                 st.session_state.page = "login"
@@ -142,7 +180,7 @@ def forgot_password():
     email = st.text_input("Enter your registered email")
 
     if st.button("Send Reset Link"):
-        response = requests.post(
+        response = api.post(
             f"{API_BASE}/forgot-password",
             json={"username":username,"email": email}
         )
@@ -175,7 +213,7 @@ def reset_password():
         if new_password == confirm_password:
             with placeholder:
                 st.info("Resetting password...")
-            response = requests.post(
+            response = api.post(
                 f"{API_BASE}/reset-password",
                 data={"token": token, "new_password": new_password},
                 headers={"Content-Type": "application/x-www-form-urlencoded"}
@@ -223,25 +261,17 @@ def profile():
 def show_admin_dashboard():
     st.header("Admin Dashboard")
     token = st.session_state.token
-    response = requests.get(
-        f"{API_BASE}/admin/dashboard",
-        headers={"Authorization": f"Bearer {token}"}
-    )
-    if response.status_code == 200:
-        st.success(response.json()["msg"])
-    else:
+    try:
+        st.success(fetch_page("/admin/dashboard", token)["msg"])
+    except PageError:
         st.error("Access denied.")
 
 def show_reports():
     st.header("📊 Reports Page")
     token = st.session_state.token
-    response = requests.get(
-        f"{API_BASE}/reports",
-        headers={"Authorization": f"Bearer {token}"}
-    )
-    if response.status_code == 200:
-        st.info(response.json()["msg"])
-    else:
+    try:
+        st.info(fetch_page("/reports", token)["msg"])
+    except PageError:
         st.error("You are not authorized to view this.")
 
 
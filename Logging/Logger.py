@@ -1,35 +1,224 @@
+import atexit
+import copy
+import json
 import logging
 import os
+import queue
+import threading
 from datetime import datetime
+from logging.handlers import QueueHandler
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, for log shippers."""
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record, self.datefmt),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class DailyRotatingFileHandler(logging.Handler):
+    """
+    Writes to `<dir>/<YYYY-MM-DD>.log` and switches files when the date changes.
+    When `max_bytes` is set, a file that grows past it is rolled to `<date>.1.log`,
+    `<date>.2.log`, ... Records are not flushed one by one; the listener flushes
+    once per batch.
+    """
+
+    def __init__(self, directory, max_bytes=0, encoding="utf-8"):
+        super().__init__()
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.encoding = encoding
+        self._date = None
+        self._stream = None
+        self._size = 0
+
+    def _open(self, date):
+        self.close_stream()
+        # created on the first write rather than when the logger is set up
+        os.makedirs(self.directory, exist_ok=True)
+        self._date = date
+        path = os.path.join(self.directory, f"{date}.log")
+        self._stream = open(path, "a", encoding=self.encoding)
+        self._size = self._stream.tell()
+
+    def _roll_over(self):
+        # keep today's newest records in <date>.log and push older parts to <date>.N.log
+        self.close_stream()
+        base = os.path.join(self.directory, self._date)
+        index = 1
+        while os.path.exists(f"{base}.{index}.log"):
+            index += 1
+        for i in range(index, 1, -1):
+            os.replace(f"{base}.{i - 1}.log", f"{base}.{i}.log")
+        os.replace(f"{base}.log", f"{base}.1.log")
+        self._open(self._date)
+
+    def emit(self, record):
+        try:
+            date = datetime.fromtimestamp(record.created).strftime('%Y-%m-%d')
+            if date != self._date or self._stream is None:
+                self._open(date)
+            line = self.format(record) + "\n"
+            if self.max_bytes and self._size and self._size + len(line) > self.max_bytes:
+                self._roll_over()
+            self._stream.write(line)
+            self._size += len(line)
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        if self._stream is not None:
+            self._stream.flush()
+
+    def close_stream(self):
+        if self._stream is not None:
+            self._stream.flush()
+            self._stream.close()
+            self._stream = None
+
+    def close(self):
+        self.close_stream()
+        super().close()
+
+
+_traceback_formatter = logging.Formatter()
+
+
+class DroppingQueueHandler(QueueHandler):
+    # never block the caller: when the writer falls behind, records are dropped and counted
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # resolve the message and traceback text here (tracebacks hold frames that can't wait on a queue),
+        # but keep them apart so each formatter can lay them out itself
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _traceback_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class BatchingQueueListener:
+    """Background writer: drains everything queued, hands it to the handler and flushes once per batch."""
+
+    def __init__(self, log_queue, handler, batch_size=500):
+        self.queue = log_queue
+        self.handler = handler
+        self.batch_size = batch_size
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._monitor, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def _monitor(self):
+        while True:
+            record = self.queue.get()
+            if record is None:
+                break
+            self.handler.handle(record)
+            stop = False
+            for _ in range(self.batch_size - 1):
+                try:
+                    record = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if record is None:
+                    stop = True
+                    break
+                self.handler.handle(record)
+            self.handler.flush()
+            if stop:
+                break
+        self.handler.close()
+
+    def stop(self):
+        if self._thread is not None:
+            self.queue.put(None)
+            self._thread.join()
+            self._thread = None
+
 
 class CustomLogger:
     default_log_directory = "/Logging/logs"
+    max_bytes = int(os.getenv("LOG_MAX_BYTES", 10 * 1024 * 1024))
+    queue_size = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+    json_format = os.getenv("LOG_FORMAT", "text").lower() == "json"
+
+    # one queue + writer thread per log directory, shared by every logger writing there
+    _queue_handlers = {}
+    _listeners = {}
+    _lock = threading.Lock()
 
-    def __init__(self, logger_name=None, dir_name=None):
+    def __init__(self, logger_name=None, dir_name=None, json_format=None):
         self.logger_name = logger_name or __name__
         self.dir_name = dir_name or self.default_log_directory
+        if json_format is not None:
+            self.json_format = json_format
 
         self.logger = logging.getLogger(self.logger_name)
         self.logger.setLevel(logging.DEBUG)
 
-        formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
-
-        # Ensure the specified directory exists within the default_log_directory
+        # the directory is created by the file handler when the first record is written
         logs_directory = os.path.join(os.path.dirname(__file__), self.default_log_directory)
-        os.makedirs(logs_directory, exist_ok=True)
-
-        # Create the specified subdirectory within default_log_directory
         specified_logs_directory = os.path.join(logs_directory, self.dir_name)
-        os.makedirs(specified_logs_directory, exist_ok=True)
-
-        log_file = self.get_log_file_path()
-        file_handler = logging.FileHandler(log_file)
-        file_handler.setLevel(logging.DEBUG)
-        file_handler.setFormatter(formatter)
 
         # Check if logger has handlers already to avoid adding multiple handlers
         if not self.logger.handlers:
-            self.logger.addHandler(file_handler)
+            self.logger.addHandler(self._get_queue_handler(specified_logs_directory))
+
+    def _get_queue_handler(self, directory):
+        with CustomLogger._lock:
+            queue_handler = CustomLogger._queue_handlers.get(directory)
+            if queue_handler is None:
+                if self.json_format:
+                    formatter = JsonFormatter(datefmt='%Y-%m-%d %H:%M:%S')
+                else:
+                    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+                file_handler = DailyRotatingFileHandler(directory, max_bytes=self.max_bytes)
+                file_handler.setLevel(logging.DEBUG)
+                file_handler.setFormatter(formatter)
+
+                # the request thread only puts the record on the queue, file I/O happens on the writer thread
+                log_queue = queue.Queue(maxsize=self.queue_size)
+                queue_handler = DroppingQueueHandler(log_queue)
+                queue_handler.setLevel(logging.DEBUG)
+                listener = BatchingQueueListener(log_queue, file_handler)
+                listener.start()
+                CustomLogger._queue_handlers[directory] = queue_handler
+                CustomLogger._listeners[directory] = listener
+        return queue_handler
+
+    @classmethod
+    def shutdown(cls):
+        # flush and close every writer, registered with atexit
+        with cls._lock:
+            listeners = list(cls._listeners.values())
+            cls._listeners.clear()
+            cls._queue_handlers.clear()
+        for listener in listeners:
+            listener.stop()
 
     def get_logger(self):
         return self.logger
@@ -44,3 +233,4 @@ class CustomLogger:
         return log_file_path
 
 
+atexit.register(CustomLogger.shutdown)
@@ -1,9 +1,10 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
-from models import TokenData, UserInDB, User
-from database import get_user
-from utils import SECRET_KEY, ALGORITHM
+from jose import JWTError
+from models import TokenData, UserInDB, User, TokenUser
+from database import get_user, token_cache, revocation_list
+from utils import key_ring, AUTH_MODE
+from metrics import metrics
 
 # OAuth2PasswordBearer defines the token URL endpoint for authentication.
 # FastAPI will expect the token to be passed in the Authorization header as "Bearer <token>"
@@ -18,24 +19,44 @@ def get_current_user(token: str = Depends(oauth2_scheme)):
             detail="Invalid authentication credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
+        # A token seen recently was already verified, reuse its claims and user. Claims-only routes cache
+        # a TokenUser under the same token; it has no stored fields, so the user is looked up below.
+        cached = token_cache.get(token)
+        if cached is not None and not isinstance(cached[1], TokenUser):
+            if revocation_list.is_revoked(cached[0].get("jti")):
+                raise credentials_exception
+            return cached[1]
         try:
             # Decode the JWT token using the secret key and algorithm
-            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            with metrics.timer("jwt_decode"):
+                payload = key_ring.decode(token)
             username = payload.get("sub")
             role = payload.get("role")
 
             # If either username or role is missing, reject the request
             if username is None or role is None:
                 raise credentials_exception
+            # logged out / revoked tokens; a Bloom filter answers the usual "not revoked" case
+            if revocation_list.is_revoked(payload.get("jti")):
+                raise credentials_exception
         except JWTError:
             raise credentials_exception
         # Fetch the user from database (based on username extracted from token)
+        generation = token_cache.generation(username)
         user = get_user(username=username)
         if user is None:
             raise credentials_exception
+        # tokens issued before a password change or disable carry an older version
+        if payload.get("ver", 0) < user.token_version:
+            raise credentials_exception
 
-        user.role = role  # attach role from token
+        # attach role from token; stored records are shared, so take a copy instead of changing it
+        if user.role != role:
+            user = user.replace(role=role)
+        token_cache.put(token, payload, user, generation)
         return user
+    except HTTPException:
+        raise
     except Exception as e:
         print("Error in get_current_user()",e)
 
@@ -46,8 +67,42 @@ def get_current_active_user( current_user: UserInDB = Depends(get_current_user))
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
+# Get the caller's identity from the signed JWT claims only, without touching the user store
+def get_current_token_user(token: str = Depends(oauth2_scheme)):
+    credentials_exception = HTTPException(
+        status_code=401,
+        detail="Invalid authentication credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    cached = token_cache.get(token)
+    if cached is not None:
+        payload, user = cached
+    else:
+        try:
+            with metrics.timer("jwt_decode"):
+                payload = key_ring.decode(token)
+        except JWTError:
+            raise credentials_exception
+        username = payload.get("sub")
+        role = payload.get("role")
+        if username is None or role is None:
+            raise credentials_exception
+        user = TokenUser(username, role, bool(payload.get("disabled", False)), int(payload.get("ver", 0)))
+        token_cache.put(token, payload, user)
+    if revocation_list.is_revoked(payload.get("jti")):
+        raise credentials_exception
+    # password changes and disables seen by this process raise the minimum accepted version
+    if user.token_version < token_cache.min_token_version(user.username):
+        raise credentials_exception
+    if user.disabled:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    return user
+
+# role-gated routes authorize from the token alone when AUTH_MODE=claims
+get_authorized_user = get_current_token_user if AUTH_MODE == "claims" else get_current_user
+
 # authorization 
-def require_admin(current_user: User = Depends(get_current_user)):
+def require_admin(current_user: User = Depends(get_authorized_user)):
     # If user is not admin, deny access
 
     if current_user.role != "admin":
@@ -60,8 +115,11 @@ def require_roles(allowed_roles: list[str]):
     Returns a dependency that checks whether the current user's role is in the allowed list.
     Useful for endpoints that allow multiple roles (e.g., admin, auditor).
     """
-    def role_checker(current_user: User = Depends(get_current_user)):
-        if current_user.role not in allowed_roles:
+    # built once per route, membership is a set lookup on every request
+    allowed = frozenset(allowed_roles)
+
+    def role_checker(current_user: User = Depends(get_authorized_user)):
+        if current_user.role not in allowed:
             raise HTTPException(status_code=403, detail="Access forbidden")
         return current_user
     return role_checker
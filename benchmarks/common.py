@@ -0,0 +1,137 @@
+"""Shared helpers for the benchmark suite: environment setup, timing and result files."""
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+BASELINE_FILE = os.path.join(RESULTS_DIR, "baseline.json")
+
+BENCH_USER = "bench_admin"
+BENCH_EMAIL = "bench_admin@example.com"
+BENCH_PASSWORD = "bench-password"
+
+# settings the app needs at import time; real values from the environment win
+BENCH_ENV = {
+    "SECRET_KEY": "benchmark-secret-key-benchmark-secret-key",
+    "ALGORITHM": "HS256",
+    "RESET_PASSWORD_SALT": "benchmark-reset-salt",
+    "API_BASE": "http://127.0.0.1:8000",
+    "EMAIL_TRANSPORT": "memory",
+    # the load test logs in as one user far more often than any real limit allows
+    "RATE_LIMIT_ENABLED": "false",
+}
+
+
+def prepare_environment(workdir: str = None) -> str:
+    """
+    Set up a scratch working directory holding a copy of db_users.json plus an admin
+    user with a known password, and point the app settings at it. Must run before
+    any app module is imported, since they read settings at import time.
+    """
+    for key, value in BENCH_ENV.items():
+        os.environ.setdefault(key, value)
+    workdir = workdir or tempfile.mkdtemp(prefix="auth-bench-")
+    users_file = os.path.join(workdir, "db_users.json")
+    shutil.copy(os.path.join(REPO_ROOT, "db_users.json"), users_file)
+
+    from passlib.context import CryptContext
+    with open(users_file) as file:
+        users = json.load(file)
+    users[0][BENCH_USER] = {
+        "username": BENCH_USER,
+        "email": BENCH_EMAIL,
+        "full_name": "Benchmark Admin",
+        "role": "admin",
+        "disabled": False,
+        "hashed_password": CryptContext(schemes=["bcrypt"]).hash(BENCH_PASSWORD),
+    }
+    with open(users_file, "w") as file:
+        json.dump(users, file, indent=4)
+
+    os.chdir(workdir)
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    return workdir
+
+
+def percentile(sorted_samples, pct):
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, max(0, round(pct / 100 * (len(sorted_samples) - 1))))
+    return sorted_samples[index]
+
+
+def summarize(samples, elapsed):
+    """Latency samples (seconds) and wall time -> p50/p95/p99 in ms and throughput."""
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "p50_ms": percentile(ordered, 50) * 1000,
+        "p95_ms": percentile(ordered, 95) * 1000,
+        "p99_ms": percentile(ordered, 99) * 1000,
+        "mean_ms": statistics.fmean(ordered) * 1000 if ordered else 0.0,
+        "ops_per_sec": len(ordered) / elapsed if elapsed else 0.0,
+    }
+
+
+def measure(func, iterations: int, warmup: int = 10):
+    """Time `func()` call by call."""
+    for _ in range(min(warmup, iterations)):
+        func()
+    samples = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - t0)
+    return summarize(samples, time.perf_counter() - started)
+
+
+def metadata():
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def save_results(results: dict, path: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as file:
+        json.dump({"meta": metadata(), "results": results}, file, indent=2, sort_keys=True)
+
+
+def compare(results: dict, baseline_path: str = BASELINE_FILE, threshold: float = 0.2):
+    """Print each benchmark against the baseline; returns the names that regressed by more than `threshold`."""
+    if not os.path.exists(baseline_path):
+        print(f"No baseline at {baseline_path}")
+        return []
+    with open(baseline_path) as file:
+        baseline = json.load(file)["results"]
+    regressions = []
+    print(f"\n{'benchmark':48} {'base p50':>10} {'now p50':>10} {'change':>8}")
+    for name, result in sorted(results.items()):
+        base = baseline.get(name)
+        if not base or not base.get("p50_ms"):
+            continue
+        change = result["p50_ms"] / base["p50_ms"] - 1
+        flag = "  <-- slower" if change > threshold else ""
+        print(f"{name:48} {base['p50_ms']:10.3f} {result['p50_ms']:10.3f} {change:+8.1%}{flag}")
+        if change > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def print_results(results: dict):
+    print(f"\n{'benchmark':48} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'ops/s':>11}")
+    for name, result in sorted(results.items()):
+        if "p50_ms" not in result:
+            continue
+        print(f"{name:48} {result['p50_ms']:9.3f} {result['p95_ms']:9.3f} {result['p99_ms']:9.3f} {result['ops_per_sec']:11.1f}")
@@ -0,0 +1,129 @@
+"""
+Endpoint load test: drives the FastAPI app either in-process (ASGI transport, no
+sockets) or through a local uvicorn server, with a fixed number of concurrent clients.
+"""
+import asyncio
+import itertools
+import os
+import socket
+import subprocess
+import sys
+import time
+import httpx
+from benchmarks.common import BENCH_USER, BENCH_EMAIL, BENCH_PASSWORD, summarize
+
+
+async def _login(client):
+    response = await client.post("/token", data={"username": BENCH_USER, "password": BENCH_PASSWORD})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+def _scenarios(token):
+    auth = {"Authorization": f"Bearer {token}"}
+    counter = itertools.count()
+
+    def signup():
+        n = next(counter)
+        return "POST", "/signup/", {"json": {
+            "username": f"bench_user_{os.getpid()}_{n}_{time.time_ns()}",
+            "hashed_password": "bench-password",
+            "full_name": "Bench User",
+            "email": f"bench{n}@example.com",
+        }}
+
+    return {
+        "/token": lambda: ("POST", "/token", {"data": {"username": BENCH_USER, "password": BENCH_PASSWORD}}),
+        "/signup": signup,
+        "/profile": lambda: ("GET", "/profile", {"headers": auth}),
+        "/reports": lambda: ("GET", "/reports", {"headers": auth}),
+        "/forgot-password": lambda: ("POST", "/forgot-password", {"json": {"username": BENCH_USER, "email": BENCH_EMAIL}}),
+    }
+
+
+async def _drive(client, make_request, requests: int, concurrency: int):
+    samples = []
+    errors = 0
+    remaining = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            method, url, kwargs = make_request()
+            t0 = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            samples.append(time.perf_counter() - t0)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    result = summarize(samples, time.perf_counter() - started)
+    result["errors"] = errors
+    return result
+
+
+# bcrypt-bound endpoints get fewer requests so a run stays short
+SLOW_ENDPOINTS = {"/token", "/signup"}
+
+
+async def _run_all(client, requests: int, concurrency: int, prefix: str, endpoints=None):
+    results = {}
+    token = await _login(client)
+    for name, make_request in _scenarios(token).items():
+        if endpoints and name not in endpoints:
+            continue
+        count = max(concurrency, requests // 10) if name in SLOW_ENDPOINTS else requests
+        results[f"{prefix}{name}"] = await _drive(client, make_request, count, concurrency)
+    return results
+
+
+async def _run_inprocess(requests, concurrency, endpoints):
+    from main import app
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            return await _run_all(client, requests, concurrency, "inprocess ", endpoints)
+
+
+def run_inprocess(requests: int = 500, concurrency: int = 10, endpoints=None):
+    return asyncio.run(_run_inprocess(requests, concurrency, endpoints))
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _run_http(base_url, requests, concurrency, endpoints):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        return await _run_all(client, requests, concurrency, "uvicorn ", endpoints)
+
+
+def run_uvicorn(requests: int = 500, concurrency: int = 10, endpoints=None, workers: int = 1):
+    """Start uvicorn on a free local port in the current (scratch) directory and load it over HTTP."""
+    from benchmarks.common import REPO_ROOT
+    port = _free_port()
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [REPO_ROOT, os.environ.get("PYTHONPATH")])))
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        env=env,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                httpx.get(f"{base_url}/docs", timeout=1)
+                break
+            except httpx.TransportError:
+                if time.monotonic() > deadline or server.poll() is not None:
+                    raise RuntimeError("uvicorn did not start")
+                time.sleep(0.2)
+        return asyncio.run(_run_http(base_url, requests, concurrency, endpoints))
+    finally:
+        server.terminate()
+        server.wait(10)
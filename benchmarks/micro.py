@@ -0,0 +1,120 @@
+"""Micro-benchmarks for the pieces every request goes through."""
+import json
+import os
+import random
+import time
+from benchmarks.common import measure
+
+# a syntactically valid bcrypt hash, good enough for records that are never verified
+FAKE_HASH = "$2b$12$rxk9VQuk622MsMhIocwTuuwKwoCosb/ly5oSlq4UrBu9i6Z6yR0Fe"
+
+
+def bench_tokens(iterations: int = 20000):
+    import authen
+    from database import token_cache
+    from utils import create_access_token, key_ring
+
+    results = {}
+    claims = {"sub": "john", "role": "admin", "disabled": False, "ver": 0}
+    results["utils.create_access_token"] = measure(lambda: create_access_token(claims), iterations)
+    token = create_access_token(claims)
+    results["jwt.decode"] = measure(lambda: key_ring.decode(token), iterations)
+
+    def cold():
+        token_cache.clear()
+        authen.get_current_user(token)
+    results["authen.get_current_user (cold cache)"] = measure(cold, iterations)
+    results["authen.get_current_user (cached)"] = measure(lambda: authen.get_current_user(token), iterations)
+    return results
+
+
+def bench_responses(iterations: int = 20000):
+    """The default FastAPI serialization path next to the direct responses used by the hot endpoints."""
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+    from models import Token
+    from responses import FastJSONResponse, StaticJSON
+
+    results = {}
+    tokens = {"access_token": "x" * 200, "token_type": "bearer", "expires_in": 900, "refresh_token": "y" * 43}
+    # what response_model=Token does with a returned dict: validate, encode, json.dumps
+    results["response /token: validate + jsonable_encoder + json"] = measure(
+        lambda: JSONResponse(jsonable_encoder(Token.model_validate(tokens), exclude_none=True)), iterations)
+    results["response /token: orjson"] = measure(lambda: FastJSONResponse(tokens), iterations)
+    profile = {"username": "john", "role": "admin", "email": "john@example.com"}
+    results["response /profile: jsonable_encoder + json"] = measure(
+        lambda: JSONResponse(jsonable_encoder(profile)), iterations)
+    results["response /profile: orjson"] = measure(lambda: FastJSONResponse(profile), iterations)
+    signup_completed = StaticJSON("SignUp Completed!")
+    results["response /signup: JSONResponse"] = measure(lambda: JSONResponse(content="SignUp Completed!"), iterations)
+    results["response /signup: precomputed"] = measure(signup_completed, iterations)
+    return results
+
+
+def write_users_file(path: str, count: int):
+    # streamed out by hand so a million-user file does not need a million dicts in memory
+    with open(path, "w") as file:
+        file.write("[{")
+        for i in range(count):
+            if i:
+                file.write(",")
+            username = f"user{i}"
+            file.write(json.dumps(username) + ":" + json.dumps({
+                "username": username,
+                "email": f"{username}@example.com",
+                "full_name": f"User {i}",
+                "role": "user",
+                "disabled": False,
+                "hashed_password": FAKE_HASH,
+            }))
+        file.write("}]")
+
+
+def bench_user_store(sizes=(1000, 100000, 1000000), iterations: int = 20000, backend: str = "json"):
+    import database
+    from storage import create_storage
+
+    results = {}
+    original = database.user_store
+    try:
+        for size in sizes:
+            path = f"bench_users_{size}.json"
+            write_users_file(path, size)
+            if backend == "sqlite":
+                from storage.migrate import migrate
+                target = f"bench_users_{size}.db"
+                migrate(path, target)
+                path = target
+            t0 = time.perf_counter()
+            store = create_storage(backend, path)
+            store.get("user0")  # first access loads the file
+            load_s = time.perf_counter() - t0
+            database.user_store = store
+
+            names = [f"user{random.randrange(size)}" for _ in range(1024)]
+            picks = iter(names * (iterations // len(names) + 2))
+            hit = measure(lambda: database.get_user(next(picks)), iterations)
+            hit["load_s"] = load_s
+            results[f"database.get_user hit [{backend} {size}]"] = hit
+            results[f"database.get_user miss [{backend} {size}]"] = measure(
+                lambda: database.get_user("no-such-user"), iterations
+            )
+            store.close()
+            for leftover in (path, f"bench_users_{size}.json"):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+    finally:
+        database.user_store = original
+    return results
+
+
+def bench_bcrypt(costs=(10, 11, 12, 13), iterations: int = 5):
+    from passlib.context import CryptContext
+
+    results = {}
+    for cost in costs:
+        context = CryptContext(schemes=["bcrypt"], bcrypt__rounds=cost)
+        stored = context.hash("bench-password")
+        results[f"bcrypt hash cost={cost}"] = measure(lambda: context.hash("bench-password"), iterations, warmup=1)
+        results[f"bcrypt verify cost={cost}"] = measure(lambda: context.verify("bench-password", stored), iterations, warmup=1)
+    return results
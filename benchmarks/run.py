@@ -0,0 +1,68 @@
+"""
+Benchmark runner.
+
+    python -m benchmarks.run                       # micro + in-process endpoints, compare with baseline
+    python -m benchmarks.run --suite endpoints --uvicorn
+    python -m benchmarks.run --sizes 1000,100000,1000000 --save-baseline
+    python -m benchmarks.run --suite startup      # cold start: import time and time to first response
+
+Results are written to benchmarks/results/latest.json; --save-baseline also
+stores them as benchmarks/results/baseline.json, which later runs compare against.
+"""
+import argparse
+import os
+import sys
+from benchmarks.common import BASELINE_FILE, RESULTS_DIR, compare, prepare_environment, print_results, save_results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Auth API benchmarks")
+    parser.add_argument("--suite", choices=["all", "micro", "endpoints", "startup"], default="all")
+    parser.add_argument("--uvicorn", action="store_true", help="also load a local uvicorn server over HTTP")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--requests", type=int, default=500, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--sizes", default="1000,100000", help="user counts for the get_user benchmark")
+    parser.add_argument("--backend", default="json", help="storage backend for the get_user benchmark")
+    parser.add_argument("--bcrypt-costs", default="10,11,12,13")
+    parser.add_argument("--iterations", type=int, default=20000, help="iterations per micro-benchmark")
+    parser.add_argument("--startup-runs", type=int, default=10, help="fresh interpreters per startup benchmark")
+    parser.add_argument("--output", default=os.path.join(RESULTS_DIR, "latest.json"))
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=0.2, help="p50 slowdown reported as a regression")
+    args = parser.parse_args(argv)
+
+    output = os.path.abspath(args.output)
+    workdir = prepare_environment()
+    print(f"Running in {workdir}")
+
+    results = {}
+    if args.suite in ("all", "micro"):
+        from benchmarks import micro
+        results.update(micro.bench_tokens(args.iterations))
+        results.update(micro.bench_responses(args.iterations))
+        sizes = [int(size) for size in args.sizes.split(",") if size]
+        results.update(micro.bench_user_store(sizes, args.iterations, args.backend))
+        costs = [int(cost) for cost in args.bcrypt_costs.split(",") if cost]
+        results.update(micro.bench_bcrypt(costs))
+    if args.suite in ("all", "endpoints"):
+        from benchmarks import endpoints
+        results.update(endpoints.run_inprocess(args.requests, args.concurrency))
+        if args.uvicorn:
+            results.update(endpoints.run_uvicorn(args.requests, args.concurrency, workers=args.workers))
+    if args.suite in ("all", "startup"):
+        from benchmarks import startup
+        results.update(startup.bench_startup(args.startup_runs))
+
+    print_results(results)
+    save_results(results, output)
+    print(f"\nSaved {output}")
+    regressions = compare(results, threshold=args.threshold)
+    if args.save_baseline:
+        save_results(results, BASELINE_FILE)
+        print(f"Saved baseline {BASELINE_FILE}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
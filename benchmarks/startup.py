@@ -0,0 +1,67 @@
+"""
+Cold start benchmarks: every sample is a fresh interpreter, as when an autoscaler adds an instance.
+
+"import main" is the time to import the app; "ready" adds the lifespan startup (user store
+preload) and one request, i.e. roughly when a new worker can take traffic.
+"""
+import os
+import re
+import subprocess
+import sys
+import time
+from benchmarks.common import REPO_ROOT, summarize
+
+READY_SNIPPET = """
+from fastapi.testclient import TestClient
+import main
+with TestClient(main.app) as client:
+    client.get("/.well-known/jwks.json")
+"""
+
+
+def _run(code: str, extra_args=()):
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    return subprocess.run([sys.executable, "-W", "ignore", *extra_args, "-c", code],
+                          env=env, check=True, capture_output=True, text=True)
+
+
+def _time_runs(code: str, runs: int):
+    _run(code)  # warm the OS file cache so the first sample isn't an outlier
+    samples = []
+    started = time.perf_counter()
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        _run(code)
+        samples.append(time.perf_counter() - t0)
+    return summarize(samples, time.perf_counter() - started)
+
+
+def import_profile(module: str = "main", top: int = 15):
+    """The slowest top-level imports under `module`, from python -X importtime, as (ms, name)."""
+    output = _run(f"import {module}", ["-X", "importtime"]).stderr
+    rows = []
+    for line in output.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \|( +)(\S+)", line)
+        if not match:
+            continue
+        depth, name = len(match.group(2)), match.group(3)
+        if depth == 1:
+            # a top-level import finished: its children were listed just before it
+            if name == module:
+                break
+            rows = []
+        elif depth == 3:
+            rows.append((int(match.group(1)) / 1000, name))
+    return sorted(rows, reverse=True)[:top]
+
+
+def bench_startup(runs: int = 10):
+    results = {
+        "startup: python -c pass": _time_runs("pass", runs),
+        "startup: import main": _time_runs("import main", runs),
+        "startup: ready (lifespan + first request)": _time_runs(READY_SNIPPET, runs),
+    }
+    print("\nslowest imports under main (cumulative ms):")
+    for ms, name in import_profile():
+        print(f"  {ms:8.1f}  {name}")
+    return results
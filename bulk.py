@@ -0,0 +1,195 @@
+"""
+Bulk user import and export, as NDJSON (one JSON object per line) or CSV with a header row.
+
+    python -m bulk import users.ndjson [--format csv] [--batch-size 500]
+    python -m bulk export [--format csv] > users.csv
+
+Each record needs username, email and full_name, plus either `password` (plain text,
+hashed here) or `hashed_password` (an existing hash, e.g. from an export). `role`,
+`disabled` and `token_version` are optional. Records are validated with `UserInDB`;
+invalid ones, usernames and emails that already exist are reported and skipped.
+Passwords are hashed on the server's hashing pool (`hashing.hash_executor`) without
+taking all of it from logins, and each batch is stored with one write. The CLI
+hashes on a process pool of its own.
+"""
+import csv
+import io
+import json
+import sys
+from pydantic import ValidationError
+from models import UserInDB
+from storage import DuplicateUser, DuplicateUsername
+from utils import get_password_hash, pwd_context, HASH_POOL_SIZE
+
+EXPORT_FIELDS = ["username", "email", "full_name", "role", "disabled", "hashed_password", "token_version"]
+MAX_REPORTED_ERRORS = 100
+
+
+def iter_records(lines, fmt: str = "ndjson"):
+    """Yield (line number, raw dict) from an iterable of text lines."""
+    if fmt == "csv":
+        reader = csv.DictReader(lines)
+        for record in reader:
+            yield reader.line_num, record
+    elif fmt == "ndjson":
+        for line_no, line in enumerate(lines, 1):
+            if line.strip():
+                try:
+                    yield line_no, json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield line_no, e
+    else:
+        raise ValueError(f"Unsupported format: {fmt}")
+
+
+def _prepare(raw):
+    """Returns (fields for UserInDB, plain password or None)."""
+    if not isinstance(raw, dict):
+        raise ValueError("Expected an object")
+    # empty CSV cells mean "use the default"
+    data = {key: value for key, value in raw.items() if key and value not in ("", None)}
+    password = data.pop("password", None)
+    if password is not None:
+        data["hashed_password"] = ""
+    elif not pwd_context.identify(data.get("hashed_password") or ""):
+        raise ValueError("Either password or a supported hashed_password is required")
+    return data, password
+
+
+class ImportReport:
+    def __init__(self):
+        self.imported = 0
+        self.skipped = 0
+        self.errors = []
+
+    def error(self, line_no, message):
+        self.skipped += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line_no, "error": message})
+
+    def as_dict(self):
+        return {"imported": self.imported, "skipped": self.skipped, "errors": self.errors}
+
+
+def import_users(lines, fmt: str = "ndjson", batch_size: int = 500, executor=None, workers: int = None) -> dict:
+    """
+    Validate, hash and store the users in `lines`; returns counts and the first errors.
+    Hashing runs on `executor` (default `hashing.hash_executor`), `workers` jobs at a time.
+    """
+    from database import get_user, get_user_by_email, save_users
+    from hashing import hash_executor
+    executor = executor or hash_executor
+    report = ImportReport()
+    seen = set()
+    seen_emails = set()
+    batch = []
+
+    def commit():
+        # hash the plain passwords of the whole batch on the pool, then store it with one write
+        to_hash = [(user, password) for _, user, password in batch if password is not None]
+        hashes = executor.map_background(get_password_hash, [password for _, password in to_hash], workers)
+        for (user, _), hashed in zip(to_hash, hashes):
+            user.hashed_password = hashed
+        try:
+            save_users([user for _, user, _ in batch])
+            report.imported += len(batch)
+        except DuplicateUser:
+            # a user registered since it was checked: the batch was not stored, so store it user by user
+            for line_no, user, _ in batch:
+                try:
+                    save_users([user])
+                    report.imported += 1
+                except DuplicateUsername:
+                    report.error(line_no, f"Username already exists: {user.username}")
+                except DuplicateUser:
+                    report.error(line_no, f"Email already registered: {user.email}")
+        batch.clear()
+
+    for line_no, raw in iter_records(lines, fmt):
+        if isinstance(raw, Exception):
+            report.error(line_no, f"Invalid JSON: {raw}")
+            continue
+        try:
+            data, password = _prepare(raw)
+            user = UserInDB(**data)
+        except ValidationError as e:
+            report.error(line_no, "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()))
+            continue
+        except ValueError as e:
+            report.error(line_no, str(e))
+            continue
+        if user.username in seen or get_user(user.username) is not None:
+            report.error(line_no, f"Username already exists: {user.username}")
+            continue
+        email = user.email.lower()
+        if email in seen_emails or get_user_by_email(email) is not None:
+            report.error(line_no, f"Email already registered: {user.email}")
+            continue
+        seen.add(user.username)
+        seen_emails.add(email)
+        batch.append((line_no, user, password))
+        if len(batch) >= batch_size:
+            commit()
+    if batch:
+        commit()
+    return report.as_dict()
+
+
+def export_users(fmt: str = "ndjson"):
+    """Yield the user store as text chunks, one record at a time."""
+    from database import user_store
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        for record in user_store.iter_users():
+            writer.writerow(record.to_dict())
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+    elif fmt == "ndjson":
+        for record in user_store.iter_users():
+            yield json.dumps({field: getattr(record, field) for field in EXPORT_FIELDS}) + "\n"
+    else:
+        raise ValueError(f"Unsupported format: {fmt}")
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Bulk user import/export")
+    sub = parser.add_subparsers(dest="command", required=True)
+    importer = sub.add_parser("import", help="import users from an NDJSON or CSV file")
+    importer.add_argument("path", help="file to read, - for stdin")
+    importer.add_argument("--format", choices=["ndjson", "csv"], help="defaults to the file extension")
+    importer.add_argument("--batch-size", type=int, default=500)
+    importer.add_argument("--pool-size", type=int, default=None, help="hashing processes (default HASH_POOL_SIZE)")
+    exporter = sub.add_parser("export", help="write all users to stdout")
+    exporter.add_argument("--format", choices=["ndjson", "csv"], default="ndjson")
+    args = parser.parse_args(argv)
+
+    if args.command == "import":
+        from hashing import HashExecutor
+        fmt = args.format or ("csv" if args.path.endswith(".csv") else "ndjson")
+        # no logins to leave room for here, so the whole pool hashes
+        executor = HashExecutor("process", args.pool_size or HASH_POOL_SIZE)
+        try:
+            if args.path == "-":
+                report = import_users(sys.stdin, fmt, args.batch_size, executor, executor.size)
+            else:
+                with open(args.path, "r", newline="", encoding="utf-8") as file:
+                    report = import_users(file, fmt, args.batch_size, executor, executor.size)
+        finally:
+            executor.shutdown()
+        for error in report["errors"]:
+            print(f"line {error['line']}: {error['error']}", file=sys.stderr)
+        print(f"Imported {report['imported']} users, skipped {report['skipped']}")
+        from database import user_store
+        user_store.close()
+    else:
+        for chunk in export_users(args.format):
+            sys.stdout.write(chunk)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,46 +1,133 @@
-from models import UserInDB
-import os
-from passlib.context import CryptContext
-import json
+from models import UserInDB, UserRecord
+from storage import create_storage
+from utils import USER_STORAGE, USER_DB_PATH, USER_SHARDS, USER_STORE_FLUSH_DELAY, pwd_context
+from utils import JOURNAL_COMPACT_INTERVAL, JOURNAL_COMPACT_THRESHOLD, JOURNAL_FSYNC
+from utils import TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL, REFRESH_TOKEN_EXPIRE_DAYS, SHARED_STATE_URL, ACCESS_TOKEN_EXPIRE_MINUTES
+from utils import SECRET_KEY, RESET_PASSWORD_SALT, RESET_TOKEN_MAX_AGE
+from shared_state import create_shared_state, WORKER_ID
+from token_cache import TokenCache
+from revocation import RevocationList
+from refresh_tokens import RefreshTokenStore
+from reset_tokens import ResetTokenStore, ConsumedTokens, SharedConsumedTokens
+from metrics import metrics
 DB_FILE = "db_users.json"
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+SQLITE_DB_FILE = "users.db"
+SHARDED_DB_DIR = "db_users.shards"
 
+# the JSON backend loads users once and serves them from memory, re-reading the file only when it changes on disk.
+# the journal backend appends one line per change, the SQLite backend writes single rows, the sharded backend
+# rewrites only the segment file of the changed user.
+user_store = create_storage(
+    USER_STORAGE,
+    USER_DB_PATH or {"sqlite": SQLITE_DB_FILE, "sharded": SHARDED_DB_DIR}.get(USER_STORAGE, DB_FILE),
+    flush_delay=USER_STORE_FLUSH_DELAY,
+    compact_interval=JOURNAL_COMPACT_INTERVAL,
+    compact_threshold=JOURNAL_COMPACT_THRESHOLD,
+    fsync=JOURNAL_FSYNC,
+    shards=USER_SHARDS,
+)
 
-def _read_users():
-    if not os.path.exists(DB_FILE):
-        return []
-    with open(DB_FILE, "r") as file:
-        return json.load(file)
+# rate limits, refresh tokens, revocations and user-change events, shared by all workers
+shared_state = create_shared_state(SHARED_STATE_URL)
 
-def _write_users(users):
-    with open(DB_FILE, "w") as file:
-        json.dump(users, file, indent=4)
+# verified tokens of a user are dropped whenever the user's credentials or status change; a raised
+# token version is remembered for an access token's lifetime (plus a minute for tokens issued mid-change)
+token_cache = TokenCache(TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL, ACCESS_TOKEN_EXPIRE_MINUTES * 60 + 60)
+# revoked access token ids, checked on every authenticated request
+revocation_list = RevocationList()
+revocation_list.attach(shared_state)
+refresh_tokens = RefreshTokenStore(revocation_list, REFRESH_TOKEN_EXPIRE_DAYS * 24 * 3600, shared=shared_state)
+# spent reset links are remembered in this process, or in the shared state when workers share one
+reset_tokens = ResetTokenStore(
+    SECRET_KEY, RESET_PASSWORD_SALT, RESET_TOKEN_MAX_AGE,
+    consumed=ConsumedTokens(RESET_TOKEN_MAX_AGE) if SHARED_STATE_URL.startswith("memory://")
+    else SharedConsumedTokens(shared_state, RESET_TOKEN_MAX_AGE),
+)
 
+USER_CHANGED_CHANNEL = "user-changed"
+
+
+def _on_user_changed(message: str):
+    # another worker changed a user: re-read the store and drop this worker's cached tokens for them
+    origin, token_version, username = message.split(" ", 2)
+    if origin != WORKER_ID:
+        user_store.invalidate()
+        token_cache.invalidate_user(username, int(token_version) if token_version != "-" else None)
+
+shared_state.subscribe(USER_CHANGED_CHANNEL, _on_user_changed)
+
+def _notify_user_changed(username: str, token_version: int = None):
+    token_cache.invalidate_user(username, token_version)
+    shared_state.publish(USER_CHANGED_CHANNEL, f"{WORKER_ID} {'-' if token_version is None else token_version} {username}")
+    if token_version is not None:
+        # password change, role change or disable: sessions must log in again
+        refresh_tokens.revoke_user(username)
+
+def _next_token_version(username: str):
+    record = user_store.get(username)
+    if record is None:
+        raise ValueError("User not found.")
+    return record.token_version + 1
+
+# lookups hand out the stored UserRecord itself: it was validated on the way in and is never mutated
 def get_user(username: str):
-    all_users_dict = _read_users()
-    # print(users)
-    for usern, user_data in all_users_dict[0].items():
-        # print(usern, user_data)
-        if username == usern:
-            # print(username)
-            return UserInDB(**user_data)
-    return None
+    with metrics.timer("store_read"):
+        return user_store.get(username)
 
-def update_user_password(user_data: dict, new_pass: str):
-    db_users = _read_users()
-    db_user_dict = db_users[0]
+def get_user_by_email(email: str):
+    with metrics.timer("store_read"):
+        return user_store.get_by_email(email)
 
+def find_users(prefix: str = None, email_domain: str = None, role: str = None, disabled: bool = None,
+               after: str = None, limit: int = 50):
+    """A page of user records for admin listing and search, ordered by username."""
+    with metrics.timer("store_read"):
+        return user_store.query(prefix, email_domain, role, disabled, after, limit)
+
+def update_user_password(user_data: dict, new_pass: str):
     username = user_data.get("username")
     hashed_password = pwd_context.hash(new_pass)
 
-    if username in db_user_dict:
-        db_user_dict[username]["hashed_password"] = hashed_password
-        _write_users([db_user_dict])
-    else:
+    # a new token version makes every token issued with the old password stale
+    token_version = _next_token_version(username)
+    with metrics.timer("store_write"):
+        updated = user_store.update(username, hashed_password=hashed_password, token_version=token_version)
+    if not updated:
+        raise ValueError("User not found.")
+    _notify_user_changed(username, token_version)
+
+def rehash_user_password(username: str, old_hash: str, new_hash: str) -> bool:
+    """Swap in a stronger hash of the same password; skipped if the password changed meanwhile."""
+    with metrics.timer("store_write"):
+        # compare-and-set in the store: a reset that lands while the new hash is computed is not undone
+        updated = user_store.update_if(username, {"hashed_password": old_hash}, hashed_password=new_hash)
+    # same password, so sessions and the token version are left alone
+    return updated
+
+def set_user_disabled(username: str, disabled: bool = True):
+    token_version = _next_token_version(username)
+    with metrics.timer("store_write"):
+        updated = user_store.update(username, disabled=disabled, token_version=token_version)
+    if not updated:
+        raise ValueError("User not found.")
+    _notify_user_changed(username, token_version)
+
+def set_user_role(username: str, role: str):
+    # the role is in the access token claims, so tokens carrying the old one are retired
+    token_version = _next_token_version(username)
+    with metrics.timer("store_write"):
+        updated = user_store.update(username, role=role, token_version=token_version)
+    if not updated:
         raise ValueError("User not found.")
+    _notify_user_changed(username, token_version)
 
 def save_user(user: UserInDB):
-    users = _read_users()
-    user_dict = user.dict()
-    users[0].update({user.username:user_dict})
-    _write_users(users)
\ No newline at end of file
+    """Store a new user; raises storage.DuplicateUsername / DuplicateEmail if either is taken."""
+    with metrics.timer("store_write"):
+        user_store.create(UserRecord.from_model(user))
+    _notify_user_changed(user.username)
+
+def save_users(users: list[UserInDB]):
+    """Store a batch of new users with a single write (bulk import); none are stored if one is a duplicate."""
+    with metrics.timer("store_write"):
+        user_store.create_many(UserRecord.from_model(user) for user in users)
@@ -0,0 +1,241 @@
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from fastapi import HTTPException
+from utils import verify_password, get_password_hash, build_password_context
+from utils import HASH_POOL_KIND, HASH_POOL_SIZE, HASH_QUEUE_LIMIT
+from metrics import metrics
+
+
+class HashExecutor:
+    """
+    Runs bcrypt work outside the event loop.
+
+    A bcrypt call costs ~250ms of CPU, so calling it from an `async def` endpoint
+    stalls every other request. Jobs go to a bounded thread or process pool instead;
+    once `queue_limit` jobs are in flight new ones fail fast with 503 rather than
+    queueing up latency for everyone.
+
+    Bulk work (imports) goes through `map_background` on the same pool. It uses at
+    most half of the workers at a time, and its jobs count against `queue_limit`.
+    """
+
+    def __init__(self, kind: str = "thread", size: int = 1, queue_limit: int = 64):
+        self.kind = kind
+        self.size = max(1, size)
+        self.queue_limit = max(1, queue_limit)
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._background = 0  # map_background jobs in flight, changed from other threads under self._lock
+
+    @property
+    def pending(self):
+        return self._pending + self._background
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    if self.kind == "process":
+                        self._executor = ProcessPoolExecutor(max_workers=self.size)
+                    else:
+                        self._executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="hash")
+        return self._executor
+
+    def check_capacity(self):
+        """Raise the 503 that `run` would raise now, without submitting anything."""
+        # the counter is only touched from the event loop thread, so no lock is needed
+        if self._pending + self._background >= self.queue_limit:
+            raise HTTPException(
+                status_code=503,
+                detail="Server busy, please retry",
+                headers={"Retry-After": "1"},
+            )
+
+    async def run(self, func, *args):
+        self.check_capacity()
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+        finally:
+            self._pending -= 1
+
+    def map_background(self, func, items, workers: int = None) -> list:
+        """
+        `[func(item) for item in items]` on the pool, called from a thread outside the event
+        loop. At most `workers` jobs (default half the pool) run at a time, so logins still
+        find free workers.
+        """
+        items = list(items)
+        window = max(1, min(workers or self.size // 2, self.queue_limit))
+        executor = self._get_executor()
+        results = []
+        for start in range(0, len(items), window):
+            chunk = items[start:start + window]
+            with self._lock:
+                self._background += len(chunk)
+            try:
+                futures = [executor.submit(func, item) for item in chunk]
+                results.extend(future.result() for future in futures)
+            finally:
+                with self._lock:
+                    self._background -= len(chunk)
+        return results
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
+
+
+hash_executor = HashExecutor(HASH_POOL_KIND, HASH_POOL_SIZE, HASH_QUEUE_LIMIT)
+
+
+def _time_password_hash() -> float:
+    # hashing runs the same key setup as checking a password, so it takes as long as one
+    started = time.perf_counter()
+    get_password_hash("unknown-user-delay")
+    return time.perf_counter() - started
+
+
+class UnknownUserDelay:
+    """
+    Makes a login for a username that doesn't exist take as long as a wrong password.
+
+    Without it the missing user is rejected right away and response times tell which
+    usernames exist. Hashing a dummy password for every such login would hand
+    credential stuffing (mostly unknown names) the full bcrypt cost, so instead it
+    sleeps for a duration drawn from recently observed password checks. These include
+    the time spent waiting for the hashing pool, so the delay follows the load.
+
+    Until a real login has been observed there is nothing to draw from. The first
+    unknown-user login then times one hash on the hashing pool, and logins arriving
+    meanwhile wait for that same job. Nothing is hashed at startup.
+
+    When the hashing pool is full a known user's login gets a 503 instead of a
+    password check, so an unknown user's login gets the same 503 instead of a delay.
+    """
+
+    def __init__(self, samples: int = 64):
+        self._durations = deque(maxlen=samples)
+        self._seeding = None  # the one seeding job in flight, shared by every waiting login
+
+    def observe(self, seconds: float):
+        self._durations.append(seconds)
+
+    async def _seed(self):
+        seeding = self._seeding
+        if seeding is None:
+            seeding = self._seeding = asyncio.ensure_future(hash_executor.run(_time_password_hash))
+            seeding.add_done_callback(self._seeded)
+        # shielded: a cancelled login must not cancel the job the others are waiting for
+        await asyncio.shield(seeding)
+
+    def _seeded(self, task):
+        if not task.cancelled() and task.exception() is None:
+            self.observe(task.result())
+        # a failed seed (e.g. 503 from a full pool) is retried by the next unknown-user login
+        self._seeding = None
+
+    async def wait(self):
+        hash_executor.check_capacity()
+        started = time.perf_counter()
+        if not self._durations:
+            await self._seed()
+        # a login that waited for the seed has already spent part of its delay
+        await asyncio.sleep(max(0.0, random.choice(self._durations) - (time.perf_counter() - started)))
+
+
+unknown_user_delay = UnknownUserDelay()
+
+
+async def verify_password_async(plain_password, hashed_password):
+    started = time.perf_counter()
+    with metrics.timer("password_verify"):
+        result = await hash_executor.run(verify_password, plain_password, hashed_password)
+    unknown_user_delay.observe(time.perf_counter() - started)
+    return result
+
+async def get_password_hash_async(password):
+    with metrics.timer("password_hash"):
+        return await hash_executor.run(get_password_hash, password)
+
+async def rehash_password(username, password, old_hash):
+    """
+    Re-hash a password whose stored hash uses an old scheme or cost. Runs as a
+    background task after the login response is sent; the next login retries if
+    the pool is busy.
+    """
+    from database import rehash_user_password
+    try:
+        new_hash = await get_password_hash_async(password)
+    except HTTPException:
+        return
+    await asyncio.to_thread(rehash_user_password, username, old_hash, new_hash)
+
+
+def _time_hash(context, samples=3):
+    context.hash("calibration-password")  # warm up the backend
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        context.hash("calibration-password")
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def calibrate(scheme: str, target_ms: float, samples: int = 3):
+    """
+    Find the strongest cost setting whose hash still fits in `target_ms` on this machine.
+    Returns (env settings, measured ms).
+    """
+    budget = target_ms / 1000
+    if scheme == "bcrypt":
+        param, values, build = "BCRYPT_ROUNDS", range(4, 32), lambda v: build_password_context(["bcrypt"], bcrypt_rounds=v)
+    elif scheme == "scrypt":
+        param, values, build = "SCRYPT_ROUNDS", range(10, 25), lambda v: build_password_context(["scrypt"], scrypt_rounds=v)
+    elif scheme == "argon2":
+        # memory and parallelism stay as configured, only the number of passes is tuned
+        param, values, build = "ARGON2_TIME_COST", range(1, 64), lambda v: build_password_context(["argon2"], argon2_time_cost=v)
+    else:
+        raise ValueError(f"Unknown scheme: {scheme}")
+
+    best = None
+    for value in values:
+        elapsed = _time_hash(build(value), samples)
+        print(f"  {param}={value}: {elapsed * 1000:.1f} ms")
+        if elapsed > budget:
+            break
+        best = (value, elapsed)
+    if best is None:
+        # even the cheapest setting is over budget, report it anyway
+        best = (values[0], elapsed)
+    settings = {"PASSWORD_SCHEMES": scheme if scheme == "bcrypt" else f"{scheme},bcrypt", param: best[0]}
+    return settings, best[1] * 1000
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Password hashing tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    cal = sub.add_parser("calibrate", help="pick the hash cost that fits a latency budget on this machine")
+    cal.add_argument("--scheme", choices=["bcrypt", "argon2", "scrypt"], default="bcrypt")
+    cal.add_argument("--target-ms", type=float, default=250, help="time one hash may take")
+    cal.add_argument("--samples", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    print(f"Calibrating {args.scheme} for {args.target_ms:.0f} ms per hash")
+    settings, measured = calibrate(args.scheme, args.target_ms, args.samples)
+    print(f"\nOne hash takes {measured:.1f} ms with these settings, add them to .env:")
+    for key, value in settings.items():
+        print(f"{key}={value}")
+
+
+if __name__ == "__main__":
+    main()
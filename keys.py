@@ -0,0 +1,173 @@
+import os
+import threading
+import time
+from jose import JWTError
+from Logging.Logger import CustomLogger
+# jose.jwk/jwt pull in the cryptography backends (tens of ms), so they are imported when the
+# ring first loads its keys instead of at startup
+
+logger = CustomLogger(logger_name='Key Ring', dir_name="logs").get_logger()
+
+
+class JwtKey:
+    """A signing/verification key parsed once into a jose key object."""
+
+    def __init__(self, kid: str, algorithm: str, verify_key, sign_key=None, public_jwk: dict = None):
+        self.kid = kid
+        self.algorithm = algorithm
+        self.verify_key = verify_key
+        self.sign_key = sign_key
+        self.public_jwk = public_jwk
+
+    @classmethod
+    def from_secret(cls, kid: str, secret: str, algorithm: str):
+        from jose import jwk
+        key = jwk.construct(secret, algorithm)
+        return cls(kid, algorithm, key, key)
+
+    @classmethod
+    def from_pem(cls, kid: str, pem: bytes):
+        from cryptography.hazmat.primitives import serialization
+        from cryptography.hazmat.primitives.asymmetric import ec, rsa
+        from jose import jwk
+        try:
+            private = serialization.load_pem_private_key(pem, password=None)
+            public = private.public_key()
+        except ValueError:
+            private = None
+            public = serialization.load_pem_public_key(pem)
+        if isinstance(public, rsa.RSAPublicKey):
+            algorithm = "RS256"
+        elif isinstance(public, ec.EllipticCurvePublicKey):
+            algorithm = {"secp256r1": "ES256", "secp384r1": "ES384", "secp521r1": "ES512"}[public.curve.name]
+        else:
+            raise ValueError(f"Unsupported key type for {kid}: {type(public).__name__}")
+        public_pem = public.public_bytes(serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo)
+        verify_key = jwk.construct(public_pem, algorithm)
+        sign_key = jwk.construct(pem, algorithm) if private is not None else None
+        public_jwk = dict(verify_key.to_dict(), kid=kid, use="sig", alg=algorithm)
+        return cls(kid, algorithm, verify_key, sign_key, public_jwk)
+
+
+class KeyRing:
+    """
+    Keys used to sign and verify access tokens.
+
+    Without a keys directory the ring holds a single HS256 key built from SECRET_KEY,
+    as before. With `keys_dir` set, every `<kid>.pem` file in it is loaded: private
+    keys can sign, public-only keys just verify. The file `active` names the kid new
+    tokens are signed with (otherwise the last private key by name). Tokens carry their
+    `kid` in the header, so any key still in the directory keeps verifying the tokens
+    it signed; public keys are published as a JWKS document so other services can
+    verify tokens locally.
+
+    The directory is re-scanned at most every `check_interval` seconds, so keys can be
+    rotated without a restart: add the new key, wait for JWKS caches to pick it up,
+    point `active` at it, and delete the old key once its tokens have expired. A
+    re-scan that fails (a half-copied or malformed .pem, a missing active key) is
+    logged and the ring keeps the keys it has until the next scan succeeds.
+
+    Keys are loaded on first use (`load()` forces it), which keeps jose and
+    cryptography out of the import path.
+    """
+
+    def __init__(self, secret: str = None, algorithm: str = "HS256", keys_dir: str = None, check_interval: float = 10.0):
+        self.secret = secret
+        self.default_algorithm = algorithm or "HS256"
+        self.keys_dir = keys_dir
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._keys = {}
+        self._active = None
+        self._signature = None
+        self._next_check = 0.0
+        self._loaded = False
+
+    def load(self):
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self._load()
+                    self._next_check = time.monotonic() + self.check_interval
+                    self._loaded = True
+
+    def _dir_signature(self):
+        entries = []
+        with os.scandir(self.keys_dir) as it:
+            for entry in it:
+                if entry.is_file():
+                    st = entry.stat()
+                    entries.append((entry.name, st.st_mtime_ns, st.st_size))
+        return tuple(sorted(entries))
+
+    def _load(self):
+        if not self.keys_dir:
+            key = JwtKey.from_secret("default", self.secret, self.default_algorithm)
+            self._keys, self._active = {key.kid: key}, key
+            return
+        signature = self._dir_signature()
+        keys = {}
+        for name, _, _ in signature:
+            if not name.endswith(".pem"):
+                continue
+            kid = name[:-len(".pem")]
+            if kid.endswith(".pub"):
+                kid = kid[:-len(".pub")]
+            with open(os.path.join(self.keys_dir, name), "rb") as file:
+                keys[kid] = JwtKey.from_pem(kid, file.read())
+        active_kid = None
+        active_file = os.path.join(self.keys_dir, "active")
+        if os.path.exists(active_file):
+            with open(active_file) as file:
+                active_kid = file.read().strip()
+        if not active_kid:
+            signers = sorted(kid for kid, key in keys.items() if key.sign_key is not None)
+            active_kid = signers[-1] if signers else None
+        active = keys.get(active_kid)
+        if active is None or active.sign_key is None:
+            raise ValueError(f"No private key to sign with in {self.keys_dir} (active kid: {active_kid})")
+        self._keys, self._active, self._signature = keys, active, signature
+
+    def _maybe_reload(self):
+        if not self._loaded:
+            self.load()
+        if not self.keys_dir:
+            return
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        with self._lock:
+            if now < self._next_check:
+                return
+            self._next_check = now + self.check_interval
+            try:
+                if self._dir_signature() != self._signature:
+                    # _load builds the whole key set before swapping it in, so a bad file leaves the old one
+                    self._load()
+            except Exception as e:
+                logger.error(f"Keeping the current signing keys, reloading {self.keys_dir} failed: {e}")
+
+    @property
+    def active_kid(self):
+        self.load()
+        return self._active.kid
+
+    def sign(self, claims: dict) -> str:
+        self._maybe_reload()
+        from jose import jwt
+        key = self._active
+        return jwt.encode(claims, key.sign_key, algorithm=key.algorithm, headers={"kid": key.kid})
+
+    def decode(self, token: str) -> dict:
+        """Verify a token against the key named by its kid (tokens without one use the active key)."""
+        self._maybe_reload()
+        from jose import jwt
+        kid = jwt.get_unverified_header(token).get("kid")
+        key = self._keys.get(kid) if kid is not None else self._active
+        if key is None:
+            raise JWTError("Unknown signing key")
+        return jwt.decode(token, key.verify_key, algorithms=[key.algorithm])
+
+    def jwks(self) -> dict:
+        self._maybe_reload()
+        return {"keys": [key.public_jwk for key in self._keys.values() if key.public_jwk]}
@@ -0,0 +1,204 @@
+import os
+import queue
+import smtplib
+import threading
+import time
+import uuid
+from email.message import EmailMessage
+from Logging.Logger import CustomLogger
+from metrics import metrics
+
+logger = CustomLogger(logger_name='Email Queue', dir_name="logs").get_logger()
+
+
+def is_transient(error: Exception) -> bool:
+    """
+    Connection trouble and 4xx replies are worth retrying. A refused recipient or a 5xx reply
+    would be refused again, so the message fails without retry.
+    """
+    if isinstance(error, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError)):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code < 500
+    if isinstance(error, smtplib.SMTPException):
+        return False
+    return isinstance(error, OSError)
+
+
+class SmtpTransport:
+    """Keeps one SMTP_SSL connection open and reuses it for every message, reconnecting when it drops."""
+
+    def __init__(self, host: str, port: int, username: str, password: str, timeout: float = 30):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self._smtp = None
+
+    def _connect(self):
+        smtp = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        smtp.login(self.username, self.password)
+        self._smtp = smtp
+
+    def send(self, messages):
+        if self._smtp is None:
+            self._connect()
+        try:
+            for msg in messages:
+                self._smtp.send_message(msg)
+        except Exception as e:
+            # drop a broken connection, the retry will open a fresh one. After a refusal the
+            # server has reset the transaction and the connection is still good
+            if is_transient(e):
+                self.close()
+            raise
+
+    def close(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except Exception:
+                pass
+            self._smtp = None
+
+
+class FileTransport:
+    """Writes each message as an .eml file, for local runs without a mail server."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def send(self, messages):
+        for msg in messages:
+            path = os.path.join(self.directory, f"{time.time_ns()}-{uuid.uuid4().hex[:8]}.eml")
+            with open(path, "wb") as file:
+                file.write(msg.as_bytes())
+
+    def close(self):
+        pass
+
+
+class MemoryTransport:
+    """Keeps sent messages in a list, used by tests and benchmarks."""
+
+    def __init__(self):
+        self.sent = []
+
+    def send(self, messages):
+        self.sent.extend(messages)
+
+    def close(self):
+        pass
+
+
+class EmailQueue:
+    """
+    In-process outbound mail queue.
+
+    Endpoints enqueue and return immediately; a single background worker drains the
+    queue in batches over the transport's persistent connection. Each message is
+    delivered on its own: transient errors are retried with exponential backoff,
+    permanent ones (see is_transient) fail that message only.
+    """
+
+    def __init__(self, transport, maxsize: int = 1000, batch_size: int = 20, max_retries: int = 3, backoff: float = 1.0):
+        self.transport = transport
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._worker = None
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self.sent = 0
+        self.failed = 0
+
+    @property
+    def depth(self):
+        return self._queue.qsize()
+
+    def start(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._stopping.clear()
+                self._worker = threading.Thread(target=self._run, name="email-queue", daemon=True)
+                self._worker.start()
+
+    def enqueue(self, msg: EmailMessage):
+        """Queue a message for delivery. Raises queue.Full when the backlog is at capacity."""
+        self.start()
+        self._queue.put_nowait(msg)
+
+    def stop(self, timeout: float = 10):
+        # let the worker flush what is already queued, then close the connection
+        with self._lock:
+            worker = self._worker
+            self._worker = None
+        if worker is not None:
+            self._stopping.set()
+            self._queue.put(None)
+            worker.join(timeout)
+        self.transport.close()
+
+    def join(self):
+        """Block until every queued message has been handled."""
+        self._queue.join()
+
+    def _next_batch(self):
+        msg = self._queue.get()
+        batch = [msg]
+        while msg is not None and len(batch) < self.batch_size:
+            try:
+                msg = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(msg)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            messages = [msg for msg in batch if msg is not None]
+            if messages:
+                self._deliver(messages)
+            for _ in batch:
+                self._queue.task_done()
+            if len(messages) != len(batch) and self._stopping.is_set():
+                return
+
+    def _deliver(self, messages):
+        for msg in messages:
+            self._deliver_one(msg)
+
+    def _deliver_one(self, msg):
+        for attempt in range(self.max_retries + 1):
+            try:
+                with metrics.timer("email_send"):
+                    self.transport.send([msg])
+                self.sent += 1
+                return
+            except Exception as e:
+                if not is_transient(e):
+                    self.failed += 1
+                    logger.error(f"Dropping email to {msg['To']}: {e}")
+                    return
+                if attempt == self.max_retries:
+                    self.failed += 1
+                    logger.error(f"Dropping email to {msg['To']} after {attempt + 1} attempts: {e}", exc_info=True)
+                    return
+                logger.error(f"Email to {msg['To']} failed (attempt {attempt + 1}), retrying: {e}")
+                time.sleep(self.backoff * (2 ** attempt))
+
+
+def create_transport(kind: str, outbox_dir: str = "outbox", **smtp_settings):
+    # "smtp" talks to the real mail server, "file" writes .eml files, "memory" keeps messages in a list
+    kind = (kind or "smtp").lower()
+    if kind == "smtp":
+        return SmtpTransport(**smtp_settings)
+    if kind == "file":
+        return FileTransport(outbox_dir)
+    if kind == "memory":
+        return MemoryTransport()
+    raise ValueError(f"Unknown email transport: {kind}")
@@ -1,13 +1,34 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Request, Form
-from fastapi.responses import JSONResponse, RedirectResponse
+from fastapi import FastAPI, Depends, HTTPException, status, Request, Form, BackgroundTasks
+from fastapi.responses import JSONResponse, RedirectResponse, PlainTextResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from models import User, UserInDB,Token, EmailSchema
-from utils import verify_password, create_access_token, get_password_hash, generate_reset_token, verify_reset_token
+from utils import create_access_token, key_ring
+from utils import ACCESS_TOKEN_EXPIRE_MINUTES
 from utils import smtp_email, smtp_passkey, API_BASE
-from database import get_user, save_user, update_user_password
-from authen import get_current_active_user, require_admin, require_roles
-import smtplib
-from email.message import EmailMessage
+from utils import EMAIL_TRANSPORT, EMAIL_OUTBOX_DIR, EMAIL_QUEUE_SIZE, SMTP_HOST, SMTP_PORT
+from database import get_user, get_user_by_email, save_user, update_user_password, token_cache, user_store
+from database import revocation_list, refresh_tokens, shared_state, set_user_role, find_users, reset_tokens
+from authen import get_current_active_user, get_current_user, require_admin, require_roles, oauth2_scheme
+from refresh_tokens import InvalidRefreshToken, RefreshTokenReused
+from ratelimit import RateLimiter, SharedRateLimitBackend, parse_limit
+from utils import RATE_LIMITS, RATE_LIMIT_ENABLED, SHARED_STATE_URL
+from datetime import timedelta
+import asyncio
+import time
+import uuid
+from hashing import hash_executor, verify_password_async, get_password_hash_async, rehash_password, unknown_user_delay
+from utils import password_needs_rehash, pwd_context
+from contextlib import asynccontextmanager
+from metrics import metrics, MetricsMiddleware
+from responses import FastJSONResponse, StaticJSON
+from storage import DuplicateEmail, DuplicateUsername
+import queue
+import threading
+import io
+import json
+import base64
+import tempfile
+import bulk
 from fastapi.middleware.cors import CORSMiddleware
 from Logging.Logger import CustomLogger
 
@@ -16,7 +37,70 @@ from Logging.Logger import CustomLogger
 logger_instance = CustomLogger(logger_name='FastAPI App', dir_name="logs")
 logger = logger_instance.get_logger()
 
-app = FastAPI()
+# reset emails are sent by a background worker over one reused SMTP connection.
+# the queue (and smtplib/email with it) is only set up when the first email is sent
+_email_queue = None
+_email_queue_lock = threading.Lock()
+
+def get_email_queue():
+    global _email_queue
+    if _email_queue is None:
+        with _email_queue_lock:
+            if _email_queue is None:
+                from mailer import EmailQueue, create_transport
+                _email_queue = EmailQueue(
+                    create_transport(
+                        EMAIL_TRANSPORT,
+                        outbox_dir=EMAIL_OUTBOX_DIR,
+                        host=SMTP_HOST,
+                        port=SMTP_PORT,
+                        username=smtp_email,
+                        password=smtp_passkey,
+                    ),
+                    maxsize=EMAIL_QUEUE_SIZE,
+                )
+    return _email_queue
+
+# per-IP and per-username throttling, checked before any bcrypt or email work.
+# counters stay in-process for a single worker and move to the shared state when there are several
+rate_limiter = RateLimiter(
+    {rule: parse_limit(spec) for rule, spec in RATE_LIMITS.items()},
+    backend=None if SHARED_STATE_URL.startswith("memory://") else SharedRateLimitBackend(shared_state),
+    enabled=RATE_LIMIT_ENABLED,
+)
+
+def _client_ip(request: Request):
+    return request.client.host if request.client else None
+
+async def _prune_sessions():
+    # expired refresh tokens and revoked token ids are dropped every few minutes
+    while True:
+        await asyncio.sleep(600)
+        refresh_tokens.prune()
+        revocation_list.prune()
+
+def _warm_up():
+    key_ring.load()
+    pwd_context.load()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # read the users and load the signing keys and hashing context, side by side, before accepting
+    # requests; a bad key or hashing setup fails startup here instead of every request later
+    await asyncio.gather(asyncio.to_thread(user_store.preload), asyncio.to_thread(_warm_up))
+    pruner = asyncio.create_task(_prune_sessions())
+    yield
+    pruner.cancel()
+    # flush queued emails and pending user writes before the process exits
+    if _email_queue is not None:
+        _email_queue.stop()
+    user_store.close()
+    # wait for in-flight hashing jobs and stop the pool workers
+    hash_executor.shutdown()
+    shared_state.close()
+
+# plain dict results are rendered with orjson; the hot endpoints below return their response directly
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
 # Add CORS middleware to the FastAPI app
 app.add_middleware(
     CORSMiddleware,
@@ -25,23 +109,112 @@ app.add_middleware(
     allow_methods=["GET", "POST", "PUT"],
     allow_headers=["*"],
 )
+# request counts and latency per route, served at /metrics
+app.add_middleware(MetricsMiddleware, registry=metrics)
+metrics.gauge("hash_executor_pending", "Password hashing jobs queued or running.", lambda: hash_executor.pending)
+metrics.gauge("email_queue_depth", "Emails waiting to be sent.", lambda: _email_queue.depth if _email_queue else 0)
+metrics.gauge("token_cache_hit_ratio", "Share of bearer tokens served from the verified-token cache.",
+              lambda: token_cache.stats()["hit_ratio"])
+metrics.gauge("token_cache_size", "Entries in the verified-token cache.", lambda: token_cache.stats()["size"])
+
+def _issue_tokens(user, family: str = None):
+    # short lived access token plus a rotating refresh token in the session's family
+    expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    jti = uuid.uuid4().hex
+    with metrics.timer("jwt_encode"):
+        access_token = create_access_token(data={
+            "sub": user.username,
+            "role": user.role,
+            # disabled flag and token version let claims-only authorization skip the user store
+            "disabled": user.disabled,
+            "ver": user.token_version,
+            "jti": jti,
+        }, expires_delta=expires)
+    refresh_token, family = refresh_tokens.issue(user.username, family)
+    refresh_tokens.track_access_token(family, jti, time.time() + expires.total_seconds())
+    return {
+        "access_token": access_token,
+        "token_type": "bearer",
+        "expires_in": int(expires.total_seconds()),
+        "refresh_token": refresh_token,
+    }
+
+# constant bodies, serialized once
+SIGNUP_COMPLETED = StaticJSON("SignUp Completed!")
+RESET_LINK_SENT = StaticJSON("Reset Link Sent")
+LOGGED_OUT = StaticJSON({"message": "Logged out"})
+PASSWORD_UPDATED = StaticJSON({"message": "Password updated successfully."})
+# /reports only differs by role, and only the roles allowed in get there
+_reports_bodies = {}
+
+def _profile(user):
+    return {
+        "username": user.username,
+        "role": user.role,
+        "email": user.email,
+        # "message": f"Welcome back, {current_user.full_name}!",
+    }
 
 # # receive user credentials from login page
-@app.post("/token", response_model=Token)
-async def login(form_data: OAuth2PasswordRequestForm = Depends()):
+# ?include_profile=true adds the /profile data to the response, so a client signs in with one round trip.
+# the response model documents the shape; the dict is built here from trusted values and returned as is
+@app.post("/token", response_model=Token, response_model_exclude_none=True)
+async def login(request: Request, background_tasks: BackgroundTasks, form_data: OAuth2PasswordRequestForm = Depends(),
+                include_profile: bool = False):
+    rate_limiter.check(login_ip=_client_ip(request), login_user=form_data.username)
     try:
         user = get_user(form_data.username)
         #print(type(user))
         #print(user)
-        if not user or not verify_password(form_data.password, user.hashed_password):
+        if user is None:
+            # no password to check, but answer only after the time a check would take so response
+            # times don't tell which usernames exist
+            await unknown_user_delay.wait()
+            raise HTTPException(status_code=400, detail="Incorrect username or password")
+        # bcrypt runs in the hashing pool so the event loop keeps serving other requests
+        if not await verify_password_async(form_data.password, user.hashed_password):
             raise HTTPException(status_code=400, detail="Incorrect username or password")
-        access_token = create_access_token(data={"sub": user.username, "role":user.role})
-        return {"access_token": access_token, "token_type": "bearer"}
+        # hashes from an older scheme or cost are upgraded after the response is sent
+        if password_needs_rehash(user.hashed_password):
+            background_tasks.add_task(rehash_password, user.username, form_data.password, user.hashed_password)
+        tokens = _issue_tokens(user)
+        if include_profile:
+            tokens["profile"] = _profile(user)
+        return FastJSONResponse(tokens)
+    except HTTPException:
+        raise
     except Exception as e:
         #print(e)
         logger.error(e,exc_info=True)
         raise HTTPException(status_code=500,detail="Error Loggin In")
 
+# swap a refresh token for a new access + refresh token pair, without sending the password again
+@app.post("/token/refresh", response_model=Token, response_model_exclude_none=True)
+def refresh_access_token(refresh_token: str = Form(...)):
+    invalid = HTTPException(status_code=401, detail="Invalid refresh token", headers={"WWW-Authenticate": "Bearer"})
+    try:
+        username, family = refresh_tokens.rotate(refresh_token)
+    except RefreshTokenReused as e:
+        # the token was already spent: someone else holds a copy, so the whole session was revoked
+        logger.error(f"Refresh token reuse detected for {e.username}, session revoked")
+        raise invalid
+    except InvalidRefreshToken:
+        raise invalid
+    user = get_user(username)
+    if user is None or user.disabled:
+        refresh_tokens.revoke(refresh_token)
+        raise invalid
+    return FastJSONResponse(_issue_tokens(user, family))
+
+@app.post("/logout")
+def logout(token: str = Depends(oauth2_scheme), refresh_token: str | None = Form(None),
+           user: User = Depends(get_current_user)):
+    claims = key_ring.decode(token)
+    revocation_list.revoke(claims.get("jti"), claims.get("exp", time.time()))
+    if refresh_token:
+        refresh_tokens.revoke(refresh_token)
+    return LOGGED_OUT()
+
 # if user does not exists , allow user to signup, checks if user already exists
 @app.post("/signup/")
 async def signup(request_data:UserInDB):
@@ -50,36 +223,51 @@ async def signup(request_data:UserInDB):
         # #print(existing_user)
         if existing_user:
             raise HTTPException(status_code=400, detail="Username already exists") 
+        # emails identify users for password resets, so one email belongs to one user on every backend
+        if get_user_by_email(request_data.email):
+            raise HTTPException(status_code=400, detail="Email already registered")
 
-        hashed_password1 = get_password_hash(request_data.hashed_password)
+        hashed_password1 = await get_password_hash_async(request_data.hashed_password)
         # #print(hashed_password)
-        new_user = UserInDB(
-                        username=request_data.username,
-                        full_name=request_data.full_name,
-                        email=request_data.email,
-                        role="user",
-                        hashed_password=hashed_password1
-                        )
+        # request_data was validated when the body was parsed, copy it instead of validating the email again
+        new_user = request_data.model_copy(update={"role": "user", "disabled": False, "token_version": 0,
+                                                   "hashed_password": hashed_password1})
 
         save_user(new_user)
-        return JSONResponse(content="SignUp Completed!", status_code=200)
+        return SIGNUP_COMPLETED()
+    except HTTPException:
+        raise
+    # the checks above only save hashing for the usual case: the store refuses the insert when a
+    # concurrent signup took the username or email while the password was being hashed
+    except DuplicateUsername:
+        raise HTTPException(status_code=400, detail="Username already exists")
+    except DuplicateEmail:
+        raise HTTPException(status_code=400, detail="Email already registered")
     except Exception as e:
         #print("error ",e)
         logger.error(e,exc_info=True)
         raise HTTPException(status_code=500,detail="Error Completing Signup")
 
+def _email_matches(user, email) -> bool:
+    return bool(user.email) and isinstance(email, str) and user.email.lower() == email.lower()
+
 @app.post("/forgot-password")
-def forgot_password(data: EmailSchema):
+def forgot_password(data: EmailSchema, request: Request):
+    rate_limiter.check(forgot_ip=_client_ip(request), forgot_user=data.username)
     email = data.email
     # Optional: check if user exists
     user = get_user(data.username)
     #print("here user",user)
-    if not user:
+    # the link only goes to the address on the account; a mismatch gets the same answer as an unknown user
+    if not user or not _email_matches(user, email):
         raise HTTPException(status_code=404, detail="User not found")
 
-    token = generate_reset_token(data) # sending both email and username to generate rest token
-    send_reset_email(email, token)
-    return JSONResponse(content="Reset Link Sent",status_code=200)
+    token = reset_tokens.generate(user.username, user.email) # sending both email and username to generate rest token
+    try:
+        send_reset_email(user.email, token)
+    except queue.Full:
+        raise HTTPException(status_code=503, detail="Too many pending emails, please retry", headers={"Retry-After": "5"})
+    return RESET_LINK_SENT()
 
 # Triggered when the user clicks the link in the password reset email. will not update anything , redirects user to streamlit page to entere new passwords
 @app.get("/reset-password")
@@ -90,28 +278,33 @@ def show_reset_form(token: str):
 @app.post("/reset-password")
 def reset_password(token: str = Form(...), #streamlit requests.post is sending data as application/x-www-form-urlencoded — not JSON. Form(...) is used to declare a form field in a FastAPI endpoint.
                     new_password: str = Form(...)):
-    verified_data = verify_reset_token(token)
+    # a reset link works once: the token is marked spent here, before the password changes
+    verified_data = reset_tokens.consume(token)
     if not verified_data:
         raise HTTPException(status_code=400, detail="Invalid or expired token")
+    # the token is bound to the user and the email the link was sent to: once the account's email
+    # has changed, links sent to the old address stop working
+    user = get_user(verified_data.get("username"))
+    if user is None or not _email_matches(user, verified_data.get("email")):
+        raise HTTPException(status_code=400, detail="Invalid or expired token")
 
     # Save new password to DB (hash it first!)
-    update_user_password(verified_data, new_password)
+    # this also bumps the token version, dropping the user's cached tokens and refresh sessions on every worker
+    try:
+        update_user_password(verified_data, new_password)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid or expired token")
 
-    return {"message": "Password updated successfully."}
+    return PASSWORD_UPDATED()
 
 @app.get("/profile")
 def read_users_profile(current_user: User = Depends(get_current_active_user)):
-    user_data = {
-        "username": current_user.username,
-        "role": current_user.role,
-        "email": current_user.email,
-        # "message": f"Welcome back, {current_user.full_name}!",
-    }
-    return user_data
+    return FastJSONResponse(_profile(current_user))
 
 def send_reset_email(to_email: str, token: str):
     reset_link = f"{API_BASE}/reset-password?token={token}"
 
+    from email.message import EmailMessage
     msg = EmailMessage()
     msg['Subject'] = "Reset your password"
     msg['From'] = smtp_email
@@ -126,18 +319,103 @@ def send_reset_email(to_email: str, token: str):
     If you did not request a password reset, please ignore this email.
     """)
 
-    with smtplib.SMTP_SSL("smtp.gmail.com", 465) as smtp:
-        smtp.login(smtp_email, smtp_passkey)
-        smtp.send_message(msg)
+    # only queued here, delivery happens on the email worker thread
+    get_email_queue().enqueue(msg)
 
 @app.get("/admin/dashboard")
 def get_admin_dashboard(user: User = Depends(require_admin)):
-    return {"msg": f"Welcome Admin {user.username}"}
+    return FastJSONResponse({"msg": f"Welcome Admin {user.username}"})
+
+@app.put("/admin/users/{username}/role")
+def change_user_role(username: str, role: str = Form(...), user: User = Depends(require_admin)):
+    # every worker drops its cached tokens for the user and their sessions end
+    try:
+        set_user_role(username, role)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="User not found")
+    return {"username": username, "role": role}
+
+LISTED_FIELDS = ("username", "email", "full_name", "role", "disabled")
+
+def _encode_cursor(username: str) -> str:
+    return base64.urlsafe_b64encode(username.encode()).decode().rstrip("=")
+
+def _decode_cursor(cursor: str) -> str:
+    try:
+        return base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+# list and search users, ordered by username; pass next_cursor back as ?cursor= for the following page
+@app.get("/admin/users")
+def list_users(prefix: str | None = None, email_domain: str | None = None, role: str | None = None,
+               disabled: bool | None = None, cursor: str | None = None, limit: int = 50,
+               user: User = Depends(require_admin)):
+    limit = min(max(1, limit), 1000)
+    after = _decode_cursor(cursor) if cursor else None
+    # one extra record tells whether there is a next page
+    records = find_users(prefix, email_domain, role, disabled, after, limit + 1)
+    next_cursor = _encode_cursor(records[limit - 1].username) if len(records) > limit else None
+
+    def body():
+        # written out record by record instead of building the whole response document first
+        yield '{"users": ['
+        for i, record in enumerate(records[:limit]):
+            listed = {field: getattr(record, field) for field in LISTED_FIELDS}
+            yield ("," if i else "") + json.dumps(listed)
+        yield f'], "next_cursor": {json.dumps(next_cursor)}}}'
+
+    return StreamingResponse(body(), media_type="application/json")
+
+# bulk provisioning: the body is NDJSON or CSV (see bulk.py), e.g.
+# curl -X POST --data-binary @users.ndjson -H "Authorization: Bearer ..." /admin/users/import?format=ndjson
+@app.post("/admin/users/import")
+async def import_users(request: Request, format: str = "ndjson", batch_size: int = 500,
+                       user: User = Depends(require_admin)):
+    if format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="format must be ndjson or csv")
+    # spool the upload (to disk past 8 MB) instead of holding it in memory, then import off the event loop
+    with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as spool:
+        async for chunk in request.stream():
+            spool.write(chunk)
+        spool.seek(0)
+        lines = io.TextIOWrapper(spool, encoding="utf-8-sig", newline="")
+        report = await asyncio.to_thread(bulk.import_users, lines, format, max(1, batch_size))
+    logger.info(f"{user.username} imported {report['imported']} users, skipped {report['skipped']}")
+    return report
+
+@app.get("/admin/users/export")
+def export_users(format: str = "ndjson", user: User = Depends(require_admin)):
+    if format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="format must be ndjson or csv")
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(bulk.export_users(format), media_type=media_type,
+                             headers={"Content-Disposition": f"attachment; filename=users.{format}"})
+
+@app.get("/admin/token-cache")
+def get_token_cache_stats(user: User = Depends(require_admin)):
+    # hit/miss/eviction counters used to size TOKEN_CACHE_SIZE
+    return token_cache.stats()
+
+# public verification keys, so other services can check tokens without calling this API
+@app.get("/.well-known/jwks.json")
+def get_jwks():
+    return JSONResponse(content=key_ring.jwks(), headers={"Cache-Control": "public, max-age=300"})
+
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    if not metrics.enabled:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 @app.get("/reports")
 def get_reports(user: User = Depends(require_roles(["admin", "auditor"]))):
-    return {"msg": f"Reports for {user.role}"}
+    body = _reports_bodies.get(user.role)
+    if body is None:
+        body = _reports_bodies[user.role] = StaticJSON({"msg": f"Reports for {user.role}"})
+    return body()
 
 if __name__ == '__main__':
-    import uvicorn
-    uvicorn.run(app)
\ No newline at end of file
+    # serve.py picks the worker count and checks the shared state setup
+    import serve
+    serve.main()
\ No newline at end of file
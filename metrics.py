@@ -0,0 +1,190 @@
+import bisect
+import threading
+import time
+from utils import METRICS_ENABLED
+
+# latency buckets in seconds, the usual Prometheus defaults plus room for bcrypt
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class MetricsRegistry:
+    """
+    Counters and latency histograms with Prometheus text exposition.
+
+    To keep the hot path free of locks every thread writes to its own shard (a
+    plain dict reached through threading.local); shards are only summed when
+    /metrics is scraped. The one lock is taken once per thread, the first time
+    it records something.
+    """
+
+    def __init__(self, enabled: bool = True, buckets=DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.buckets = tuple(buckets)
+        self._local = threading.local()
+        self._shards = []
+        self._shards_lock = threading.Lock()
+        self._help = {}
+        self._types = {}
+        self._gauges = {}  # name -> callable returning a number or {labels: number}
+
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = {}
+            with self._shards_lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+        return shard
+
+    def describe(self, name: str, kind: str, help_text: str):
+        self._types[name] = kind
+        self._help[name] = help_text
+
+    def inc(self, name: str, labels: tuple = (), value: float = 1):
+        if not self.enabled:
+            return
+        shard = self._shard()
+        key = (name, labels)
+        shard[key] = shard.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, labels: tuple = ()):
+        if not self.enabled:
+            return
+        shard = self._shard()
+        key = (name, labels)
+        hist = shard.get(key)
+        if hist is None:
+            # one slot per bucket plus +Inf, then the sum of observations
+            hist = shard[key] = [0] * (len(self.buckets) + 2)
+        hist[bisect.bisect_left(self.buckets, seconds)] += 1
+        hist[-1] += seconds
+
+    def gauge(self, name: str, help_text: str, func):
+        self.describe(name, "gauge", help_text)
+        self._gauges[name] = func
+
+    def timer(self, stage: str):
+        """Context manager recording the time spent in a named stage of request handling."""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _StageTimer(self, stage)
+
+    def _collect(self):
+        with self._shards_lock:
+            shards = list(self._shards)
+        counters, histograms = {}, {}
+        for shard in shards:
+            for key, value in list(shard.items()):
+                if isinstance(value, list):
+                    total = histograms.setdefault(key, [0] * len(value))
+                    for i, v in enumerate(value):
+                        total[i] += v
+                else:
+                    counters[key] = counters.get(key, 0) + value
+        return counters, histograms
+
+    def render(self) -> str:
+        """Prometheus text exposition format."""
+        counters, histograms = self._collect()
+        lines = []
+        described = set()
+
+        def header(name):
+            if name not in described:
+                described.add(name)
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} {self._types.get(name, 'untyped')}")
+
+        for (name, labels), value in sorted(counters.items()):
+            header(name)
+            lines.append(f"{name}{_labels(labels)} {value}")
+        for (name, labels), hist in sorted(histograms.items()):
+            header(name)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), hist[:-1]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {hist[-1]}")
+            lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+        for name, func in sorted(self._gauges.items()):
+            header(name)
+            value = func()
+            if isinstance(value, dict):
+                for labels, v in sorted(value.items()):
+                    lines.append(f"{name}{_labels(labels)} {v}")
+            else:
+                lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+class _StageTimer:
+    __slots__ = ("registry", "labels", "started")
+
+    def __init__(self, registry, stage):
+        self.registry = registry
+        self.labels = (("stage", stage),)
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry.observe("auth_stage_duration_seconds", time.perf_counter() - self.started, self.labels)
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class MetricsMiddleware:
+    """ASGI middleware counting requests and timing them per route template (e.g. /profile)."""
+
+    def __init__(self, app, registry):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.registry.enabled:
+            await self.app(scope, receive, send)
+            return
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # the router stores the matched route in the scope, use its template so ids don't explode label sets
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            method = scope["method"]
+            self.registry.observe("http_request_duration_seconds", time.perf_counter() - started,
+                                  (("method", method), ("route", path)))
+            self.registry.inc("http_requests_total", (("method", method), ("route", path), ("status", str(status_code))))
+
+
+metrics = MetricsRegistry(enabled=METRICS_ENABLED)
+metrics.describe("http_requests_total", "counter", "HTTP requests by route and status code.")
+metrics.describe("http_request_duration_seconds", "histogram", "HTTP request latency by route.")
+metrics.describe("auth_stage_duration_seconds", "histogram",
+                 "Time spent per stage: password_verify, password_hash, jwt_encode, jwt_decode, store_read, store_write, email_send.")
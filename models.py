@@ -1,8 +1,12 @@
+import sys
 from pydantic import BaseModel,EmailStr
 
 class Token(BaseModel):
     access_token: str
     token_type: str
+    expires_in: int | None = None
+    refresh_token: str | None = None
+    profile: dict | None = None  # only with /token?include_profile=true
 
 class TokenData(BaseModel):
     username: str | None = None
@@ -16,6 +20,74 @@ class User(BaseModel):
 
 class UserInDB(User):
     hashed_password: str
+    token_version: int = 0  # bumped on password change/disable, older tokens stop being accepted
+
+class TokenUser:
+    """Identity rebuilt from signed JWT claims alone, used by claims-only authorization."""
+    __slots__ = ("username", "role", "disabled", "token_version")
+
+    def __init__(self, username: str, role: str, disabled: bool = False, token_version: int = 0):
+        self.username = username
+        self.role = role
+        self.disabled = disabled
+        self.token_version = token_version
+
+def normalize_disabled(value) -> bool:
+    # older JSON records store the flag as the string "False"/"True"
+    if isinstance(value, str):
+        return value.strip().lower() in ("true", "1", "yes")
+    return bool(value)
+
+class UserRecord:
+    """
+    A stored user as the user stores keep it in memory: fixed slots instead of a dict
+    (about half the memory per user) with types already normalized, so lookups hand it out
+    as is. Records are treated as immutable; changes build a new one with `replace`.
+
+    It is not validated: data is checked by `UserInDB` where it enters the system
+    (signup, bulk import) and records are only built from what the stores hold.
+    """
+    FIELDS = ("username", "email", "full_name", "role", "disabled", "hashed_password", "token_version")
+    __slots__ = FIELDS
+
+    def __init__(self, username: str, email: str, full_name: str, role: str, disabled: bool,
+                 hashed_password: str, token_version: int = 0):
+        self.username = username
+        self.email = email or ""
+        self.full_name = full_name or ""
+        # a handful of distinct roles shared by every record
+        self.role = sys.intern(role or "user")
+        self.disabled = normalize_disabled(disabled)
+        self.hashed_password = hashed_password
+        self.token_version = int(token_version or 0)
+
+    @classmethod
+    def from_dict(cls, data: dict, username: str = None):
+        return cls(
+            username or data["username"],
+            data.get("email"),
+            data.get("full_name"),
+            data.get("role"),
+            data.get("disabled", False),
+            data["hashed_password"],
+            data.get("token_version", 0),
+        )
+
+    @classmethod
+    def from_model(cls, user: "UserInDB"):
+        return cls(user.username, user.email, user.full_name, user.role, user.disabled,
+                   user.hashed_password, user.token_version)
+
+    def to_dict(self) -> dict:
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def replace(self, **fields):
+        values = self.to_dict()
+        values.update(fields)
+        return UserRecord(**values)
+
+    def __repr__(self):
+        return f"UserRecord(username={self.username!r}, role={self.role!r}, disabled={self.disabled})"
 
 class EmailSchema(BaseModel):
     username: str
@@ -0,0 +1,115 @@
+import math
+import threading
+import time
+from fastapi import HTTPException
+
+
+def parse_limit(spec: str) -> tuple[int, float]:
+    # "5/60" -> 5 requests per 60 seconds
+    count, seconds = spec.split("/")
+    return int(count), float(seconds)
+
+
+class MemoryRateLimitBackend:
+    """
+    Sliding-window counters kept in this process.
+
+    Each key holds three numbers: the current fixed window index, its count and
+    the previous window's count. The sliding estimate weights the previous window
+    by how much of it still overlaps the last `window` seconds, which is accurate
+    enough for throttling and needs no per-request timestamps.
+    """
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._counters = {}  # key -> [window index, count, previous count]
+        self._lock = threading.Lock()
+
+    def hit(self, key: str, limit: int, window: float, now: float = None) -> float:
+        """Count one request. Returns 0 if allowed, otherwise seconds until a retry can succeed."""
+        now = time.time() if now is None else now
+        index = int(now // window)
+        with self._lock:
+            counter = self._counters.get(key)
+            if counter is None:
+                if len(self._counters) >= self.max_keys:
+                    self._prune(index)
+                counter = self._counters[key] = [index, 0, 0]
+            elif counter[0] != index:
+                # roll over: the old current window becomes the previous one (or zero if it's older than that)
+                counter[2] = counter[1] if counter[0] == index - 1 else 0
+                counter[1] = 0
+                counter[0] = index
+            elapsed = now - index * window
+            estimate = counter[2] * (1 - elapsed / window) + counter[1]
+            if estimate + 1 > limit:
+                return max(1.0, (index + 1) * window - now)
+            counter[1] += 1
+            return 0.0
+
+    def _prune(self, index):
+        # caller holds self._lock; drop keys that have been quiet for two windows
+        stale = [key for key, counter in self._counters.items() if counter[0] < index - 1]
+        for key in stale:
+            del self._counters[key]
+
+    def reset(self, key: str):
+        with self._lock:
+            self._counters.pop(key, None)
+
+
+class SharedRateLimitBackend:
+    """
+    The same sliding-window estimate with counters in the shared state, so all
+    workers count against one limit. Each fixed window is its own counter key that
+    expires after two windows. The counter is incremented before the check, so
+    refused requests count too; that only makes a flood back off a bit longer.
+    """
+
+    def __init__(self, shared):
+        self.shared = shared
+
+    def hit(self, key: str, limit: int, window: float, now: float = None) -> float:
+        now = time.time() if now is None else now
+        index = int(now // window)
+        current = self.shared.incr(f"rl:{key}:{index}", ttl=2 * window)
+        previous = int(self.shared.get(f"rl:{key}:{index - 1}") or 0)
+        elapsed = now - index * window
+        estimate = previous * (1 - elapsed / window) + current
+        if estimate > limit:
+            return max(1.0, (index + 1) * window - now)
+        return 0.0
+
+    def reset(self, key: str):
+        self.shared.delete(*self.shared.scan_prefix(f"rl:{key}:"))
+
+
+class RateLimiter:
+    """
+    Named limit rules, e.g. {"login_ip": (20, 60), "login_user": (5, 60)}.
+
+    Endpoints call `check` before doing any expensive work (bcrypt, sending mail);
+    going over a limit raises 429 with a Retry-After header.
+    """
+
+    def __init__(self, rules: dict, backend=None, enabled: bool = True):
+        self.rules = rules
+        self.backend = backend or MemoryRateLimitBackend()
+        self.enabled = enabled
+
+    def check(self, **subjects):
+        """check(login_ip="1.2.3.4", login_user="john") -> raises 429 if any rule is exceeded."""
+        if not self.enabled:
+            return
+        retry_after = 0.0
+        for rule, subject in subjects.items():
+            if subject is None or rule not in self.rules:
+                continue
+            limit, window = self.rules[rule]
+            retry_after = max(retry_after, self.backend.hit(f"{rule}:{subject}", limit, window))
+        if retry_after:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests, please try again later",
+                headers={"Retry-After": str(math.ceil(retry_after))},
+            )
@@ -0,0 +1,97 @@
+import hashlib
+import secrets
+import time
+import uuid
+from shared_state import MemorySharedState
+
+
+class InvalidRefreshToken(Exception):
+    pass
+
+
+class RefreshTokenReused(InvalidRefreshToken):
+    def __init__(self, username: str):
+        super().__init__(username)
+        self.username = username
+
+
+class RefreshTokenStore:
+    """
+    Server-side refresh tokens with rotation and reuse detection.
+
+    Refresh tokens are opaque random strings; only their SHA-256 is kept. Each login
+    starts a token family and every refresh swaps the presented token for a new one
+    in the same family. Presenting a token that was already swapped means it leaked
+    (or a client replayed it), so the whole family is revoked, including the access
+    tokens issued through it.
+    """
+
+    def __init__(self, revocation_list, ttl_seconds: float = 7 * 24 * 3600, shared=None):
+        self.revocation_list = revocation_list
+        self.ttl_seconds = ttl_seconds
+        # keys live in the shared state so any worker can rotate a token another worker issued:
+        #   rt:<digest>       -> "<username> <family> <expires_at>"
+        #   rt-used:<digest>  -> set once the token has been spent (atomic, so two workers can't both spend it)
+        #   rt-family-owner:<family> -> username; rt-user:<username> -> set of families
+        #   rt-family:<family>, rt-access:<family> -> sets of refresh digests and "jti exp" access tokens
+        self.shared = shared or MemorySharedState()
+
+    @staticmethod
+    def _digest(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def issue(self, username: str, family: str = None) -> tuple[str, str]:
+        """Create a refresh token, in a new family unless one is given. Returns (token, family)."""
+        token = secrets.token_urlsafe(32)
+        digest = self._digest(token)
+        if family is None or self.shared.get(f"rt-family-owner:{family}") is None:
+            family = uuid.uuid4().hex
+            self.shared.set(f"rt-family-owner:{family}", username, self.ttl_seconds)
+            self.shared.sadd(f"rt-user:{username}", family, self.ttl_seconds)
+        expires_at = time.time() + self.ttl_seconds
+        self.shared.set(f"rt:{digest}", f"{username} {family} {expires_at}", self.ttl_seconds)
+        self.shared.sadd(f"rt-family:{family}", digest, self.ttl_seconds)
+        return token, family
+
+    def track_access_token(self, family: str, jti: str, exp: float):
+        # remembered so a reused refresh token also kills the access tokens of its family
+        self.shared.sadd(f"rt-access:{family}", f"{jti} {exp}", self.ttl_seconds)
+
+    def rotate(self, token: str) -> tuple[str, str]:
+        """Spend a refresh token. Returns (username, family) for issuing its replacement."""
+        digest = self._digest(token)
+        record = self.shared.get(f"rt:{digest}")
+        if record is None:
+            raise InvalidRefreshToken()
+        username, family, expires_at = record.rsplit(" ", 2)
+        if not self.shared.set_if_absent(f"rt-used:{digest}", "1", self.ttl_seconds):
+            self._revoke_family(family)
+            raise RefreshTokenReused(username)
+        if float(expires_at) <= time.time():
+            self.shared.delete(f"rt:{digest}")
+            raise InvalidRefreshToken()
+        return username, family
+
+    def revoke(self, token: str):
+        record = self.shared.get(f"rt:{self._digest(token)}")
+        if record is not None:
+            self._revoke_family(record.rsplit(" ", 2)[1])
+
+    def revoke_user(self, username: str):
+        for family in self.shared.smembers(f"rt-user:{username}"):
+            self._revoke_family(family)
+        self.shared.delete(f"rt-user:{username}")
+
+    def _revoke_family(self, family):
+        digests = self.shared.smembers(f"rt-family:{family}")
+        self.shared.delete(*[f"rt:{digest}" for digest in digests])
+        now = time.time()
+        for item in self.shared.smembers(f"rt-access:{family}"):
+            jti, exp = item.split(" ")
+            if float(exp) > now:
+                self.revocation_list.revoke(jti, float(exp))
+        self.shared.delete(f"rt-family:{family}", f"rt-access:{family}", f"rt-family-owner:{family}")
+
+    def prune(self):
+        """Drop expired refresh tokens (a no-op with Redis, which expires keys itself)."""
+        self.shared.cleanup()
@@ -0,0 +1,109 @@
+import hashlib
+import threading
+import time
+
+
+class ConsumedTokens:
+    """
+    Digests of spent reset tokens, kept in this process until the token would have
+    expired anyway.
+
+    Each entry is a 16 byte digest and the token's issue time. The set is bounded:
+    when it is full, expired entries go first; if that is not enough, the older half
+    is dropped and every token issued up to the newest dropped one is refused from
+    then on. Overflow therefore refuses unused tokens (the user asks for a new link)
+    but never lets a spent one through again.
+    """
+
+    def __init__(self, max_age: float, capacity: int = 100000):
+        self.max_age = max_age
+        self.capacity = capacity
+        self._used = {}  # digest -> issued at (unix time)
+        self._floor = 0.0  # tokens issued at or before this are refused
+        self._lock = threading.Lock()
+
+    def add(self, token: str, issued_at: float) -> bool:
+        """Mark a token spent. False if it was already spent (or is older than the floor)."""
+        digest = hashlib.sha256(token.encode()).digest()[:16]
+        with self._lock:
+            if issued_at <= self._floor or digest in self._used:
+                return False
+            if len(self._used) >= self.capacity:
+                self._prune()
+            self._used[digest] = issued_at
+            return True
+
+    def _prune(self):
+        # caller holds self._lock
+        cutoff = time.time() - self.max_age
+        self._used = {digest: issued for digest, issued in self._used.items() if issued > cutoff}
+        if len(self._used) >= self.capacity:
+            self._floor = sorted(self._used.values())[len(self._used) // 2]
+            self._used = {digest: issued for digest, issued in self._used.items() if issued > self._floor}
+
+    def __len__(self):
+        return len(self._used)
+
+
+class SharedConsumedTokens:
+    """Spent reset tokens in the shared state, so a token spent on one worker is refused by all."""
+
+    def __init__(self, shared, max_age: float):
+        self.shared = shared
+        self.max_age = max_age
+
+    def add(self, token: str, issued_at: float) -> bool:
+        ttl = issued_at + self.max_age - time.time()
+        if ttl <= 0:
+            return False
+        digest = hashlib.sha256(token.encode()).hexdigest()[:32]
+        return self.shared.set_if_absent(f"reset-used:{digest}", "1", ttl)
+
+
+class ResetTokenStore:
+    """
+    Signed, single-use password reset tokens.
+
+    Tokens are itsdangerous URL-safe timed tokens carrying the username and email.
+    The serializer is built once, on first use. The salt namespaces the signature:
+    even with the same secret key, only tokens made for password resets verify here,
+    so tokens from other parts of the app can't be swapped in.
+
+    `consume` checks the signature and age, then records the token as spent, so a
+    reset link works exactly once.
+    """
+
+    def __init__(self, secret_key: str, salt: str, max_age: float = 3600, consumed=None):
+        self.secret_key = secret_key
+        self.salt = salt
+        self.max_age = max_age
+        self.consumed = consumed if consumed is not None else ConsumedTokens(max_age)
+        self._serializer = None
+
+    @property
+    def serializer(self):
+        if self._serializer is None:
+            # two threads racing here build identical serializers, either one will do
+            from itsdangerous import URLSafeTimedSerializer  # only needed for password resets
+            self._serializer = URLSafeTimedSerializer(self.secret_key, salt=self.salt)
+        return self._serializer
+
+    def generate(self, username: str, email: str) -> str:
+        return self.serializer.dumps({"email": email, "username": username})
+
+    def _load(self, token: str):
+        try:
+            return self.serializer.loads(token, max_age=self.max_age, return_timestamp=True)
+        except Exception:
+            return None, None
+
+    def verify(self, token: str):
+        """The token's data if it is valid and not expired, spent or not; None otherwise."""
+        return self._load(token)[0]
+
+    def consume(self, token: str):
+        """The token's data the first time a valid token is presented; None if invalid, expired or spent."""
+        data, issued = self._load(token)
+        if data is None or not self.consumed.add(token, issued.timestamp()):
+            return None
+        return data
@@ -0,0 +1,82 @@
+import threading
+import time
+from bloom import BloomFilter
+from shared_state import WORKER_ID
+
+
+class RevocationList:
+    """
+    Revoked access token ids (`jti`) kept until the token would have expired anyway.
+
+    Every authenticated request asks `is_revoked`; almost always the answer is no,
+    and a Bloom filter answers that without touching the exact set. Only filter
+    hits (real revocations or the odd false positive) look at the dict. Expired
+    entries are pruned and the filter rebuilt when it fills up.
+
+    With shared state, revocations are also stored there (expiring with the token)
+    and broadcast, so every worker adds them to its own filter; a worker that
+    starts later loads the stored ones.
+    """
+
+    CHANNEL = "revocations"
+
+    def __init__(self, capacity: int = 100000, error_rate: float = 0.001):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._revoked = {}  # jti -> exp (unix time)
+        self._bloom = BloomFilter(capacity, error_rate)
+        self._lock = threading.Lock()
+        self.shared = None
+
+    def attach(self, shared):
+        """Share revocations with other workers through `shared` (see shared_state.py)."""
+        self.shared = shared
+        shared.subscribe(self.CHANNEL, self._on_message)
+        for key in shared.scan_prefix("revoked:"):
+            exp = shared.get(key)
+            if exp is not None:
+                self._add(key[len("revoked:"):], float(exp))
+
+    def _on_message(self, message: str):
+        origin, jti, exp = message.split(" ")
+        if origin != WORKER_ID:
+            self._add(jti, float(exp))
+
+    def revoke(self, jti: str, exp: float):
+        if not jti:
+            return
+        self._add(jti, exp)
+        if self.shared is not None:
+            ttl = exp - time.time()
+            if ttl > 0:
+                self.shared.set(f"revoked:{jti}", str(exp), ttl)
+                self.shared.publish(self.CHANNEL, f"{WORKER_ID} {jti} {exp}")
+
+    def _add(self, jti: str, exp: float):
+        with self._lock:
+            self._revoked[jti] = exp
+            if self._bloom.is_full:
+                self._rebuild()
+            self._bloom.add(jti)
+
+    def is_revoked(self, jti: str) -> bool:
+        if not jti or not self._bloom.might_contain(jti):
+            return False
+        return jti in self._revoked
+
+    def _rebuild(self):
+        # caller holds self._lock
+        now = time.time()
+        self._revoked = {jti: exp for jti, exp in self._revoked.items() if exp > now}
+        capacity = max(self.capacity, len(self._revoked) * 2)
+        bloom = BloomFilter(capacity, self.error_rate)
+        for jti in self._revoked:
+            bloom.add(jti)
+        self._bloom = bloom
+
+    def prune(self):
+        with self._lock:
+            self._rebuild()
+
+    def __len__(self):
+        return len(self._revoked)
@@ -0,0 +1,51 @@
+"""
+Runs the API under uvicorn, with one worker process per core once shared state is set up.
+
+    python serve.py [--workers N] [--host 0.0.0.0] [--port 8000]
+
+Workers share nothing in memory, so more than one needs SHARED_STATE_URL pointing at
+Redis (for local runs: `python -m shared_state fake-server` and
+SHARED_STATE_URL=redis://127.0.0.1:6390/0). Without it the default is a single worker.
+Users are shared through the user store as before.
+"""
+import argparse
+import os
+import sys
+
+
+def _shared_state_url() -> str:
+    # from the settings, so a SHARED_STATE_URL in .env counts too
+    from utils import settings
+    return settings.shared_state_url
+
+
+def default_workers() -> int:
+    # WEB_CONCURRENCY is the usual knob on hosting platforms
+    if os.getenv("WEB_CONCURRENCY"):
+        return int(os.environ["WEB_CONCURRENCY"])
+    if _shared_state_url().startswith("memory://"):
+        return 1
+    return os.cpu_count() or 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the API with multiple workers")
+    parser.add_argument("--host", default=os.getenv("HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", 8000)))
+    parser.add_argument("--workers", type=int, default=default_workers())
+    args = parser.parse_args(argv)
+
+    workers = max(1, args.workers)
+    if workers > 1 and _shared_state_url().startswith("memory://"):
+        sys.exit("More than one worker needs SHARED_STATE_URL=redis://... "
+                 "(refresh tokens, revocations and rate limits would otherwise differ per worker)")
+    # each worker has its own hashing pool, split the cores between them instead of multiplying them
+    os.environ.setdefault("HASH_POOL_SIZE", str(max(1, (os.cpu_count() or 1) // workers)))
+
+    import uvicorn
+    print(f"Starting {workers} worker(s) on {args.host}:{args.port}")
+    uvicorn.run("main:app", host=args.host, port=args.port, workers=workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""
+State shared between uvicorn workers: rate limit counters, refresh tokens, revoked
+token ids and user-change notifications.
+
+"memory://" (the default) keeps everything inside the process, which is only right
+for a single worker. "redis://host:port/db" uses Redis (needs the `redis` package).
+For local multi-worker runs and tests, `python -m shared_state fake-server` starts a
+Redis-compatible stand-in (needs `fakeredis`).
+"""
+import threading
+import time
+import uuid
+from Logging.Logger import CustomLogger
+
+logger = CustomLogger(logger_name='Shared State', dir_name="logs").get_logger()
+
+# tags broadcasts so a worker can skip the ones it sent itself
+WORKER_ID = uuid.uuid4().hex
+
+
+class MemorySharedState:
+    """In-process implementation of the shared state interface, values are strings."""
+
+    def __init__(self):
+        self._data = {}  # key -> (value, expires_at or None)
+        self._lock = threading.Lock()
+        self._subscribers = {}  # channel -> list of callbacks
+
+    def _get_live(self, key):
+        # caller holds self._lock
+        item = self._data.get(key)
+        if item is None:
+            return None
+        if item[1] is not None and item[1] <= time.time():
+            del self._data[key]
+            return None
+        return item
+
+    @staticmethod
+    def _expiry(ttl):
+        return time.time() + ttl if ttl else None
+
+    def get(self, key: str):
+        with self._lock:
+            item = self._get_live(key)
+            return item[0] if item is not None and not isinstance(item[0], set) else None
+
+    def set(self, key: str, value: str, ttl: float = None):
+        with self._lock:
+            self._data[key] = (str(value), self._expiry(ttl))
+
+    def set_if_absent(self, key: str, value: str, ttl: float = None) -> bool:
+        with self._lock:
+            if self._get_live(key) is not None:
+                return False
+            self._data[key] = (str(value), self._expiry(ttl))
+            return True
+
+    def delete(self, *keys: str):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def incr(self, key: str, ttl: float = None) -> int:
+        # the ttl is set when the counter is created, like INCR + EXPIRE NX
+        with self._lock:
+            item = self._get_live(key)
+            if item is None:
+                self._data[key] = ("1", self._expiry(ttl))
+                return 1
+            value = int(item[0]) + 1
+            self._data[key] = (str(value), item[1])
+            return value
+
+    def sadd(self, key: str, member: str, ttl: float = None):
+        with self._lock:
+            item = self._get_live(key)
+            members = item[0] if item is not None else set()
+            members.add(member)
+            self._data[key] = (members, self._expiry(ttl) if ttl else (item[1] if item else None))
+
+    def smembers(self, key: str) -> set:
+        with self._lock:
+            item = self._get_live(key)
+            return set(item[0]) if item is not None else set()
+
+    def scan_prefix(self, prefix: str):
+        with self._lock:
+            keys = [key for key in self._data if key.startswith(prefix)]
+        return [key for key in keys if self.get(key) is not None]
+
+    def publish(self, channel: str, message: str):
+        for callback in list(self._subscribers.get(channel, ())):
+            callback(message)
+
+    def subscribe(self, channel: str, callback):
+        self._subscribers.setdefault(channel, []).append(callback)
+
+    def cleanup(self):
+        """Drop expired keys (Redis does this by itself)."""
+        with self._lock:
+            now = time.time()
+            for key in [key for key, item in self._data.items() if item[1] is not None and item[1] <= now]:
+                del self._data[key]
+
+    def close(self):
+        pass
+
+
+class RedisSharedState:
+    """Shared state in Redis; pub/sub messages are delivered on a background thread."""
+
+    def __init__(self, url: str):
+        import redis  # optional dependency, only needed for multi-worker deployments
+        self._redis = redis.Redis.from_url(url, decode_responses=True)
+        self._pubsub = None
+        self._listener = None
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        return self._redis.get(key)
+
+    def set(self, key: str, value: str, ttl: float = None):
+        self._redis.set(key, value, px=int(ttl * 1000) if ttl else None)
+
+    def set_if_absent(self, key: str, value: str, ttl: float = None) -> bool:
+        return bool(self._redis.set(key, value, nx=True, px=int(ttl * 1000) if ttl else None))
+
+    def delete(self, *keys: str):
+        if keys:
+            self._redis.delete(*keys)
+
+    def incr(self, key: str, ttl: float = None) -> int:
+        pipe = self._redis.pipeline()
+        pipe.incr(key)
+        if ttl:
+            pipe.pexpire(key, int(ttl * 1000), nx=True)
+        return pipe.execute()[0]
+
+    def sadd(self, key: str, member: str, ttl: float = None):
+        pipe = self._redis.pipeline()
+        pipe.sadd(key, member)
+        if ttl:
+            pipe.pexpire(key, int(ttl * 1000))
+        pipe.execute()
+
+    def smembers(self, key: str) -> set:
+        return set(self._redis.smembers(key))
+
+    def scan_prefix(self, prefix: str):
+        return list(self._redis.scan_iter(match=prefix + "*", count=1000))
+
+    def publish(self, channel: str, message: str):
+        self._redis.publish(channel, message)
+
+    def subscribe(self, channel: str, callback):
+        with self._lock:
+            if self._pubsub is None:
+                self._pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+            self._pubsub.subscribe(**{channel: lambda message: callback(message["data"])})
+            if self._listener is None:
+                self._listener = self._pubsub.run_in_thread(sleep_time=1.0, daemon=True,
+                                                            exception_handler=self._on_listener_error)
+
+    @staticmethod
+    def _on_listener_error(error, pubsub, thread):
+        # keep listening through Redis restarts; the pubsub reconnects and resubscribes on the next read
+        logger.error(f"Shared state listener error, user-change notifications from other workers may be missed: {error}", exc_info=error)
+        time.sleep(1.0)
+
+    def cleanup(self):
+        pass
+
+    def close(self):
+        with self._lock:
+            if self._listener is not None:
+                self._listener.stop()
+                self._listener.join(timeout=2.0)
+                self._listener = None
+            if self._pubsub is not None:
+                self._pubsub.close()
+                self._pubsub = None
+        self._redis.close()
+
+
+def create_shared_state(url: str = None):
+    url = url or "memory://"
+    if url.startswith("memory://"):
+        return MemorySharedState()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisSharedState(url)
+    raise ValueError(f"Unsupported SHARED_STATE_URL: {url}")
+
+
+def serve_fake_redis(host: str = "127.0.0.1", port: int = 6390):
+    # a Redis-compatible server for local multi-worker runs and tests, not for production
+    from fakeredis import TcpFakeServer
+    server = TcpFakeServer((host, port), server_type="redis")
+    print(f"Fake Redis listening on redis://{host}:{port}/0")
+    server.serve_forever()
+
+
+def main(argv=None):
+    import argparse  # command line only, kept off the app's import path
+    parser = argparse.ArgumentParser(description="Shared state tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    fake = sub.add_parser("fake-server", help="run a local Redis-compatible stand-in")
+    fake.add_argument("--host", default="127.0.0.1")
+    fake.add_argument("--port", type=int, default=6390)
+    args = parser.parse_args(argv)
+    serve_fake_redis(args.host, args.port)
+
+
+if __name__ == "__main__":
+    main()
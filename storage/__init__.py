@@ -0,0 +1,27 @@
+from storage.base import UserStorage, DuplicateUser, DuplicateUsername, DuplicateEmail
+from storage.json_store import JsonUserStore
+from storage.journal_store import JournaledUserStore
+from storage.sharded_store import ShardedUserStore
+from storage.sqlite_store import SqliteUserStore
+
+
+def create_storage(backend: str, path: str, flush_delay: float = 0.0, compact_interval: float = 60.0,
+                   compact_threshold: int = 1000, fsync: bool = False, shards: int = 16) -> UserStorage:
+    # "json" keeps the original db_users.json file, "journal" is the same file plus an append-only
+    # change journal, "sqlite" uses a WAL mode database file, "sharded" a directory of segment files
+    backend = (backend or "json").lower()
+    if backend == "json":
+        return JsonUserStore(path, flush_delay=flush_delay)
+    if backend == "journal":
+        return JournaledUserStore(
+            path,
+            flush_delay=flush_delay,
+            compact_interval=compact_interval,
+            compact_threshold=compact_threshold,
+            fsync=fsync,
+        )
+    if backend == "sqlite":
+        return SqliteUserStore(path)
+    if backend == "sharded":
+        return ShardedUserStore(path, shards=shards, flush_delay=flush_delay)
+    raise ValueError(f"Unknown user storage backend: {backend}")
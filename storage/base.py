@@ -0,0 +1,115 @@
+def matches_filters(record, prefix: str = None, email_domain: str = None, role: str = None,
+                    disabled: bool = None) -> bool:
+    """Whether a record passes the admin listing filters (see `UserStorage.query`)."""
+    from storage.index import domain_of
+    if prefix and not record.username.startswith(prefix):
+        return False
+    if role is not None and record.role != role:
+        return False
+    if email_domain and domain_of(record.email) != email_domain.lower():
+        return False
+    return disabled is None or record.disabled == disabled
+
+
+class DuplicateUser(ValueError):
+    """A create would reuse a username or email that is already registered."""
+
+
+class DuplicateUsername(DuplicateUser):
+    pass
+
+
+class DuplicateEmail(DuplicateUser):
+    pass
+
+
+def check_new_users(records, get, get_by_email):
+    """
+    Raise DuplicateUsername / DuplicateEmail if any of `records` clashes with a stored
+    user (looked up with `get` / `get_by_email`) or with another record of the batch.
+    """
+    usernames, emails = set(), set()
+    for record in records:
+        if record.username in usernames or get(record.username) is not None:
+            raise DuplicateUsername("Username already exists")
+        email = (record.email or "").lower()
+        if email and (email in emails or get_by_email(email) is not None):
+            raise DuplicateEmail("Email already registered")
+        usernames.add(record.username)
+        if email:
+            emails.add(email)
+
+
+class UserStorage:
+    """
+    Interface every user storage backend implements.
+
+    Records are `models.UserRecord`s with normalized field types. They are shared,
+    not copied, so callers must not modify them; `update` replaces a record instead.
+    """
+
+    def get(self, username: str):
+        raise NotImplementedError
+
+    def get_by_email(self, email: str):
+        raise NotImplementedError
+
+    def put(self, username: str, record):
+        """Insert or replace a single user."""
+        raise NotImplementedError
+
+    def create(self, record):
+        """Insert a new user; raises DuplicateUsername / DuplicateEmail instead of replacing anyone."""
+        self.create_many([record])
+
+    def create_many(self, records):
+        """
+        Insert new users with one write. If any username or email is taken, by a stored
+        user or another record of the batch, raises DuplicateUser and stores none of them.
+        The check and the write are one step, also across worker processes.
+        """
+        raise NotImplementedError
+
+    def put_many(self, records):
+        """Insert or replace many users, written together where the backend can."""
+        for record in records:
+            self.put(record.username, record)
+
+    def update(self, username: str, **fields) -> bool:
+        """Update some fields of an existing user, returns False if the user does not exist."""
+        raise NotImplementedError
+
+    def update_if(self, username: str, expected: dict, **fields) -> bool:
+        """
+        Like update, but only while the stored fields still equal `expected`; returns False
+        otherwise. The comparison and the write are one step, also across worker processes.
+        """
+        raise NotImplementedError
+
+    def iter_users(self):
+        """Yield every stored user record."""
+        raise NotImplementedError
+
+    def query(self, prefix: str = None, email_domain: str = None, role: str = None, disabled: bool = None,
+              after: str = None, limit: int = 50) -> list:
+        """
+        Up to `limit` user records matching every given filter, ordered by username
+        and starting after the username `after` (the cursor of the previous page).
+        This fallback scans everything; backends override it with indexed lookups.
+        """
+        matches = [record for record in self.iter_users()
+                   if (after is None or record.username > after)
+                   and matches_filters(record, prefix, email_domain, role, disabled)]
+        matches.sort(key=lambda record: record.username)
+        return matches[:limit]
+
+    def preload(self):
+        """Load whatever the backend keeps in memory now, so the first request doesn't pay for it."""
+        pass
+
+    def invalidate(self):
+        # backends that cache data in memory drop it here
+        pass
+
+    def close(self):
+        pass
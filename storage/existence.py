@@ -0,0 +1,73 @@
+import threading
+import time
+from collections import OrderedDict
+from bloom import BloomFilter
+
+
+def email_key(email: str) -> str:
+    # usernames and emails share one filter; emails are compared case-insensitively
+    return "@" + email.lower()
+
+
+class ExistenceFilter:
+    """
+    Answers "could this user exist?" without asking the database.
+
+    Usernames and emails go into a Bloom filter, so a "no" is definite and costs a
+    single hash. `load` yields every key; it is called to build the filter and to
+    rebuild it twice as large when it fills up. A "maybe" still goes to the
+    database, and keys it didn't have are remembered for `negative_ttl` seconds, so
+    a name probed over and over (credential stuffing, or a Bloom false positive)
+    doesn't query the database each time. Adding a key removes it from that
+    negative cache.
+    """
+
+    def __init__(self, load, error_rate: float = 0.001, negative_ttl: float = 5.0, negative_size: int = 10000):
+        self.load = load
+        self.error_rate = error_rate
+        self.negative_ttl = negative_ttl
+        self.negative_size = negative_size
+        self.added = 0  # bumped by every add, see remember_missing
+        self._bloom = None
+        self._missing = OrderedDict()  # key -> expires at (monotonic)
+        self._lock = threading.Lock()
+
+    def rebuild(self, capacity: int = 100000):
+        with self._lock:
+            self._rebuild(capacity)
+
+    def _rebuild(self, capacity):
+        # caller holds self._lock
+        keys = list(self.load())
+        bloom = BloomFilter(max(capacity, len(keys) * 2), self.error_rate)
+        for key in keys:
+            bloom.add(key)
+        self._bloom = bloom
+        self.added += 1
+
+    def add(self, key: str):
+        # bits are set read-modify-write, so concurrent adds must not interleave
+        with self._lock:
+            if self._bloom.is_full:
+                # the key is already stored, so the reload picks it up
+                self._rebuild(self._bloom.capacity * 2)
+            else:
+                self._bloom.add(key)
+            self._missing.pop(key, None)
+            self.added += 1
+
+    def might_exist(self, key: str) -> bool:
+        if not self._bloom.might_contain(key):
+            return False
+        expires = self._missing.get(key)
+        return expires is None or expires < time.monotonic()
+
+    def remember_missing(self, key: str, added: int):
+        """Cache a database miss; `added` is `self.added` read before the query, a key added since is not cached."""
+        with self._lock:
+            if added != self.added:
+                return
+            self._missing[key] = time.monotonic() + self.negative_ttl
+            self._missing.move_to_end(key)
+            while len(self._missing) > self.negative_size:
+                self._missing.popitem(last=False)
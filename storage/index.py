@@ -0,0 +1,123 @@
+import bisect
+
+
+def domain_of(email) -> str:
+    return email.rsplit("@", 1)[1].lower() if email and "@" in email else ""
+
+
+def _bitmap(ids, size: int) -> int:
+    # build the int from a bytearray, OR-ing bits into a big int one by one is quadratic
+    data = bytearray((size + 7) // 8)
+    for user_id in ids:
+        data[user_id >> 3] |= 1 << (user_id & 7)
+    return int.from_bytes(data, "little")
+
+
+def _set_bits(bitmap: int):
+    # positions of the 1 bits, lowest first; str.find runs in C, far faster than shifting a huge int
+    bits = bin(bitmap)[:1:-1]
+    position = bits.find("1")
+    while position != -1:
+        yield position
+        position = bits.find("1", position + 1)
+
+
+class UserIndex:
+    """
+    Secondary indexes over the in-memory users dict, for admin listing and search.
+
+    Usernames are kept in a sorted list, so a page after a cursor or a username
+    prefix is a binary search away. Each user also gets a small integer id; roles
+    and the disabled flag are bitmaps over those ids (Python ints), so combining
+    filters is a few big-int ANDs instead of a scan over every record. Email
+    domains can number in the hundreds of thousands, so they keep id sets and a
+    bitmap is only built for the domain being searched.
+    """
+
+    def __init__(self, users: dict):
+        self._sorted = sorted(users)
+        self._names = list(self._sorted)
+        self._ids = {username: user_id for user_id, username in enumerate(self._names)}
+        roles, disabled = {}, []
+        self._domains = {}
+        for user_id, username in enumerate(self._names):
+            record = users[username]
+            roles.setdefault(record.role, []).append(user_id)
+            self._domains.setdefault(domain_of(record.email), set()).add(user_id)
+            if record.disabled:
+                disabled.append(user_id)
+        size = len(self._names)
+        self._roles = {role: _bitmap(ids, size) for role, ids in roles.items()}
+        self._disabled = _bitmap(disabled, size)
+
+    def put(self, username: str, old, new):
+        """Update the indexes for one user; `old` is the previous record or None."""
+        user_id = self._ids.get(username)
+        if user_id is None:
+            user_id = self._ids[username] = len(self._names)
+            self._names.append(username)
+            bisect.insort(self._sorted, username)
+        bit = 1 << user_id
+        if old is not None:
+            self._roles[old.role] = self._roles.get(old.role, 0) & ~bit
+            self._domains.get(domain_of(old.email), set()).discard(user_id)
+            self._disabled &= ~bit
+        self._roles[new.role] = self._roles.get(new.role, 0) | bit
+        self._domains.setdefault(domain_of(new.email), set()).add(user_id)
+        if new.disabled:
+            self._disabled |= bit
+
+    def sync(self, old: dict, new: dict) -> bool:
+        """
+        Move the index from the `old` users dict to `new` (a re-read of the file) by
+        applying only the users whose indexed fields differ. Returns False if users
+        were removed, which the index can't express; the caller rebuilds it then.
+        """
+        added = 0
+        for username, record in new.items():
+            previous = old.get(username)
+            if previous is None:
+                added += 1
+            elif (previous.role == record.role and previous.disabled == record.disabled
+                  and previous.email == record.email):
+                continue
+            self.put(username, previous, record)
+        return len(new) == len(old) + added
+
+    def query(self, prefix: str = None, email_domain: str = None, role: str = None, disabled: bool = None,
+              after: str = None, limit: int = 50) -> list:
+        """Usernames matching every given filter, in order, starting after the `after` cursor."""
+        mask = None
+        if role is not None:
+            mask = self._roles.get(role, 0)
+        if email_domain:
+            bitmap = _bitmap(self._domains.get(email_domain.lower(), ()), len(self._names))
+            mask = bitmap if mask is None else mask & bitmap
+        if disabled is not None:
+            bitmap = self._disabled if disabled else ((1 << len(self._names)) - 1) & ~self._disabled
+            mask = bitmap if mask is None else mask & bitmap
+
+        start = bisect.bisect_right(self._sorted, after) if after is not None else 0
+        if prefix:
+            start = max(start, bisect.bisect_left(self._sorted, prefix))
+
+        if mask is not None and mask.bit_count() * 16 < len(self._names):
+            # few matches: collect them straight from the bitmap instead of walking the sorted list
+            names = sorted(self._names[user_id] for user_id in _set_bits(mask))
+            first = bisect.bisect_left(names, self._sorted[start]) if start < len(self._sorted) else len(names)
+            candidates = names[first:]
+        else:
+            candidates = (self._sorted[i] for i in range(start, len(self._sorted)))
+            if mask is not None:
+                allowed = mask.to_bytes((len(self._names) + 7) // 8, "little")
+                ids = self._ids
+                candidates = (name for name in candidates if allowed[ids[name] >> 3] >> (ids[name] & 7) & 1)
+
+        page = []
+        for username in candidates:
+            if prefix and not username.startswith(prefix):
+                break
+            page.append(username)
+            if len(page) >= limit:
+                break
+        return page
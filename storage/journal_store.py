@@ -0,0 +1,137 @@
+import json
+import os
+import threading
+from models import UserRecord
+from storage.json_store import JsonUserStore, write_json_atomic
+
+
+class JournaledUserStore(JsonUserStore):
+    """
+    JSON store in append-only journal mode.
+
+    Every signup or password change appends one JSON line to `<path>.journal`
+    instead of rewriting the whole users file, so a write costs the same at any
+    user count. The current state is the snapshot (the usual users file) with the
+    journal replayed on top; reads are still served from memory. A background
+    thread periodically compacts the journal into a fresh snapshot.
+
+    Journal records are idempotent (full record puts, field updates), so replaying
+    one twice - e.g. after a crash between writing the snapshot and truncating the
+    journal - gives the same result.
+    """
+
+    def __init__(self, path: str, check_interval: float = 1.0, flush_delay: float = 0.0,
+                 compact_interval: float = 60.0, compact_threshold: int = 1000, fsync: bool = False):
+        self.journal_path = path + ".journal"
+        self.compact_interval = compact_interval
+        self.compact_threshold = compact_threshold
+        self.fsync = fsync
+        self._journal_offset = 0  # bytes of the journal already applied
+        self._journal_entries = 0
+        self._stop = threading.Event()
+        super().__init__(path, check_interval, flush_delay)
+        self._compactor = None
+        if compact_interval > 0:
+            self._compactor = threading.Thread(target=self._compact_loop, name="journal-compactor", daemon=True)
+            self._compactor.start()
+
+    def _journal_size(self):
+        try:
+            return os.stat(self.journal_path).st_size
+        except FileNotFoundError:
+            return 0
+
+    def _replay_journal(self, users, by_email, index=None):
+        try:
+            with open(self.journal_path, "rb") as file:
+                file.seek(self._journal_offset)
+                data = file.read()
+        except FileNotFoundError:
+            return
+        # a crash mid-append can leave a partial last line; it is skipped and cut off by the next writer
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            if not line:
+                continue
+            record = json.loads(line)
+            if record["op"] == "put":
+                self._apply(users, by_email, record["user"], UserRecord.from_dict(record["data"], record["user"]),
+                            index=index)
+            else:
+                self._apply(users, by_email, record["user"], fields=record["fields"], index=index)
+            self._journal_entries += 1
+        self._journal_offset += end
+
+    def _load(self, signature):
+        # caller holds self._lock
+        users, by_email = self._read_snapshot(signature)
+        self._journal_offset = 0
+        self._journal_entries = 0
+        self._replay_journal(users, by_email)
+        for username, user_record, fields in self._pending:
+            self._apply(users, by_email, username, user_record, fields)
+        self._sync_index(users)
+        self._users, self._by_email = users, by_email
+        self._signature = signature
+        self._loaded = True
+
+    def _refresh(self):
+        signature = self._file_signature()
+        journal_size = self._journal_size()
+        if not self._loaded or signature != self._signature or journal_size < self._journal_offset:
+            # first load, or another process compacted: start over from the new snapshot
+            self._load(signature)
+        elif journal_size > self._journal_offset:
+            # only read what other processes appended since our last look, the admin index follows along
+            self._replay_journal(self._users, self._by_email, self._index)
+            for username, user_record, fields in self._pending:
+                self._apply(self._users, self._by_email, username, user_record, fields, self._index)
+
+    def _write(self):
+        # caller holds self._lock and self._file_lock, and has just refreshed: append pending changes
+        data = b"".join(
+            json.dumps(
+                {"op": "put", "user": username, "data": user_record.to_dict()}
+                if user_record is not None else
+                {"op": "update", "user": username, "fields": fields}
+            ).encode() + b"\n"
+            for username, user_record, fields in self._pending
+        )
+        with open(self.journal_path, "ab") as file:
+            if self._journal_size() > self._journal_offset:
+                file.truncate(self._journal_offset)
+            file.write(data)
+            file.flush()
+            if self.fsync:
+                os.fsync(file.fileno())
+        self._journal_offset += len(data)
+        self._journal_entries += len(self._pending)
+        self._pending.clear()
+
+    def compact(self):
+        """Fold the journal into a new snapshot and truncate it."""
+        with self._lock:
+            self.flush()
+            with self._file_lock:
+                self._refresh()
+                if self._journal_size() == 0:
+                    return
+                write_json_atomic(self.path, [self._snapshot()])
+                with open(self.journal_path, "wb"):
+                    pass
+                self._signature = self._file_signature()
+                self._journal_offset = 0
+                self._journal_entries = 0
+
+    def _compact_loop(self):
+        while not self._stop.wait(self.compact_interval):
+            if self._journal_entries >= self.compact_threshold:
+                try:
+                    self.compact()
+                except Exception:
+                    # keep journaling; the next round will try again
+                    pass
+
+    def close(self):
+        self._stop.set()
+        self.compact()
@@ -0,0 +1,251 @@
+import atexit
+import json
+import os
+import tempfile
+import threading
+import time
+from models import UserRecord
+from storage.base import UserStorage, check_new_users
+from storage.filelock import FileLock
+from storage.index import UserIndex
+
+
+def write_json_atomic(path: str, data):
+    # write next to the target and rename over it, a crash mid-dump never leaves a truncated file
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w") as file:
+            json.dump(data, file, indent=4)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+class JsonUserStore(UserStorage):
+    """
+    In-memory view of the JSON users file.
+
+    The file is parsed once and kept as two hash indexes (username -> record and
+    email -> username). Lookups never touch the disk; the file is only re-read when
+    its mtime/size changes, and that stat() check itself is throttled to once per
+    `check_interval` seconds.
+
+    Writes are applied in memory and then flushed under a thread lock plus a
+    cross-process file lock: if another process changed the file since we last
+    read it, it is reloaded and our pending changes are re-applied on top before
+    the file is atomically replaced. With `flush_delay` > 0 a burst of changes is
+    written once, `flush_delay` seconds after the first one.
+    """
+
+    def __init__(self, path: str, check_interval: float = 1.0, flush_delay: float = 0.0):
+        self.path = path
+        self.check_interval = check_interval
+        self.flush_delay = flush_delay
+        self._lock = threading.RLock()
+        self._file_lock = FileLock(path)
+        self._users = {}
+        self._by_email = {}
+        self._index = None  # built on the first admin query, then kept in step with every change
+        self._pending = []  # (username, record, fields) changes not yet on disk
+        self._flush_timer = None
+        self._signature = None
+        self._loaded = False
+        self._next_check = 0.0
+        if flush_delay > 0:
+            atexit.register(self.flush)
+
+    def _file_signature(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _read_snapshot(self, signature):
+        users = {}
+        if signature is not None:
+            with open(self.path, "r") as file:
+                data = json.load(file)
+            # the file keeps every user inside the first element of a list
+            if data:
+                users = {username: UserRecord.from_dict(user_data, username)
+                         for username, user_data in data[0].items()}
+        by_email = {}
+        for username, record in users.items():
+            if record.email:
+                by_email[record.email.lower()] = username
+        return users, by_email
+
+    def _load(self, signature):
+        # caller holds self._lock
+        users, by_email = self._read_snapshot(signature)
+        # keep changes that have not been written yet
+        for username, record, fields in self._pending:
+            self._apply(users, by_email, username, record, fields)
+        self._sync_index(users)
+        # swap both indexes in one go so readers never see a half built state
+        self._users, self._by_email = users, by_email
+        self._signature = signature
+        self._loaded = True
+
+    def _refresh(self):
+        # caller holds self._lock; pick up changes other processes wrote to disk
+        signature = self._file_signature()
+        if not self._loaded or signature != self._signature:
+            self._load(signature)
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        with self._lock:
+            if now < self._next_check:
+                return
+            self._refresh()
+            self._next_check = now + self.check_interval
+
+    def _sync_index(self, users):
+        # caller holds self._lock; a re-read file usually differs by a few users, so the admin index is
+        # updated for those instead of being rebuilt from scratch on the next query
+        if self._index is not None and not self._index.sync(self._users, users):
+            self._index = None
+
+    @staticmethod
+    def _apply(users, by_email, username, record=None, fields=None, index=None):
+        old = users.get(username)
+        if record is None:
+            if old is None:
+                return False
+            # records are shared with readers, so an update builds a new one
+            record = old.replace(**fields)
+        if old is not None and old.email:
+            by_email.pop(old.email.lower(), None)
+        users[username] = record
+        if record.email:
+            by_email[record.email.lower()] = username
+        if index is not None:
+            index.put(username, old, record)
+        return True
+
+    def _mutate(self, username, record=None, fields=None):
+        return self._mutate_many([(username, record, fields)]) > 0
+
+    def _mutate_many(self, changes):
+        # one flush (one file rewrite or journal append) for the whole list of changes
+        self._maybe_reload()
+        with self._lock:
+            applied = 0
+            for username, record, fields in changes:
+                if self._apply(self._users, self._by_email, username, record, fields, self._index):
+                    self._pending.append((username, record, fields))
+                    applied += 1
+            if not applied:
+                return 0
+            if self.flush_delay > 0:
+                if self._flush_timer is None:
+                    self._flush_timer = threading.Timer(self.flush_delay, self.flush)
+                    self._flush_timer.daemon = True
+                    self._flush_timer.start()
+            else:
+                self.flush()
+            return applied
+
+    def flush(self):
+        """Write pending changes to disk."""
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            if not self._pending:
+                return
+            with self._file_lock:
+                # another worker may have written since our last read
+                self._refresh()
+                self._write()
+
+    def _write(self):
+        # caller holds self._lock and self._file_lock, and has just refreshed
+        write_json_atomic(self.path, [self._snapshot()])
+        self._pending.clear()
+        self._signature = self._file_signature()
+
+    def _snapshot(self):
+        return {username: record.to_dict() for username, record in self._users.items()}
+
+    def get(self, username: str):
+        self._maybe_reload()
+        return self._users.get(username)
+
+    def get_by_email(self, email: str):
+        self._maybe_reload()
+        username = self._by_email.get(email.lower())
+        return self._users.get(username) if username else None
+
+    def put(self, username: str, record: UserRecord):
+        self._mutate(username, record=record)
+
+    def put_many(self, records):
+        self._mutate_many([(record.username, record, None) for record in records])
+
+    def update(self, username: str, **fields):
+        return self._mutate(username, fields=fields)
+
+    def create_many(self, records):
+        records = list(records)
+        with self._lock, self._file_lock:
+            # checked against the file as it is now, under the lock every writer takes, and written
+            # before it is released, so no other worker can create the same user in between
+            self._refresh()
+            check_new_users(records, self._users.get, lambda email: self._by_email.get(email))
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            for record in records:
+                self._apply(self._users, self._by_email, record.username, record, None, self._index)
+                self._pending.append((record.username, record, None))
+            self._write()
+
+    def update_if(self, username: str, expected: dict, **fields):
+        with self._lock, self._file_lock:
+            # compared with the file as it is now and written before the lock is released, so a change
+            # another worker made in between is seen instead of overwritten
+            self._refresh()
+            record = self._users.get(username)
+            if record is None or any(getattr(record, name) != value for name, value in expected.items()):
+                return False
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            self._apply(self._users, self._by_email, username, None, fields, self._index)
+            self._pending.append((username, None, fields))
+            self._write()
+            return True
+
+    def iter_users(self):
+        self._maybe_reload()
+        yield from list(self._users.values())
+
+    def query(self, prefix=None, email_domain=None, role=None, disabled=None, after=None, limit=50):
+        self._maybe_reload()
+        with self._lock:
+            if self._index is None:
+                self._index = UserIndex(self._users)
+            usernames = self._index.query(prefix, email_domain, role, disabled, after, limit)
+            return [self._users[username] for username in usernames]
+
+    def preload(self):
+        self._maybe_reload()
+
+    def invalidate(self):
+        # force the next access to re-check the file
+        self._next_check = 0.0
+
+    def close(self):
+        self.flush()
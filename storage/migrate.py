@@ -0,0 +1,34 @@
+"""
+One-shot import of the JSON users file into the SQLite backend.
+
+    python -m storage.migrate --source db_users.json --target users.db
+"""
+import argparse
+import json
+from models import UserRecord
+from storage.sqlite_store import SqliteUserStore
+
+
+def migrate(source: str, target: str) -> int:
+    with open(source, "r") as file:
+        data = json.load(file)
+    users = data[0] if data else {}
+    store = SqliteUserStore(target)
+    try:
+        store.put_many(UserRecord.from_dict(user_data, username) for username, user_data in users.items())
+    finally:
+        store.close()
+    return len(users)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import db_users.json into a SQLite user database")
+    parser.add_argument("--source", default="db_users.json", help="JSON users file to read")
+    parser.add_argument("--target", default="users.db", help="SQLite database file to write")
+    args = parser.parse_args(argv)
+    count = migrate(args.source, args.target)
+    print(f"Imported {count} users into {args.target}")
+
+
+if __name__ == "__main__":
+    main()
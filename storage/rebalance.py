@@ -0,0 +1,76 @@
+"""
+Offline re-sharding of the sharded user store. Stop the API first.
+
+    python -m storage.rebalance --source db_users.json --target db_users.shards --shards 16
+    python -m storage.rebalance --source db_users.shards --target db_users.shards --shards 64
+    python -m storage.rebalance --source db_users.shards --target db_users.shards --shards 64 --frozen
+
+The source is a JSON users file or a sharded directory; the target is written next
+to it and swapped in at the end, so it may be the source itself. `--frozen` writes
+memory-mapped read-only segments (see storage/sharded_store.py), for large tenants
+that are mostly read.
+"""
+import argparse
+import os
+import shutil
+from storage.json_store import JsonUserStore, write_json_atomic
+from storage.sharded_store import ShardedUserStore, frozen_path, segment_path, shard_of, write_frozen, write_meta
+
+
+def _source_records(source: str):
+    if os.path.isdir(source):
+        store = ShardedUserStore(source)
+    else:
+        store = JsonUserStore(source)
+    try:
+        return list(store.iter_users())
+    finally:
+        store.close()
+
+
+def rebalance(source: str, target: str, shards: int, frozen: bool = False) -> int:
+    records = _source_records(source)
+    by_shard = [[] for _ in range(shards)]
+    for record in records:
+        by_shard[shard_of(record.username, shards)].append(record)
+
+    staging = target.rstrip(os.sep) + ".rebalance"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    for index, group in enumerate(by_shard):
+        if frozen:
+            write_frozen(frozen_path(staging, index), group)
+        else:
+            write_json_atomic(segment_path(staging, index), [{record.username: record.to_dict() for record in group}])
+    write_meta(staging, shards)
+
+    # swap the new layout in; the old one is only removed once the new one is in place
+    if os.path.exists(target):
+        retired = target.rstrip(os.sep) + ".old"
+        shutil.rmtree(retired, ignore_errors=True)
+        os.replace(target, retired)
+        os.replace(staging, target)
+        if os.path.isdir(retired):
+            shutil.rmtree(retired)
+        else:
+            os.remove(retired)
+    else:
+        os.replace(staging, target)
+    return len(records)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Change the shard count of the sharded user store (offline)")
+    parser.add_argument("--source", default="db_users.json", help="JSON users file or sharded directory to read")
+    parser.add_argument("--target", default="db_users.shards", help="sharded directory to write")
+    parser.add_argument("--shards", type=int, required=True, help="number of segments")
+    parser.add_argument("--frozen", action="store_true", help="write read-only memory-mapped segments")
+    args = parser.parse_args(argv)
+    if args.shards < 1:
+        parser.error("--shards must be at least 1")
+    count = rebalance(args.source, args.target, args.shards, args.frozen)
+    print(f"Wrote {count} users into {args.shards} segments in {args.target}")
+
+
+if __name__ == "__main__":
+    main()
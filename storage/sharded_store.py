@@ -0,0 +1,301 @@
+import bisect
+import hashlib
+import heapq
+import json
+import mmap
+import os
+import threading
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from models import UserRecord
+from storage.base import UserStorage, check_new_users, matches_filters
+from storage.filelock import FileLock
+from storage.json_store import JsonUserStore, write_json_atomic
+
+META_FILE = "meta.json"
+
+
+def shard_of(username: str, shards: int) -> int:
+    # a stable hash: Python's hash() of a str differs between processes
+    digest = hashlib.blake2b(username.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little") % shards
+
+
+def segment_path(directory: str, index: int) -> str:
+    return os.path.join(directory, f"segment-{index:04d}.json")
+
+
+def frozen_path(directory: str, index: int) -> str:
+    return os.path.join(directory, f"segment-{index:04d}.frozen")
+
+
+def read_meta(directory: str):
+    try:
+        with open(os.path.join(directory, META_FILE), "r") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+
+def write_meta(directory: str, shards: int):
+    write_json_atomic(os.path.join(directory, META_FILE), {"shards": shards, "hash": "blake2b-64"})
+
+
+def write_frozen(path: str, records):
+    """Write records as a frozen segment: one `"username"<TAB>"email"<TAB>{record}` line each, sorted by username."""
+    records = sorted(records, key=lambda record: record.username)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as file:
+        for record in records:
+            file.write(f"{json.dumps(record.username)}\t{json.dumps(record.email.lower())}\t"
+                       f"{json.dumps(record.to_dict())}\n".encode())
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+
+
+class FrozenSegment(UserStorage):
+    """
+    A read-only segment served from a memory-mapped file, for large tenants whose users
+    are rarely written.
+
+    Nothing is parsed up front: opening it only records where each line starts (8
+    bytes per user), and a lookup binary-searches the sorted lines and parses the one
+    it lands on. The OS pages the file in and out as needed, so a cold segment costs
+    almost no process memory. Each line also carries the lower-cased email, so an email
+    lookup is a byte search of the file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        self._starts = array("q")
+        position = 0
+        while position < size:
+            self._starts.append(position)
+            position = self._map.find(b"\n", position) + 1
+        self._starts.append(size)
+
+    def _username_at(self, i: int) -> str:
+        start = self._starts[i]
+        return json.loads(self._map[start:self._map.find(b"\t", start)])
+
+    def _record_at(self, i: int) -> UserRecord:
+        start, end = self._starts[i], self._starts[i + 1]
+        line = self._map[start:end]
+        return UserRecord.from_dict(json.loads(line[line.find(b"\t", line.find(b"\t") + 1) + 1:]))
+
+    def _position(self, username: str) -> int:
+        # first line whose username is >= `username`
+        lo, hi = 0, len(self._starts) - 1
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._username_at(mid) < username:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def get(self, username: str):
+        i = self._position(username)
+        if i < len(self._starts) - 1 and self._username_at(i) == username:
+            return self._record_at(i)
+        return None
+
+    def get_by_email(self, email: str):
+        found = self._map.find(b"\t" + json.dumps(email.lower()).encode() + b"\t")
+        if found < 0:
+            return None
+        return self._record_at(bisect.bisect_right(self._starts, found) - 1)
+
+    def iter_users(self):
+        for i in range(len(self._starts) - 1):
+            yield self._record_at(i)
+
+    def query(self, prefix=None, email_domain=None, role=None, disabled=None, after=None, limit=50):
+        # lines are sorted, so the scan can start at the cursor instead of the beginning
+        if after is None and not prefix:
+            return super().query(prefix, email_domain, role, disabled, after, limit)
+        start = self._position(max(after or "", prefix or ""))
+        matches = []
+        for i in range(start, len(self._starts) - 1):
+            record = self._record_at(i)
+            if prefix and not record.username.startswith(prefix):
+                break
+            if after is not None and record.username <= after:
+                continue
+            if matches_filters(record, prefix, email_domain, role, disabled):
+                matches.append(record)
+                if len(matches) >= limit:
+                    break
+        return matches
+
+    def __len__(self):
+        return len(self._starts) - 1
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+
+
+class ShardedUserStore(UserStorage):
+    """
+    Users spread over N segment files by a hash of the username.
+
+    The directory holds `meta.json` (the shard count) and one segment per shard. A
+    segment is either a regular JSON users file (`segment-NNNN.json`, served by a
+    `JsonUserStore`) or a frozen, memory-mapped one (`segment-NNNN.frozen`, see
+    `FrozenSegment`). Segments are opened on first access, `preload` loads them all
+    in parallel, and a write only rewrites the segment of that user. The first write
+    to a frozen segment turns it back into a JSON segment.
+
+    Email lookups ask every segment. Creates hold a lock on the whole directory
+    (`create.lock`) while they check every segment, so two workers can't register one
+    email in two segments. Changing the shard count is an offline job:
+    `python -m storage.rebalance`.
+    """
+
+    def __init__(self, directory: str, shards: int = 16, check_interval: float = 1.0, flush_delay: float = 0.0,
+                 load_workers: int = None):
+        self.directory = directory
+        self.check_interval = check_interval
+        self.flush_delay = flush_delay
+        self.load_workers = load_workers or min(8, os.cpu_count() or 1)
+        os.makedirs(directory, exist_ok=True)
+        meta = read_meta(directory)
+        if meta is None:
+            write_meta(directory, shards)
+            meta = {"shards": shards}
+        self.shards = int(meta["shards"])
+        self._segments = [None] * self.shards
+        self._frozen_checked = [0.0] * self.shards
+        self._lock = threading.Lock()
+        self._create_lock = FileLock(os.path.join(directory, "create"))
+        self._creating = threading.Lock()  # FileLock is per process, threads take turns on this first
+
+    def _open(self, index: int):
+        frozen = frozen_path(self.directory, index)
+        if os.path.exists(frozen):
+            return FrozenSegment(frozen)
+        return JsonUserStore(segment_path(self.directory, index), self.check_interval, self.flush_delay)
+
+    def _segment(self, index: int):
+        segment = self._segments[index]
+        if isinstance(segment, FrozenSegment):
+            # another process may have thawed it, checked at most once per check_interval
+            now = time.monotonic()
+            if now - self._frozen_checked[index] >= self.check_interval:
+                self._frozen_checked[index] = now
+                if not os.path.exists(segment.path):
+                    with self._lock:
+                        if self._segments[index] is segment:
+                            # not closed: other threads may still be reading it, the map goes away with it
+                            self._segments[index] = None
+                    segment = None
+        if segment is None:
+            # opened outside the lock so segments load side by side; if two threads race, the first one wins
+            opened = self._open(index)
+            with self._lock:
+                if self._segments[index] is None:
+                    self._segments[index] = opened
+                segment = self._segments[index]
+        return segment
+
+    def _writable(self, index: int) -> JsonUserStore:
+        segment = self._segment(index)
+        if not isinstance(segment, FrozenSegment):
+            return segment
+        path = segment_path(self.directory, index)
+        with self._lock:
+            if self._segments[index] is segment:
+                with FileLock(path):
+                    # another process may have thawed it while we waited for the lock
+                    if os.path.exists(segment.path):
+                        write_json_atomic(path, [{record.username: record.to_dict() for record in segment.iter_users()}])
+                        os.remove(segment.path)
+                self._segments[index] = JsonUserStore(path, self.check_interval, self.flush_delay)
+            return self._segments[index]
+
+    def _loaded_segments(self):
+        return [segment for segment in self._segments if segment is not None]
+
+    def get(self, username: str):
+        return self._segment(shard_of(username, self.shards)).get(username)
+
+    def get_by_email(self, email: str):
+        for index in range(self.shards):
+            record = self._segment(index).get_by_email(email)
+            if record is not None:
+                return record
+        return None
+
+    def put(self, username: str, record: UserRecord):
+        self._writable(shard_of(username, self.shards)).put(username, record)
+
+    def put_many(self, records):
+        # one write per touched segment
+        by_shard = {}
+        for record in records:
+            by_shard.setdefault(shard_of(record.username, self.shards), []).append(record)
+        for index, group in by_shard.items():
+            self._writable(index).put_many(group)
+
+    def create_many(self, records):
+        records = list(records)
+        with self._creating, self._create_lock:
+            # see what other workers wrote before checking, every segment can hold the email
+            self.invalidate()
+            check_new_users(records, self.get, self.get_by_email)
+            by_shard = {}
+            for record in records:
+                by_shard.setdefault(shard_of(record.username, self.shards), []).append(record)
+            for index, group in by_shard.items():
+                self._writable(index).create_many(group)
+
+    def update(self, username: str, **fields) -> bool:
+        index = shard_of(username, self.shards)
+        if self._segment(index).get(username) is None:
+            return False
+        return self._writable(index).update(username, **fields)
+
+    def update_if(self, username: str, expected: dict, **fields) -> bool:
+        index = shard_of(username, self.shards)
+        if self._segment(index).get(username) is None:
+            return False
+        return self._writable(index).update_if(username, expected, **fields)
+
+    def iter_users(self):
+        for index in range(self.shards):
+            yield from self._segment(index).iter_users()
+
+    def query(self, prefix=None, email_domain=None, role=None, disabled=None, after=None, limit=50):
+        # every segment returns its first `limit` matches in username order; the merged head is the page
+        pages = [self._segment(index).query(prefix, email_domain, role, disabled, after, limit)
+                 for index in range(self.shards)]
+        merged = heapq.merge(*pages, key=lambda record: record.username)
+        return [record for _, record in zip(range(limit), merged)]
+
+    def preload(self):
+        # segments are independent files, so they are read side by side
+        def load(index):
+            self._segment(index).preload()
+        with ThreadPoolExecutor(max_workers=self.load_workers, thread_name_prefix="segment-load") as pool:
+            list(pool.map(load, range(self.shards)))
+
+    def invalidate(self):
+        for segment in self._loaded_segments():
+            segment.invalidate()
+        self._frozen_checked = [0.0] * self.shards
+
+    def flush(self):
+        for segment in self._loaded_segments():
+            if isinstance(segment, JsonUserStore):
+                segment.flush()
+
+    def close(self):
+        for segment in self._loaded_segments():
+            segment.close()
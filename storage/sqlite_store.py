@@ -0,0 +1,264 @@
+import sqlite3
+import threading
+import time
+from models import UserRecord, normalize_disabled
+from storage.base import UserStorage, DuplicateEmail, DuplicateUsername
+from storage.existence import ExistenceFilter, email_key
+
+COLUMNS = ("username", "email", "full_name", "role", "disabled", "hashed_password", "token_version")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT NOT NULL PRIMARY KEY,
+    email TEXT COLLATE NOCASE,
+    full_name TEXT NOT NULL,
+    role TEXT NOT NULL DEFAULT 'user',
+    disabled INTEGER NOT NULL DEFAULT 0,
+    hashed_password TEXT NOT NULL,
+    token_version INTEGER NOT NULL DEFAULT 0
+);
+CREATE UNIQUE INDEX IF NOT EXISTS users_email_idx ON users (email);
+-- admin listing/search: each filter has an index that already returns usernames in order
+CREATE INDEX IF NOT EXISTS users_role_idx ON users (role, username);
+CREATE INDEX IF NOT EXISTS users_disabled_idx ON users (disabled, username);
+CREATE INDEX IF NOT EXISTS users_domain_idx ON users (lower(substr(email, instr(email, '@') + 1)), username);
+"""
+
+# statements are kept as module constants so sqlite3's per-connection statement cache
+# reuses the prepared form instead of re-parsing SQL on every call
+_SELECT_BY_USERNAME = f"SELECT {', '.join(COLUMNS)} FROM users WHERE username = ?"
+_SELECT_BY_EMAIL = f"SELECT {', '.join(COLUMNS)} FROM users WHERE email = ?"
+_SELECT_ALL = f"SELECT {', '.join(COLUMNS)} FROM users ORDER BY username"
+_SELECT_KEYS_AFTER = "SELECT rowid, username, email FROM users WHERE rowid > ? ORDER BY rowid"
+_INSERT = f"INSERT INTO users ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+_UPSERT = (
+    f"INSERT INTO users ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))}) "
+    "ON CONFLICT(username) DO UPDATE SET "
+    + ", ".join(f"{col} = excluded.{col}" for col in COLUMNS[1:])
+)
+
+
+def _to_row(record: UserRecord):
+    # empty emails are stored as NULL so they don't collide in the unique index
+    return (
+        record.username,
+        record.email or None,
+        record.full_name,
+        record.role,
+        int(record.disabled),
+        record.hashed_password,
+        record.token_version,
+    )
+
+
+def _duplicate(error: sqlite3.IntegrityError):
+    # the unique constraints are the username primary key and the email index
+    if "users.email" in str(error):
+        return DuplicateEmail("Email already registered")
+    if "users.username" in str(error):
+        return DuplicateUsername("Username already exists")
+    return error
+
+
+def _from_row(row):
+    # columns are in UserRecord field order, the constructor turns NULL email and 0/1 back
+    return UserRecord(*row) if row is not None else None
+
+
+class SqliteUserStore(UserStorage):
+    """
+    SQLite backend running in WAL mode.
+
+    Each worker thread gets its own long lived connection (sqlite connections cannot be
+    shared across threads), so requests never pay the connect/PRAGMA cost. Writes are
+    single row upserts.
+
+    Lookups of usernames and emails that don't exist (signup checks, logins with
+    made-up names) are answered by an in-memory existence filter without a query.
+    Users are never deleted and upserts keep their rowid, so rows inserted by other
+    processes are picked up every `check_interval` seconds by reading the rows past
+    the highest rowid seen so far.
+    """
+
+    def __init__(self, path: str, check_interval: float = 1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._existence = None
+        self._last_rowid = 0  # rows up to here are in the existence filter
+        self._next_check = 0.0
+        self._existence_lock = threading.Lock()
+        # create the schema up front so worker connections can skip it
+        conn = self._connection()
+        conn.executescript(_SCHEMA)
+        existing = {row[1] for row in conn.execute("PRAGMA table_info(users)")}
+        if "token_version" not in existing:
+            # databases created before token versions were tracked
+            conn.execute("ALTER TABLE users ADD COLUMN token_version INTEGER NOT NULL DEFAULT 0")
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, cached_statements=128, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def _existence_keys(self, after: int = 0):
+        # usernames and emails of the rows past rowid `after`, remembering the last one seen
+        for rowid, username, email in self._connection().execute(_SELECT_KEYS_AFTER, (after,)):
+            yield username
+            if email:
+                yield email_key(email)
+            self._last_rowid = rowid
+
+    def _existence_filter(self):
+        now = time.monotonic()
+        if now >= self._next_check:
+            with self._existence_lock:
+                if now >= self._next_check:
+                    if self._existence is None:
+                        existence = ExistenceFilter(self._existence_keys)
+                        existence.rebuild()
+                        self._existence = existence
+                    else:
+                        for key in self._existence_keys(self._last_rowid):
+                            self._existence.add(key)
+                    self._next_check = now + self.check_interval
+        return self._existence
+
+    def _lookup(self, statement, value, key):
+        existence = self._existence_filter()
+        if not existence.might_exist(key):
+            return None
+        added = existence.added
+        record = _from_row(self._connection().execute(statement, (value,)).fetchone())
+        if record is None:
+            existence.remember_missing(key, added)
+        return record
+
+    def _added(self, records):
+        if self._existence is not None:
+            for record in records:
+                self._existence.add(record.username)
+                if record.email:
+                    self._existence.add(email_key(record.email))
+
+    def get(self, username: str):
+        return self._lookup(_SELECT_BY_USERNAME, username, username)
+
+    def get_by_email(self, email: str):
+        return self._lookup(_SELECT_BY_EMAIL, email, email_key(email))
+
+    def put(self, username: str, record: UserRecord):
+        try:
+            self._connection().execute(_UPSERT, _to_row(record))
+        except sqlite3.IntegrityError as error:
+            raise _duplicate(error) from error
+        self._added([record])
+
+    def put_many(self, records):
+        records = list(records)
+        conn = self._connection()
+        try:
+            with conn:
+                conn.execute("BEGIN")
+                conn.executemany(_UPSERT, (_to_row(record) for record in records))
+        except sqlite3.IntegrityError as error:
+            raise _duplicate(error) from error
+        self._added(records)
+
+    def create_many(self, records):
+        # a plain INSERT: the database refuses a taken username or email, atomically for every process
+        records = list(records)
+        conn = self._connection()
+        try:
+            with conn:
+                conn.execute("BEGIN")
+                conn.executemany(_INSERT, (_to_row(record) for record in records))
+        except sqlite3.IntegrityError as error:
+            raise _duplicate(error) from error
+        self._added(records)
+
+    def update(self, username: str, **fields) -> bool:
+        return self._update(username, {}, fields)
+
+    def update_if(self, username: str, expected: dict, **fields) -> bool:
+        # the comparison is part of the UPDATE, so a change committed by anyone in between makes it match nothing
+        return self._update(username, expected, fields)
+
+    @staticmethod
+    def _columns(fields):
+        fields = {col: fields[col] for col in COLUMNS[1:] if col in fields}
+        if "disabled" in fields:
+            fields["disabled"] = int(normalize_disabled(fields["disabled"]))
+        if "email" in fields:
+            fields["email"] = fields["email"] or None
+        return fields
+
+    def _update(self, username, expected, fields) -> bool:
+        fields, expected = self._columns(fields), self._columns(expected)
+        if not fields:
+            record = self.get(username)
+            return record is not None and all(getattr(record, col) == value for col, value in expected.items())
+        assignments = ", ".join(f"{col} = ?" for col in fields)
+        conditions = "".join(f" AND {col} IS ?" for col in expected)
+        try:
+            cursor = self._connection().execute(
+                f"UPDATE users SET {assignments} WHERE username = ?{conditions}",
+                (*fields.values(), username, *expected.values()),
+            )
+        except sqlite3.IntegrityError as error:
+            raise _duplicate(error) from error
+        if cursor.rowcount and fields.get("email") and self._existence is not None:
+            self._existence.add(email_key(fields["email"]))
+        return cursor.rowcount > 0
+
+    def query(self, prefix=None, email_domain=None, role=None, disabled=None, after=None, limit=50):
+        conditions, params = [], []
+        if after is not None:
+            conditions.append("username > ?")
+            params.append(after)
+        if prefix:
+            # a range instead of LIKE, so the primary key index is used (LIKE is case-insensitive)
+            conditions.append("username >= ? AND username < ?")
+            params += [prefix, prefix + "\U0010ffff"]
+        if role is not None:
+            conditions.append("role = ?")
+            params.append(role)
+        if email_domain:
+            conditions.append("lower(substr(email, instr(email, '@') + 1)) = ?")
+            params.append(email_domain.lower())
+        if disabled is not None:
+            conditions.append("disabled = ?")
+            params.append(int(disabled))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self._connection().execute(
+            f"SELECT {', '.join(COLUMNS)} FROM users {where} ORDER BY username LIMIT ?", (*params, limit)
+        )
+        return [_from_row(row) for row in rows]
+
+    def preload(self):
+        # reads every username and email, which also pulls the table into the page cache
+        self._existence_filter()
+
+    def invalidate(self):
+        # another worker changed a user: catch up with new rows on the next lookup
+        self._next_check = 0.0
+
+    def iter_users(self):
+        for row in self._connection().execute(_SELECT_ALL):
+            yield _from_row(row)
+
+    def close(self):
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
@@ -0,0 +1,74 @@
+import os
+import shutil
+import sys
+import tempfile
+import uuid
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# the app reads its settings and opens the user store at import, so the test setup comes first:
+# a scratch directory holding a copy of the users file, and a fast, self-contained configuration
+WORK_DIR = tempfile.mkdtemp(prefix="api-auth-tests-")
+shutil.copy(os.path.join(ROOT, "db_users.json"), WORK_DIR)
+os.chdir(WORK_DIR)
+os.environ.update({
+    "SECRET_KEY": "test-secret-key-test-secret-key-0123456789",
+    "ALGORITHM": "HS256",
+    "RESET_PASSWORD_SALT": "test-reset-salt",
+    "API_BASE": "http://testserver",
+    "EMAIL_TRANSPORT": "memory",
+    "SHARED_STATE_URL": "memory://",
+    "USER_STORAGE": "json",
+    "AUTH_MODE": "claims",
+    "PASSWORD_SCHEMES": "bcrypt",
+    "BCRYPT_ROUNDS": "4",
+    # every test client request comes from one address; per-user limits keep their defaults
+    "RATE_LIMITS": "login_ip=10000/60,forgot_ip=10000/60",
+})
+for name in ("JWT_KEYS_DIR", "USER_DB_PATH"):
+    os.environ.pop(name, None)
+
+
+@pytest.fixture(scope="session")
+def app():
+    import main
+    return main.app
+
+
+@pytest.fixture(scope="session")
+def client(app):
+    from fastapi.testclient import TestClient
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def new_user(client):
+    """Sign up a fresh user and return its signup payload (the password is in `hashed_password`)."""
+    def create(role=None, **fields):
+        name = f"user-{uuid.uuid4().hex[:10]}"
+        payload = {"username": name, "email": f"{name}@example.com", "full_name": "Test User",
+                   "hashed_password": "correct horse battery staple", **fields}
+        response = client.post("/signup/", json=payload)
+        assert response.status_code == 200, response.text
+        if role is not None:
+            import database
+            database.set_user_role(name, role)
+        return payload
+    return create
+
+
+@pytest.fixture
+def login(client):
+    def login(user):
+        response = client.post("/token", data={"username": user["username"], "password": user["hashed_password"]})
+        assert response.status_code == 200, response.text
+        return response.json()
+    return login
+
+
+def bearer(token: str) -> dict:
+    return {"Authorization": f"Bearer {token}"}
@@ -0,0 +1,55 @@
+import database
+import utils
+from conftest import bearer
+
+
+def test_suite_runs_in_claims_mode():
+    assert utils.AUTH_MODE == "claims"
+
+
+def test_claims_route_then_profile_with_one_token(client, new_user, login):
+    user = new_user(role="auditor")
+    headers = bearer(login(user)["access_token"])
+    assert client.get("/reports", headers=headers).status_code == 200
+    # the claims-only entry cached by /reports must not stand in for the stored user
+    response = client.get("/profile", headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.json()["email"] == user["email"]
+    assert client.get("/reports", headers=headers).json() == {"msg": "Reports for auditor"}
+
+
+def test_profile_then_claims_route_with_one_token(client, new_user, login):
+    user = new_user(role="auditor")
+    headers = bearer(login(user)["access_token"])
+    assert client.get("/profile", headers=headers).status_code == 200
+    assert client.get("/reports", headers=headers).status_code == 200
+
+
+def test_claims_route_checks_the_role_claim(client, new_user, login):
+    headers = bearer(login(new_user())["access_token"])
+    assert client.get("/reports", headers=headers).status_code == 403
+    assert client.get("/admin/dashboard", headers=headers).status_code == 403
+
+
+def test_role_change_retires_tokens_with_the_old_role(client, new_user, login):
+    user = new_user(role="admin")
+    headers = bearer(login(user)["access_token"])
+    assert client.get("/admin/dashboard", headers=headers).status_code == 200
+    database.set_user_role(user["username"], "user")
+    assert client.get("/admin/dashboard", headers=headers).status_code == 401
+    assert client.get("/profile", headers=headers).status_code == 401
+
+
+def test_disabled_user_is_refused_by_claims_routes(client, new_user, login):
+    user = new_user(role="auditor")
+    headers = bearer(login(user)["access_token"])
+    assert client.get("/reports", headers=headers).status_code == 200
+    database.set_user_disabled(user["username"])
+    assert client.get("/reports", headers=headers).status_code == 401
+
+
+def test_tampered_token_is_rejected(client, new_user, login):
+    token = login(new_user(role="auditor"))["access_token"]
+    header, payload, signature = token.split(".")
+    forged = ".".join((header, payload, signature[:-2] + ("AA" if signature[-2:] != "AA" else "BB")))
+    assert client.get("/reports", headers=bearer(forged)).status_code == 401
@@ -0,0 +1,106 @@
+import json
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+import bulk
+import database
+from conftest import bearer
+from hashing import HashExecutor
+from storage.sqlite_store import SqliteUserStore
+
+
+def ndjson(*records):
+    return [json.dumps(record) + "\n" for record in records]
+
+
+def record(name, email=None, **fields):
+    return {"username": name, "email": email or f"{name}@example.com", "full_name": "Imported",
+            "password": "imported password", **fields}
+
+
+@pytest.fixture
+def sqlite_store(tmp_path, monkeypatch):
+    store = SqliteUserStore(str(tmp_path / "users.db"))
+    monkeypatch.setattr(database, "user_store", store)
+    yield store
+    store.close()
+
+
+def check_duplicate_emails_are_reported(prefix, existing):
+    report = bulk.import_users(ndjson(
+        record(f"{prefix}-a"),
+        record(f"{prefix}-b", f"{prefix}-A@Example.com"),  # same as line 1 in another case
+        record(f"{prefix}-c", existing["email"].upper()),
+        record(f"{prefix}-d"),
+    ), batch_size=10)
+    assert report["imported"] == 2
+    assert [error["line"] for error in report["errors"]] == [2, 3]
+    assert all("Email already registered" in error["error"] for error in report["errors"])
+    assert database.get_user(f"{prefix}-d") is not None
+    assert database.get_user(f"{prefix}-b") is None
+
+
+def test_import_reports_duplicate_emails(new_user):
+    check_duplicate_emails_are_reported("json", new_user())
+
+
+def test_import_reports_duplicate_emails_on_sqlite(sqlite_store):
+    existing = record("sqlite-existing")
+    assert bulk.import_users(ndjson(existing))["imported"] == 1
+    check_duplicate_emails_are_reported("sqlite", existing)
+
+
+def test_import_reports_emails_taken_while_importing(sqlite_store, monkeypatch):
+    # an email registered between the check and the write fails the batch; the others are still stored
+    lookups = database.get_user_by_email
+    monkeypatch.setattr(database, "get_user_by_email", lambda email: None if email == "race@example.com" else lookups(email))
+    bulk.import_users(ndjson(record("earlier", "race@example.com")))
+    report = bulk.import_users(ndjson(record("race-a"), record("race-b", "race@example.com"), record("race-c")))
+    assert report["imported"] == 2
+    assert report["errors"] == [{"line": 2, "error": "Email already registered: race@example.com"}]
+
+
+def test_import_endpoint_reports_duplicate_emails(client, new_user, login):
+    admin = new_user(role="admin")
+    body = "".join(ndjson(record("endpoint-a", "dup@example.com"), record("endpoint-b", "dup@example.com")))
+    response = client.post("/admin/users/import", content=body, headers=bearer(login(admin)["access_token"]))
+    assert response.status_code == 200
+    assert response.json()["imported"] == 1
+    assert response.json()["errors"][0]["line"] == 2
+
+
+def test_import_hashes_on_the_shared_pool(monkeypatch):
+    calls = []
+    executor = HashExecutor("thread", 2)
+    original = executor.map_background
+    monkeypatch.setattr(executor, "map_background", lambda *args: calls.append(args) or original(*args))
+    monkeypatch.setattr("hashing.hash_executor", executor)
+    report = bulk.import_users(ndjson(record("pooled-a"), record("pooled-b")))
+    assert report["imported"] == 2 and len(calls) == 1
+    assert database.get_user("pooled-a").hashed_password.startswith("$2b$")
+    executor.shutdown()
+
+
+def test_background_jobs_count_against_the_queue_limit():
+    import asyncio
+    executor = HashExecutor("thread", 2, queue_limit=1)
+    started, release = threading.Event(), threading.Event()
+
+    def slow(item):
+        started.set()
+        release.wait(5)
+        return item
+
+    worker = threading.Thread(target=executor.map_background, args=(slow, [1, 2, 3]))
+    worker.start()
+    started.wait(5)
+    assert executor.pending == 1
+    with pytest.raises(HTTPException) as busy:
+        asyncio.run(executor.run(slow, 0))
+    assert busy.value.status_code == 503
+    release.set()
+    worker.join(5)
+    assert executor.pending == 0
+    executor.shutdown()
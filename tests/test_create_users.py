@@ -0,0 +1,56 @@
+import pytest
+
+from models import UserRecord
+from storage import DuplicateEmail, DuplicateUsername, create_storage
+
+
+def user(name, email=None, password="hash"):
+    return UserRecord(name, email or f"{name}@example.com", name.title(), "user", False, password, 0)
+
+
+@pytest.fixture(params=["json", "journal", "sqlite", "sharded"])
+def two_workers(request, tmp_path):
+    # two store instances over the same files behave like two uvicorn workers
+    path = str(tmp_path / ("users.db" if request.param == "sqlite" else "users"))
+    options = {"compact_interval": 0} if request.param == "journal" else {}
+    stores = [create_storage(request.param, path, shards=4, **options) for _ in range(2)]
+    yield stores
+    for store in stores:
+        store.close()
+
+
+def test_create_refuses_a_taken_username(two_workers):
+    first, second = two_workers
+    first.create(user("amy"))
+    second.get("amy")  # cached before the other worker's write is noticed, where the backend caches
+    with pytest.raises(DuplicateUsername):
+        second.create(user("amy", "other@example.com", password="attacker"))
+    assert first.get("amy").hashed_password == "hash"
+
+
+def test_create_refuses_a_taken_email_in_any_case(two_workers):
+    first, second = two_workers
+    first.create(user("amy"))
+    with pytest.raises(DuplicateEmail):
+        second.create(user("bob", "AMY@example.com"))
+    assert second.get("bob") is None
+
+
+def test_create_many_stores_all_or_nothing(two_workers):
+    first, second = two_workers
+    first.create(user("amy"))
+    with pytest.raises(DuplicateEmail):
+        second.create_many([user("carl"), user("dora", "amy@example.com")])
+    with pytest.raises(DuplicateUsername):
+        second.create_many([user("erin"), user("erin", "erin2@example.com")])
+    assert second.get("carl") is None and second.get("erin") is None
+    second.create_many([user("carl"), user("dora")])
+    first.invalidate()  # reads notice other workers' writes within check_interval
+    assert first.get("dora").email == "dora@example.com"
+
+
+def test_put_still_replaces(two_workers):
+    store = two_workers[0]
+    store.create(user("amy"))
+    store.put("amy", user("amy", password="new"))
+    assert store.get("amy").hashed_password == "new"
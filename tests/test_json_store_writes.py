@@ -0,0 +1,60 @@
+import json
+import threading
+import time
+
+import pytest
+
+from models import UserRecord
+from storage.filelock import FileLock
+from storage.json_store import JsonUserStore, write_json_atomic
+
+
+def test_failed_write_leaves_the_old_file_and_no_temp_files(tmp_path):
+    path = tmp_path / "users.json"
+    write_json_atomic(str(path), [{"amy": {"email": "amy@example.com"}}])
+    with pytest.raises(TypeError):
+        write_json_atomic(str(path), [{"amy": object()}])
+    assert json.loads(path.read_text()) == [{"amy": {"email": "amy@example.com"}}]
+    assert [item.name for item in tmp_path.iterdir()] == ["users.json"]
+
+
+def test_file_lock_is_exclusive(tmp_path):
+    path = str(tmp_path / "users.json")
+    events = []
+    held = threading.Event()
+
+    def holder():
+        with FileLock(path):
+            held.set()
+            time.sleep(0.1)
+            events.append("released")
+
+    thread = threading.Thread(target=holder)
+    thread.start()
+    held.wait()
+    # a second lock on the same file, like another worker process, waits for the first
+    with FileLock(path):
+        events.append("acquired")
+    thread.join()
+    assert events == ["released", "acquired"]
+
+
+def test_concurrent_writers_keep_each_others_users(tmp_path):
+    path = str(tmp_path / "users.json")
+    workers = [JsonUserStore(path) for _ in range(4)]
+
+    def sign_up(worker, number):
+        for index in range(10):
+            name = f"w{number}-{index}"
+            worker.put(name, UserRecord(name, f"{name}@example.com", name, "user", False, "hash", 0))
+
+    threads = [threading.Thread(target=sign_up, args=(worker, number)) for number, worker in enumerate(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with open(path) as file:
+        stored = json.load(file)[0]
+    assert len(stored) == 40
+    assert sum(1 for _ in JsonUserStore(path).iter_users()) == 40
@@ -0,0 +1,108 @@
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+from jose import JWTError, jwt
+
+from keys import KeyRing
+
+
+def write_key(directory, kid, curve=None, public_only=False):
+    private = ec.generate_private_key(curve) if curve else rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    if public_only:
+        pem = private.public_key().public_bytes(serialization.Encoding.PEM,
+                                                serialization.PublicFormat.SubjectPublicKeyInfo)
+        name = f"{kid}.pub.pem"
+    else:
+        pem = private.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                    serialization.NoEncryption())
+        name = f"{kid}.pem"
+    (directory / name).write_bytes(pem)
+
+
+def kid_of(token):
+    return jwt.get_unverified_header(token)["kid"]
+
+
+def test_secret_key_ring_signs_hs256():
+    ring = KeyRing(secret="test-secret", algorithm="HS256")
+    token = ring.sign({"sub": "amy"})
+    assert jwt.get_unverified_header(token) == {"alg": "HS256", "kid": "default", "typ": "JWT"}
+    assert ring.decode(token)["sub"] == "amy"
+    assert ring.jwks() == {"keys": []}
+
+
+def test_signs_with_the_active_kid_and_verifies_by_kid(tmp_path):
+    write_key(tmp_path, "2024-01")
+    write_key(tmp_path, "2024-02", curve=ec.SECP256R1())
+    ring = KeyRing(keys_dir=str(tmp_path))
+    # without an active file the last private key by name signs
+    assert ring.active_kid == "2024-02"
+    assert jwt.get_unverified_header(ring.sign({"sub": "amy"}))["alg"] == "ES256"
+
+    (tmp_path / "active").write_text("2024-01\n")
+    ring = KeyRing(keys_dir=str(tmp_path))
+    token = ring.sign({"sub": "amy"})
+    assert (kid_of(token), jwt.get_unverified_header(token)["alg"]) == ("2024-01", "RS256")
+    assert ring.decode(token)["sub"] == "amy"
+
+
+def test_unknown_kid_is_refused(tmp_path):
+    write_key(tmp_path, "current")
+    other = tmp_path / "other"
+    other.mkdir()
+    write_key(other, "elsewhere")
+    token = KeyRing(keys_dir=str(other)).sign({"sub": "amy"})
+    with pytest.raises(JWTError):
+        KeyRing(keys_dir=str(tmp_path)).decode(token)
+
+
+def test_jwks_publishes_public_keys_only(tmp_path):
+    write_key(tmp_path, "signer")
+    write_key(tmp_path, "partner", curve=ec.SECP384R1(), public_only=True)
+    keys = {key["kid"]: key for key in KeyRing(keys_dir=str(tmp_path)).jwks()["keys"]}
+
+    assert set(keys) == {"signer", "partner"}
+    assert (keys["signer"]["kty"], keys["signer"]["alg"], keys["signer"]["use"]) == ("RSA", "RS256", "sig")
+    assert (keys["partner"]["kty"], keys["partner"]["alg"]) == ("EC", "ES384")
+    assert not any("d" in key for key in keys.values())
+
+
+def test_rotation_without_restart(tmp_path):
+    write_key(tmp_path, "old")
+    ring = KeyRing(keys_dir=str(tmp_path), check_interval=0)
+    old_token = ring.sign({"sub": "amy"})
+
+    write_key(tmp_path, "new")
+    (tmp_path / "active").write_text("new")
+    new_token = ring.sign({"sub": "amy"})
+    assert kid_of(new_token) == "new"
+    assert "new" in {key["kid"] for key in ring.jwks()["keys"]}
+    # tokens signed with the old key keep verifying until it is deleted
+    assert ring.decode(old_token)["sub"] == "amy"
+
+    (tmp_path / "old.pem").unlink()
+    with pytest.raises(JWTError):
+        ring.decode(old_token)
+    assert ring.decode(new_token)["sub"] == "amy"
+
+
+def test_bad_key_file_keeps_the_current_keys(tmp_path):
+    write_key(tmp_path, "current")
+    ring = KeyRing(keys_dir=str(tmp_path), check_interval=0)
+    token = ring.sign({"sub": "amy"})
+
+    # a key half-way through being copied in
+    pem = (tmp_path / "current.pem").read_bytes()
+    (tmp_path / "next.pem").write_bytes(pem[:len(pem) // 2])
+    assert ring.decode(token)["sub"] == "amy"
+    assert kid_of(ring.sign({"sub": "amy"})) == "current"
+    assert {key["kid"] for key in ring.jwks()["keys"]} == {"current"}
+
+    # an active file naming a key that is not there yet is refused the same way
+    (tmp_path / "next.pem").unlink()
+    (tmp_path / "active").write_text("next")
+    assert kid_of(ring.sign({"sub": "amy"})) == "current"
+
+    write_key(tmp_path, "next")
+    assert kid_of(ring.sign({"sub": "amy"})) == "next"
+    assert ring.decode(token)["sub"] == "amy"
@@ -0,0 +1,97 @@
+import json
+import logging
+import queue
+import threading
+import time
+import uuid
+
+from Logging.Logger import BatchingQueueListener, DailyRotatingFileHandler, DroppingQueueHandler, JsonFormatter
+
+
+class SlowHandler(logging.Handler):
+    """Stands in for a slow disk: every record takes a while to write."""
+
+    def __init__(self, seconds):
+        super().__init__()
+        self.seconds = seconds
+        self.messages = []
+        self.flushes = 0
+        self.closed = threading.Event()
+
+    def emit(self, record):
+        time.sleep(self.seconds)
+        self.messages.append(record.getMessage())
+
+    def flush(self):
+        self.flushes += 1
+
+    def close(self):
+        self.closed.set()
+        super().close()
+
+
+def queue_logger(log_queue):
+    logger = logging.getLogger(f"test-{uuid.uuid4().hex}")
+    logger.propagate = False
+    handler = DroppingQueueHandler(log_queue)
+    logger.addHandler(handler)
+    return logger, handler
+
+
+def test_logging_does_not_wait_for_the_writer():
+    log_queue = queue.Queue(maxsize=1000)
+    logger, _ = queue_logger(log_queue)
+    handler = SlowHandler(0.01)
+    listener = BatchingQueueListener(log_queue, handler)
+    listener.start()
+
+    started = time.perf_counter()
+    for index in range(50):
+        logger.error("record %d", index)
+    assert time.perf_counter() - started < 0.25  # writing them takes 0.5 s
+
+    # stopping drains what is queued, flushes and closes the handler
+    listener.stop()
+    assert handler.messages == [f"record {index}" for index in range(50)]
+    assert handler.flushes >= 1 and handler.closed.is_set()
+
+
+def test_full_queue_drops_and_counts_instead_of_blocking():
+    logger, handler = queue_logger(queue.Queue(maxsize=2))
+    for index in range(5):
+        logger.error("record %d", index)
+    assert handler.dropped == 3
+
+
+def test_records_are_formatted_before_they_are_queued():
+    log_queue = queue.Queue()
+    logger, _ = queue_logger(log_queue)
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        logger.error("failed for %s", "amy", exc_info=True)
+    record = log_queue.get_nowait()
+    assert (record.msg, record.args, record.exc_info) == ("failed for amy", None, None)
+
+    entry = json.loads(JsonFormatter().format(record))
+    assert (entry["level"], entry["message"]) == ("ERROR", "failed for amy")
+    assert "ValueError: boom" in entry["exc_info"]
+
+
+def test_file_handler_writes_daily_files_and_rolls_over_by_size(tmp_path):
+    handler = DailyRotatingFileHandler(str(tmp_path / "logs"), max_bytes=100)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    log_queue = queue.Queue()
+    logger, _ = queue_logger(log_queue)
+    listener = BatchingQueueListener(log_queue, handler)
+    listener.start()
+    for index in range(10):
+        logger.error("line %02d %s", index, "x" * 30)
+    listener.stop()
+
+    files = sorted(path.name for path in (tmp_path / "logs").iterdir())
+    date = time.strftime("%Y-%m-%d")
+    assert f"{date}.log" in files and f"{date}.1.log" in files
+    lines = [line for path in (tmp_path / "logs").iterdir() for line in path.read_text().splitlines()]
+    assert sorted(lines) == [f"line {index:02d} {'x' * 30}" for index in range(10)]
+    assert all(path.stat().st_size <= 100 for path in (tmp_path / "logs").iterdir())
@@ -0,0 +1,96 @@
+import smtplib
+from email.message import EmailMessage
+
+import pytest
+
+from mailer import EmailQueue, SmtpTransport
+
+
+def message(to):
+    msg = EmailMessage()
+    msg["To"] = to
+    msg["Subject"] = "Password reset"
+    msg.set_content("reset link")
+    return msg
+
+
+class FlakyTransport:
+    """Raises the scripted error for a recipient's next attempts, delivers otherwise."""
+
+    def __init__(self, errors):
+        self.errors = errors
+        self.attempts = []
+        self.sent = []
+
+    def send(self, messages):
+        for msg in messages:
+            self.attempts.append(msg["To"])
+            pending = self.errors.get(msg["To"])
+            if pending:
+                raise pending.pop(0)
+            self.sent.append(msg["To"])
+
+    def close(self):
+        pass
+
+
+def deliver(transport, recipients, max_retries=3):
+    mail = EmailQueue(transport, batch_size=len(recipients), max_retries=max_retries, backoff=0)
+    for to in recipients:
+        mail.enqueue(message(to))
+    mail.join()
+    mail.stop()
+    return mail
+
+
+def test_connection_errors_retry_only_the_failed_message():
+    transport = FlakyTransport({"b@example.com": [smtplib.SMTPServerDisconnected("gone"), ConnectionResetError()]})
+    mail = deliver(transport, ["a@example.com", "b@example.com", "c@example.com"])
+
+    assert transport.sent == ["a@example.com", "b@example.com", "c@example.com"]
+    assert transport.attempts.count("a@example.com") == 1
+    assert transport.attempts.count("b@example.com") == 3
+    assert (mail.sent, mail.failed) == (3, 0)
+
+
+def test_refused_recipient_fails_without_retry():
+    refused = smtplib.SMTPRecipientsRefused({"b@example.com": (550, b"No such user")})
+    transport = FlakyTransport({"b@example.com": [refused], "c@example.com": [smtplib.SMTPDataError(554, b"Rejected")]})
+    mail = deliver(transport, ["a@example.com", "b@example.com", "c@example.com", "d@example.com"])
+
+    assert transport.sent == ["a@example.com", "d@example.com"]
+    assert transport.attempts == ["a@example.com", "b@example.com", "c@example.com", "d@example.com"]
+    assert (mail.sent, mail.failed) == (2, 2)
+
+
+def test_message_is_dropped_after_max_retries():
+    transport = FlakyTransport({"a@example.com": [smtplib.SMTPResponseException(421, b"Try later")] * 3})
+    mail = deliver(transport, ["a@example.com", "b@example.com"], max_retries=2)
+
+    assert transport.attempts == ["a@example.com"] * 3 + ["b@example.com"]
+    assert (mail.sent, mail.failed) == (1, 1)
+
+
+class FakeSmtp:
+    def __init__(self, error):
+        self.error = error
+        self.closed = False
+
+    def send_message(self, msg):
+        raise self.error
+
+    def quit(self):
+        self.closed = True
+
+
+def test_smtp_transport_keeps_the_connection_after_a_refusal():
+    transport = SmtpTransport("smtp.example.com", 465, "user", "password")
+    transport._smtp = smtp = FakeSmtp(smtplib.SMTPRecipientsRefused({}))
+    with pytest.raises(smtplib.SMTPRecipientsRefused):
+        transport.send([message("a@example.com")])
+    assert transport._smtp is smtp and not smtp.closed
+
+    smtp.error = smtplib.SMTPServerDisconnected("gone")
+    with pytest.raises(smtplib.SMTPServerDisconnected):
+        transport.send([message("a@example.com")])
+    assert transport._smtp is None and smtp.closed
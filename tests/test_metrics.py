@@ -0,0 +1,52 @@
+import threading
+
+from conftest import bearer
+from metrics import MetricsRegistry
+
+
+def test_thread_shards_are_summed_when_rendered():
+    registry = MetricsRegistry(buckets=(0.1, 1.0))
+    registry.describe("jobs_total", "counter", "Jobs.")
+
+    def work():
+        for _ in range(1000):
+            registry.inc("jobs_total", (("kind", "a"),))
+        registry.observe("job_seconds", 0.05)
+        registry.observe("job_seconds", 0.5)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    lines = registry.render().splitlines()
+    assert len(registry._shards) == 4
+    assert "# TYPE jobs_total counter" in lines
+    assert 'jobs_total{kind="a"} 4000' in lines
+    # buckets are cumulative across every shard
+    assert 'job_seconds_bucket{le="0.1"} 4' in lines
+    assert 'job_seconds_bucket{le="1.0"} 8' in lines
+    assert 'job_seconds_bucket{le="+Inf"} 8' in lines
+    assert "job_seconds_count 8" in lines
+
+
+def test_disabled_registry_records_nothing():
+    registry = MetricsRegistry(enabled=False)
+    registry.inc("jobs_total")
+    with registry.timer("password_verify"):
+        pass
+    assert registry.render() == "\n"
+
+
+def test_requests_are_labelled_with_the_route_template(client, new_user, login):
+    headers = bearer(login(new_user())["access_token"])
+    for name in ("amy", "bob"):
+        client.put(f"/admin/users/{name}/role", json={"role": "user"}, headers=headers)
+    client.get("/no-such-page")
+
+    text = client.get("/metrics").text
+    assert 'route="/admin/users/{username}/role",status="403"' in text
+    assert "amy" not in text and "bob" not in text
+    assert 'http_requests_total{method="GET",route="unmatched",status="404"}' in text
+    assert 'auth_stage_duration_seconds_count{stage="password_verify"}' in text
@@ -0,0 +1,56 @@
+import pytest
+from fastapi import HTTPException
+
+from ratelimit import MemoryRateLimitBackend, RateLimiter, SharedRateLimitBackend
+from shared_state import MemorySharedState
+
+
+def test_login_attempts_per_user_are_throttled(client, new_user):
+    user = new_user()
+    wrong = {"username": user["username"], "password": "wrong password"}
+    for _ in range(5):
+        assert client.post("/token", data=wrong).status_code == 400
+    response = client.post("/token", data=wrong)
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    # the limit is checked before the password, so the right one is refused too
+    right = {"username": user["username"], "password": user["hashed_password"]}
+    assert client.post("/token", data=right).status_code == 429
+
+
+def test_reset_requests_per_user_are_throttled(client, new_user):
+    user = new_user()
+    body = {"username": user["username"], "email": user["email"]}
+    for _ in range(3):
+        assert client.post("/forgot-password", json=body).status_code == 200
+    assert client.post("/forgot-password", json=body).status_code == 429
+
+
+@pytest.mark.parametrize("backend", [MemoryRateLimitBackend, lambda: SharedRateLimitBackend(MemorySharedState())])
+def test_sliding_window(backend):
+    backend = backend()
+    assert [backend.hit("k", 2, 60, now=0.0) for _ in range(2)] == [0.0, 0.0]
+    assert backend.hit("k", 2, 60, now=1.0) == 59.0
+    assert backend.hit("other", 2, 60, now=1.0) == 0.0
+    # two windows later nothing of the burst is left
+    assert backend.hit("k", 2, 60, now=150.0) == 0.0
+
+
+def test_previous_window_is_weighted_by_its_overlap():
+    backend = MemoryRateLimitBackend()
+    for _ in range(2):
+        backend.hit("k", 2, 60, now=0.0)
+    # 30 s into the next window, half of the previous two requests still count
+    assert backend.hit("k", 2, 60, now=90.0) == 0.0
+    assert backend.hit("k", 2, 60, now=90.0) == 30.0
+
+
+def test_limiter_checks_every_rule_and_can_be_disabled():
+    limiter = RateLimiter({"login_ip": (1, 60), "login_user": (10, 60)})
+    limiter.check(login_ip="10.0.0.1", login_user="a")
+    with pytest.raises(HTTPException) as error:
+        limiter.check(login_ip="10.0.0.1", login_user="b")
+    assert error.value.status_code == 429
+    limiter.check(login_ip="10.0.0.2", login_user="a")
+    limiter.enabled = False
+    limiter.check(login_ip="10.0.0.1", login_user="a")
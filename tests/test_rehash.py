@@ -0,0 +1,77 @@
+import pytest
+
+import database
+import hashing
+from models import UserRecord
+from storage import create_storage
+from utils import build_password_context, pwd_context
+
+
+@pytest.fixture(params=["json", "journal", "sqlite", "sharded"])
+def two_workers(request, tmp_path):
+    # two store instances over the same files behave like two uvicorn workers
+    path = str(tmp_path / ("users.db" if request.param == "sqlite" else "users"))
+    options = {"compact_interval": 0} if request.param == "journal" else {}
+    stores = [create_storage(request.param, path, shards=4, **options) for _ in range(2)]
+    yield stores
+    for store in stores:
+        store.close()
+
+
+def test_update_if_only_writes_over_the_expected_value(two_workers):
+    first, second = two_workers
+    first.create(UserRecord("amy", "amy@example.com", "Amy", "user", False, "old", 0))
+    assert second.get("amy").hashed_password == "old"
+
+    # a reset by the other worker lands between reading the old hash and storing the new one
+    first.update("amy", hashed_password="reset", token_version=1)
+    assert not second.update_if("amy", {"hashed_password": "old"}, hashed_password="rehashed")
+    assert first.get("amy").hashed_password == "reset"
+
+    assert second.update_if("amy", {"hashed_password": "reset"}, hashed_password="rehashed")
+    second.invalidate()
+    assert (second.get("amy").hashed_password, second.get("amy").token_version) == ("rehashed", 1)
+    assert not second.update_if("nobody", {"hashed_password": "reset"}, hashed_password="rehashed")
+
+
+def test_login_upgrades_an_outdated_hash(client, new_user):
+    user = new_user()
+    outdated = build_password_context(["bcrypt"], bcrypt_rounds=5).hash(user["hashed_password"])
+    database.user_store.update(user["username"], hashed_password=outdated)
+    assert pwd_context.needs_update(outdated)
+
+    response = client.post("/token", data={"username": user["username"], "password": user["hashed_password"]})
+    assert response.status_code == 200
+    # the rehash runs as a background task, which the test client waits for
+    upgraded = database.get_user(user["username"]).hashed_password
+    assert upgraded != outdated and not pwd_context.needs_update(upgraded)
+    assert pwd_context.verify(user["hashed_password"], upgraded)
+
+
+def test_rehash_does_not_undo_a_password_reset(client, new_user):
+    user = new_user()
+    old_hash = database.get_user(user["username"]).hashed_password
+    database.update_user_password({"username": user["username"]}, "a new password")
+    assert not database.rehash_user_password(user["username"], old_hash, "rehashed")
+    assert pwd_context.verify("a new password", database.get_user(user["username"]).hashed_password)
+
+
+@pytest.fixture
+def fake_costs(monkeypatch):
+    # a hash takes 1 ms per cost step, with the cost read back from the settings calibrate builds
+    monkeypatch.setattr(hashing, "build_password_context", lambda schemes, **options: options)
+    monkeypatch.setattr(hashing, "_time_hash", lambda options, samples: next(iter(options.values())) / 1000)
+
+
+def test_calibrate_picks_the_highest_cost_within_budget(fake_costs):
+    assert hashing.calibrate("bcrypt", 12.5) == ({"PASSWORD_SCHEMES": "bcrypt", "BCRYPT_ROUNDS": 12}, 12.0)
+    assert hashing.calibrate("argon2", 3) == ({"PASSWORD_SCHEMES": "argon2,bcrypt", "ARGON2_TIME_COST": 3}, 3.0)
+
+
+def test_calibrate_stays_within_the_schemes_bounds(fake_costs):
+    # over budget even at the cheapest setting: the minimum is reported with its real cost
+    assert hashing.calibrate("scrypt", 1) == ({"PASSWORD_SCHEMES": "scrypt,bcrypt", "SCRYPT_ROUNDS": 10}, 10.0)
+    # a budget no setting reaches stops at the strongest one
+    assert hashing.calibrate("bcrypt", 10 ** 6)[0]["BCRYPT_ROUNDS"] == 31
+    with pytest.raises(ValueError):
+        hashing.calibrate("md5", 100)
@@ -0,0 +1,80 @@
+import time
+
+import database
+from conftest import bearer
+from reset_tokens import ConsumedTokens, ResetTokenStore, SharedConsumedTokens
+from shared_state import MemorySharedState
+
+
+def reset(client, token, password="a brand new password"):
+    return client.post("/reset-password", data={"token": token, "new_password": password})
+
+
+def test_reset_link_works_once(client, new_user, login):
+    user = new_user()
+    tokens = login(user)
+    token = database.reset_tokens.generate(user["username"], user["email"])
+    assert reset(client, token).status_code == 200
+    assert reset(client, token, "another password").status_code == 400
+    # the first reset set the password and ended the old sessions
+    assert client.get("/profile", headers=bearer(tokens["access_token"])).status_code == 401
+    assert login({**user, "hashed_password": "a brand new password"})["access_token"]
+
+
+def test_forged_and_expired_tokens_are_refused(client, new_user):
+    user = new_user()
+    other_salt = ResetTokenStore(database.SECRET_KEY, "another-salt")
+    assert reset(client, other_salt.generate(user["username"], user["email"])).status_code == 400
+    # a negative max age makes a fresh token already expired
+    expired = ResetTokenStore(database.SECRET_KEY, database.RESET_PASSWORD_SALT, max_age=-1)
+    assert expired.consume(expired.generate(user["username"], user["email"])) is None
+
+
+def test_consumed_tokens_refuse_a_second_use():
+    consumed = ConsumedTokens(max_age=3600)
+    now = time.time()
+    assert consumed.add("token", now)
+    assert not consumed.add("token", now)
+    assert consumed.add("other", now)
+
+
+def test_overflow_refuses_old_tokens_instead_of_forgetting_spent_ones():
+    consumed = ConsumedTokens(max_age=3600, capacity=4)
+    now = time.time()
+    for i in range(4):
+        assert consumed.add(f"token-{i}", now - 100 + i)
+    # full: the older half is dropped and everything issued up to it is refused from now on
+    assert consumed.add("token-4", now)
+    assert len(consumed) <= 4
+    assert not consumed.add("token-0", now - 100)
+    assert not consumed.add("unused-but-old", now - 99)
+    assert not consumed.add("token-4", now)
+
+
+def test_shared_consumed_tokens_are_seen_by_every_worker():
+    shared = MemorySharedState()
+    first, second = SharedConsumedTokens(shared, 3600), SharedConsumedTokens(shared, 3600)
+    now = time.time()
+    assert first.add("token", now)
+    assert not second.add("token", now)
+    assert not first.add("expired", now - 7200)
+
+
+def test_reset_link_is_only_sent_to_the_accounts_email(client, new_user):
+    user = new_user()
+    body = {"username": user["username"], "email": "attacker@example.com"}
+    assert client.post("/forgot-password", json=body).status_code == 404
+    body["email"] = user["email"].upper()
+    assert client.post("/forgot-password", json=body).status_code == 200
+
+
+def test_reset_token_is_bound_to_the_users_email(client, new_user, login):
+    user = new_user()
+    elsewhere = database.reset_tokens.generate(user["username"], "attacker@example.com")
+    assert reset(client, elsewhere).status_code == 400
+
+    # a link sent before the account's email changed no longer works
+    before_change = database.reset_tokens.generate(user["username"], user["email"])
+    database.user_store.update(user["username"], email="new-" + user["email"])
+    assert reset(client, before_change).status_code == 400
+    assert login(user)["access_token"]
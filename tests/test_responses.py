@@ -0,0 +1,56 @@
+import json
+
+import pytest
+from fastapi.responses import JSONResponse
+
+from conftest import bearer
+from models import Token
+from responses import FastJSONResponse, StaticJSON
+
+
+def default_body(content) -> bytes:
+    # what FastAPI's default response class sends for the same content
+    return JSONResponse(content).body
+
+
+@pytest.mark.parametrize("content", [
+    "SignUp Completed!",
+    {"message": "Logged out"},
+    {"access_token": "a.b.c", "token_type": "bearer", "expires_in": 900, "refresh_token": None},
+    {"username": "zoë", "role": "user", "email": "zoë@example.com", "nested": {"ok": True, "n": [1, 2.5]}},
+])
+def test_bodies_match_the_default_response(content):
+    assert FastJSONResponse(content).body == default_body(content)
+    response = StaticJSON(content)()
+    assert response.body == default_body(content)
+    assert response.headers["content-type"] == "application/json"
+
+
+def test_static_bodies_get_fresh_headers():
+    body = StaticJSON({"message": "Logged out"})
+    first, second = body(), body({"X-Extra": "1"})
+    assert first is not second
+    assert "x-extra" not in first.headers and second.headers["x-extra"] == "1"
+
+
+def test_endpoint_bodies_keep_their_shape(client, new_user):
+    user = new_user(full_name="Zoë Ünïcode")
+    assert client.post("/signup/", json=user).content == default_body({"detail": "Username already exists"})
+
+    response = client.post("/token?include_profile=true",
+                           data={"username": user["username"], "password": user["hashed_password"]})
+    tokens = response.json()
+    assert response.headers["content-type"] == "application/json"
+    # the response model used to shape this body; the hand-built dict is what it produced
+    assert response.content == default_body(Token(**tokens).model_dump(exclude_none=True))
+    assert list(tokens) == ["access_token", "token_type", "expires_in", "refresh_token", "profile"]
+
+    profile = client.get("/profile", headers=bearer(tokens["access_token"]))
+    expected = {"username": user["username"], "role": "user", "email": user["email"]}
+    assert profile.content == default_body(expected) == json.dumps(expected, separators=(",", ":")).encode()
+    assert tokens["profile"] == expected
+
+    logout = client.post("/logout", headers=bearer(tokens["access_token"]))
+    assert logout.content == default_body({"message": "Logged out"})
+    assert client.get("/reports", headers=bearer(tokens["access_token"])).content == default_body(
+        {"detail": "Invalid authentication credentials"})
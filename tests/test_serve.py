@@ -0,0 +1,66 @@
+import dataclasses
+import logging
+
+import pytest
+
+import serve
+import utils
+from shared_state import RedisSharedState
+
+
+@pytest.fixture
+def cores(monkeypatch):
+    monkeypatch.delenv("WEB_CONCURRENCY", raising=False)
+    monkeypatch.setattr(serve.os, "cpu_count", lambda: 4)
+
+
+@pytest.fixture
+def shared_state_url(monkeypatch):
+    # the launcher reads the URL from the settings, which is where a .env value ends up
+    def set_url(url):
+        monkeypatch.delenv("SHARED_STATE_URL", raising=False)
+        monkeypatch.setattr(utils, "settings", dataclasses.replace(utils.settings, shared_state_url=url))
+    return set_url
+
+
+@pytest.fixture
+def uvicorn_runs(monkeypatch):
+    import uvicorn
+    runs = []
+    monkeypatch.setattr(uvicorn, "run", lambda app, **options: runs.append(options))
+    monkeypatch.setenv("HASH_POOL_SIZE", "1")
+    return runs
+
+
+def test_single_worker_without_shared_state(cores, shared_state_url, uvicorn_runs):
+    shared_state_url("memory://")
+    assert serve.default_workers() == 1
+    serve.main([])
+    assert uvicorn_runs[0]["workers"] == 1
+
+
+def test_one_worker_per_core_with_shared_state(cores, shared_state_url, uvicorn_runs):
+    shared_state_url("redis://127.0.0.1:6390/0")
+    assert serve.default_workers() == 4
+    serve.main([])
+    assert uvicorn_runs[0]["workers"] == 4
+
+
+def test_web_concurrency_overrides_the_default(cores, shared_state_url, monkeypatch):
+    shared_state_url("redis://127.0.0.1:6390/0")
+    monkeypatch.setenv("WEB_CONCURRENCY", "2")
+    assert serve.default_workers() == 2
+
+
+def test_several_workers_without_shared_state_are_refused(cores, shared_state_url, uvicorn_runs):
+    shared_state_url("memory://")
+    with pytest.raises(SystemExit):
+        serve.main(["--workers", "2"])
+    assert not uvicorn_runs
+
+
+def test_listener_errors_are_logged(caplog, monkeypatch):
+    monkeypatch.setattr("shared_state.time.sleep", lambda seconds: None)
+    with caplog.at_level(logging.ERROR, logger="Shared State"):
+        RedisSharedState._on_listener_error(ConnectionError("connection reset"), None, None)
+    assert "connection reset" in caplog.text
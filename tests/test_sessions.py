@@ -0,0 +1,56 @@
+from conftest import bearer
+
+
+def refresh(client, refresh_token):
+    return client.post("/token/refresh", data={"refresh_token": refresh_token})
+
+
+def test_refresh_rotates_the_token(client, new_user, login):
+    tokens = login(new_user())
+    response = refresh(client, tokens["refresh_token"])
+    assert response.status_code == 200
+    rotated = response.json()
+    assert rotated["refresh_token"] != tokens["refresh_token"]
+    assert client.get("/profile", headers=bearer(rotated["access_token"])).status_code == 200
+
+
+def test_reused_refresh_token_revokes_the_whole_session(client, new_user, login):
+    tokens = login(new_user())
+    rotated = refresh(client, tokens["refresh_token"]).json()
+    # the spent token comes back: someone holds a copy, so the family and its access tokens die
+    assert refresh(client, tokens["refresh_token"]).status_code == 401
+    assert refresh(client, rotated["refresh_token"]).status_code == 401
+    assert client.get("/profile", headers=bearer(rotated["access_token"])).status_code == 401
+    assert client.get("/profile", headers=bearer(tokens["access_token"])).status_code == 401
+
+
+def test_reuse_leaves_other_sessions_alone(client, new_user, login):
+    user = new_user()
+    first, second = login(user), login(user)
+    refresh(client, first["refresh_token"])
+    refresh(client, first["refresh_token"])
+    assert client.get("/profile", headers=bearer(second["access_token"])).status_code == 200
+    assert refresh(client, second["refresh_token"]).status_code == 200
+
+
+def test_unknown_refresh_token_is_rejected(client):
+    assert refresh(client, "not-a-refresh-token").status_code == 401
+
+
+def test_logout_revokes_the_access_and_refresh_token(client, new_user, login):
+    tokens = login(new_user())
+    headers = bearer(tokens["access_token"])
+    assert client.get("/profile", headers=headers).status_code == 200  # now in the token cache
+    response = client.post("/logout", data={"refresh_token": tokens["refresh_token"]}, headers=headers)
+    assert response.status_code == 200
+    assert client.get("/profile", headers=headers).status_code == 401
+    assert refresh(client, tokens["refresh_token"]).status_code == 401
+
+
+def test_password_change_ends_every_session(client, new_user, login):
+    import database
+    user = new_user()
+    tokens = login(user)
+    database.update_user_password({"username": user["username"]}, "a new password")
+    assert client.get("/profile", headers=bearer(tokens["access_token"])).status_code == 401
+    assert refresh(client, tokens["refresh_token"]).status_code == 401
@@ -0,0 +1,39 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from utils import Settings
+
+
+def test_secret_key_is_required():
+    with pytest.raises(ValueError, match="SECRET_KEY is required"):
+        Settings.from_env({})
+
+
+def test_secret_key_is_required_with_a_keys_directory(tmp_path):
+    # reset links are signed with SECRET_KEY even when access tokens use the key ring
+    with pytest.raises(ValueError, match="SECRET_KEY is required"):
+        Settings.from_env({"JWT_KEYS_DIR": str(tmp_path)})
+
+
+def test_all_errors_are_reported_at_once():
+    with pytest.raises(ValueError) as error:
+        Settings.from_env({"USER_STORAGE": "csv", "HASH_POOL_SIZE": "0"})
+    message = str(error.value)
+    assert "SECRET_KEY" in message and "USER_STORAGE" in message and "HASH_POOL_SIZE" in message
+
+
+def test_minimal_configuration():
+    settings = Settings.from_env({"SECRET_KEY": "s"})
+    assert settings.user_storage == "json" and settings.shared_state_url == "memory://"
+
+
+def test_warm_up_failure_stops_startup(app, monkeypatch):
+    import main
+
+    def broken_keys():
+        raise ValueError("unreadable signing key")
+
+    monkeypatch.setattr(main.key_ring, "load", broken_keys)
+    with pytest.raises(ValueError, match="unreadable signing key"):
+        with TestClient(app):
+            pass
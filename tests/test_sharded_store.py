@@ -0,0 +1,106 @@
+import os
+
+import pytest
+
+from models import UserRecord
+from storage.json_store import JsonUserStore
+from storage.rebalance import rebalance
+from storage.sharded_store import FrozenSegment, ShardedUserStore, frozen_path, read_meta, segment_path, shard_of
+
+NAMES = [f"user-{index:03d}" for index in range(200)]
+
+
+def record(name):
+    return UserRecord(name, f"{name}@Example.com", name.title(), "admin" if name.endswith("7") else "user",
+                      False, "hash", 0)
+
+
+@pytest.fixture
+def users_file(tmp_path):
+    path = str(tmp_path / "db_users.json")
+    store = JsonUserStore(path)
+    store.put_many(record(name) for name in NAMES)
+    store.close()
+    return path
+
+
+@pytest.fixture
+def frozen_dir(tmp_path, users_file):
+    directory = str(tmp_path / "db_users.shards")
+    assert rebalance(users_file, directory, 8, frozen=True) == len(NAMES)
+    return directory
+
+
+def test_frozen_segments_answer_every_lookup(frozen_dir):
+    store = ShardedUserStore(frozen_dir, check_interval=0)
+    try:
+        assert all(isinstance(store._segment(index), FrozenSegment) for index in range(store.shards))
+        assert store.get("user-042").to_dict() == record("user-042").to_dict()
+        assert store.get("user-042x") is None and store.get("a") is None and store.get("zzz") is None
+        assert store.get_by_email("USER-042@example.com").username == "user-042"
+        assert store.get_by_email("nobody@example.com") is None
+        assert sorted(user.username for user in store.iter_users()) == NAMES
+    finally:
+        store.close()
+
+
+def test_frozen_queries_page_in_username_order(frozen_dir):
+    store = ShardedUserStore(frozen_dir)
+    try:
+        page = store.query(prefix="user-1", limit=15)
+        assert [user.username for user in page] == NAMES[100:115]
+        page = store.query(prefix="user-1", after=page[-1].username, limit=100)
+        assert [user.username for user in page] == NAMES[115:200]
+        admins = store.query(role="admin", after="user-150", limit=3)
+        assert [user.username for user in admins] == ["user-157", "user-167", "user-177"]
+    finally:
+        store.close()
+
+
+def test_writing_to_a_frozen_segment_thaws_it(frozen_dir):
+    writer, reader = ShardedUserStore(frozen_dir, check_interval=0), ShardedUserStore(frozen_dir, check_interval=0)
+    try:
+        reader.get("user-042")
+        index = shard_of("user-042", writer.shards)
+        assert writer.update("user-042", role="auditor")
+
+        assert not os.path.exists(frozen_path(frozen_dir, index))
+        assert os.path.exists(segment_path(frozen_dir, index))
+        # the other worker notices the thaw and reads the JSON segment
+        assert reader.get("user-042").role == "auditor"
+        neighbours = [name for name in NAMES if shard_of(name, writer.shards) == index and name != "user-042"]
+        assert all(reader.get(name) is not None for name in neighbours)
+    finally:
+        writer.close()
+        reader.close()
+
+
+def test_rebalance_in_place_keeps_every_user(frozen_dir):
+    assert rebalance(frozen_dir, frozen_dir, 3) == len(NAMES)
+    assert read_meta(frozen_dir)["shards"] == 3
+    assert not os.path.exists(frozen_dir + ".old") and not os.path.exists(frozen_dir + ".rebalance")
+    store = ShardedUserStore(frozen_dir, shards=16)  # the stored shard count wins
+    try:
+        assert store.shards == 3
+        for index in range(3):
+            segment = store._segment(index)
+            assert isinstance(segment, JsonUserStore)
+            assert all(shard_of(user.username, 3) == index for user in segment.iter_users())
+        assert sorted(user.username for user in store.iter_users()) == NAMES
+        assert store.get_by_email("user-199@example.com").username == "user-199"
+    finally:
+        store.close()
+
+
+def test_empty_frozen_segment(tmp_path):
+    source = str(tmp_path / "empty.json")
+    JsonUserStore(source).put("amy", record("amy"))
+    directory = str(tmp_path / "shards")
+    rebalance(source, directory, 4, frozen=True)
+    store = ShardedUserStore(directory)
+    try:
+        assert sorted(len(store._segment(index)) for index in range(4)) == [0, 0, 0, 1]
+        assert store.get("amy").email == "amy@Example.com"
+        assert store.query(prefix="b") == []
+    finally:
+        store.close()
@@ -0,0 +1,95 @@
+import pytest
+
+import database
+from models import UserRecord
+from storage import DuplicateEmail
+from storage.sqlite_store import SqliteUserStore
+
+
+def signup(client, name, email):
+    return client.post("/signup/", json={"username": name, "email": email, "full_name": "Test User",
+                                         "hashed_password": "correct horse battery staple"})
+
+
+def test_signup_rejects_taken_username(client, new_user):
+    user = new_user()
+    response = signup(client, user["username"], "other-" + user["email"])
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Username already exists"
+
+
+def test_signup_rejects_taken_email_in_any_case(client, new_user):
+    user = new_user()
+    response = signup(client, user["username"] + "-2", user["email"].upper())
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Email already registered"
+
+
+@pytest.fixture
+def sqlite_store(tmp_path, monkeypatch):
+    store = SqliteUserStore(str(tmp_path / "users.db"))
+    monkeypatch.setattr(database, "user_store", store)
+    yield store
+    store.close()
+
+
+def test_sqlite_signup_with_taken_email_is_a_400(client, sqlite_store):
+    assert signup(client, "first", "shared@example.com").status_code == 200
+    response = signup(client, "second", "Shared@Example.com")
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Email already registered"
+    assert sqlite_store.get("second") is None
+
+
+def test_sqlite_store_raises_duplicate_email(sqlite_store):
+    record = UserRecord("a", "a@example.com", "A", "user", False, "hash", 0)
+    sqlite_store.put("a", record)
+    with pytest.raises(DuplicateEmail):
+        sqlite_store.put("b", record.replace(username="b", email="A@EXAMPLE.COM"))
+    with pytest.raises(DuplicateEmail):
+        sqlite_store.put_many([record.replace(username="c", email="c@example.com"),
+                               record.replace(username="d", email="a@example.com")])
+    # the batch is written together, so none of it is stored
+    assert sqlite_store.get("c") is None
+
+
+async def _signup_together(app, monkeypatch, bodies):
+    """Both signups pass the lookups before either is saved, like two requests hashing at once."""
+    import asyncio
+    import httpx
+    import main
+
+    arrived = asyncio.Event()
+    waiting = 0
+
+    async def hash_when_both_arrived(password):
+        nonlocal waiting
+        waiting += 1
+        if waiting == len(bodies):
+            arrived.set()
+        await asyncio.wait_for(arrived.wait(), 5)
+        return "hashed-" + password
+
+    monkeypatch.setattr(main, "get_password_hash_async", hash_when_both_arrived)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://testserver") as client:
+        return await asyncio.gather(*(client.post("/signup/", json=body) for body in bodies))
+
+
+@pytest.mark.parametrize("second, detail", [
+    ({"username": "race-{0}", "email": "race-{0}-2@example.com"}, "Username already exists"),
+    ({"username": "race-{0}-2", "email": "Race-{0}@Example.com"}, "Email already registered"),
+])
+def test_concurrent_signups_create_one_account(app, monkeypatch, second, detail):
+    import asyncio
+    import uuid
+
+    name = uuid.uuid4().hex[:8]
+    first = {"username": "race-{0}", "email": "race-{0}@example.com"}
+    first, second = ({key: value.format(name) for key, value in body.items()} for body in (first, second))
+    bodies = [dict(body, full_name="Test User", hashed_password="secret") for body in (first, second)]
+    responses = asyncio.run(_signup_together(app, monkeypatch, bodies))
+
+    assert sorted(response.status_code for response in responses) == [200, 400]
+    assert [response.json()["detail"] for response in responses if response.status_code == 400] == [detail]
+    winner = bodies[[response.status_code for response in responses].index(200)]
+    assert database.get_user(winner["username"]).email == winner["email"]
@@ -0,0 +1,80 @@
+import time
+
+import database
+from conftest import bearer
+from models import TokenUser
+from token_cache import TokenCache
+
+
+def user(name="amy", version=0):
+    return TokenUser(name, "user", False, version)
+
+
+def test_repeat_lookups_are_hits():
+    cache = TokenCache(maxsize=10, ttl=60)
+    assert cache.get("token") is None
+    amy = user()
+    cache.put("token", {"sub": "amy"}, amy)
+    assert cache.get("token") == ({"sub": "amy"}, amy)
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (1, 1, 1)
+
+
+def test_entries_expire_with_the_ttl_or_the_token():
+    cache = TokenCache(maxsize=10, ttl=60)
+    cache.put("expired", {"sub": "amy", "exp": time.time() - 1}, user())
+    assert cache.get("expired") is None
+
+    cache = TokenCache(maxsize=10, ttl=0.01)
+    cache.put("token", {"sub": "amy", "exp": time.time() + 3600}, user())
+    time.sleep(0.02)
+    assert cache.get("token") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TokenCache(maxsize=2, ttl=60)
+    cache.put("a", {}, user("a"))
+    cache.put("b", {}, user("b"))
+    cache.get("a")
+    cache.put("c", {}, user("c"))
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+
+
+def test_invalidation_drops_the_users_entries_and_stale_puts():
+    cache = TokenCache(maxsize=10, ttl=60)
+    cache.put("a1", {}, user("a"))
+    cache.put("b1", {}, user("b"))
+    generation = cache.generation("a")
+    cache.invalidate_user("a", min_version=1)
+    assert cache.get("a1") is None and cache.get("b1") is not None
+    # a user loaded before the invalidation is not cached
+    cache.put("a2", {}, user("a"), generation)
+    assert cache.get("a2") is None
+    assert cache.min_token_version("a") == 1
+
+
+def test_invalidation_state_does_not_grow_with_users():
+    cache = TokenCache(maxsize=10, ttl=60, version_ttl=0.01)
+    for index in range(1000):
+        cache.invalidate_user(f"signup-{index}")
+    cache.invalidate_user("amy", min_version=3)
+    assert cache.min_token_version("amy") == 3
+    time.sleep(0.02)
+    # once every older token has expired the raised version is no longer needed
+    assert cache.min_token_version("amy") == 0
+    cache.invalidate_user("bob", min_version=1)
+    assert list(cache._min_versions) == ["bob"]
+
+
+def test_password_change_retires_cached_tokens(client, new_user, login):
+    account = new_user()
+    headers = bearer(login(account)["access_token"])
+    assert client.get("/profile", headers=headers).status_code == 200
+    assert client.get("/profile", headers=headers).status_code == 200
+    assert database.token_cache.get(headers["Authorization"].split()[1]) is not None
+
+    database.update_user_password({"username": account["username"]}, "a new password")
+    assert client.get("/profile", headers=headers).status_code == 401
+    assert client.get("/reports", headers=headers).status_code == 401
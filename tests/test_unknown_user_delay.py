@@ -0,0 +1,92 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import HTTPException
+
+import hashing
+from hashing import UnknownUserDelay
+
+
+class CountingExecutor:
+    def __init__(self, seconds=0.05, fail=False):
+        self.seconds = seconds
+        self.fail = fail
+        self.jobs = 0
+
+    def check_capacity(self):
+        pass
+
+    async def run(self, func, *args):
+        self.jobs += 1
+        await asyncio.sleep(self.seconds)
+        if self.fail:
+            raise HTTPException(status_code=503, detail="Server busy, please retry")
+        return self.seconds
+
+
+@pytest.fixture
+def executor(monkeypatch):
+    executor = CountingExecutor()
+    monkeypatch.setattr(hashing, "hash_executor", executor)
+    return executor
+
+
+def test_concurrent_cold_logins_share_one_seeding_job(executor):
+    delay = UnknownUserDelay()
+
+    async def cold_start():
+        started = time.perf_counter()
+        await asyncio.gather(*(delay.wait() for _ in range(20)))
+        return time.perf_counter() - started
+
+    elapsed = asyncio.run(cold_start())
+    assert executor.jobs == 1
+    # the seed itself counts as the delay, the waiters don't sleep a second time
+    assert elapsed < 2 * executor.seconds
+    asyncio.run(delay.wait())
+    assert executor.jobs == 1
+
+
+def test_observed_logins_are_used_without_hashing(executor):
+    delay = UnknownUserDelay()
+    delay.observe(0.01)
+    asyncio.run(delay.wait())
+    assert executor.jobs == 0
+
+
+def test_a_failed_seed_is_retried_by_the_next_login(executor):
+    delay = UnknownUserDelay()
+    executor.fail = True
+    with pytest.raises(HTTPException):
+        asyncio.run(delay.wait())
+    executor.fail = False
+    asyncio.run(delay.wait())
+    assert executor.jobs == 2
+
+
+def test_startup_does_not_hash(client, monkeypatch):
+    import main
+    hashed = []
+    monkeypatch.setattr(hashing, "get_password_hash", lambda *args: hashed.append(args))
+    monkeypatch.setattr(hashing, "verify_password", lambda *args: hashed.append(args))
+    main._warm_up()
+    assert not hashed
+
+
+def test_unknown_user_login_is_refused_like_a_wrong_password(client, new_user):
+    user = new_user()
+    unknown = client.post("/token", data={"username": "no-such-user", "password": "whatever"})
+    wrong = client.post("/token", data={"username": user["username"], "password": "wrong password"})
+    assert unknown.status_code == wrong.status_code == 400
+    assert unknown.json() == wrong.json()
+
+
+def test_unknown_user_login_is_refused_like_a_wrong_password_when_the_pool_is_full(client, new_user, monkeypatch):
+    user = new_user()
+    monkeypatch.setattr(hashing.hash_executor, "_pending", hashing.hash_executor.queue_limit)
+    unknown = client.post("/token", data={"username": "no-such-user", "password": "whatever"})
+    wrong = client.post("/token", data={"username": user["username"], "password": "wrong password"})
+    assert unknown.status_code == wrong.status_code == 503
+    assert unknown.json() == wrong.json()
+    assert unknown.headers["Retry-After"] == wrong.headers["Retry-After"]
@@ -0,0 +1,69 @@
+import pytest
+
+from models import UserRecord
+from storage.journal_store import JournaledUserStore
+from storage.json_store import JsonUserStore, write_json_atomic
+
+
+def user(name, role="user", disabled=False, domain="example.com"):
+    return UserRecord(name, f"{name}@{domain}", name.title(), role, disabled, "hash", 0)
+
+
+@pytest.fixture(params=["json", "journal"])
+def two_workers(request, tmp_path):
+    # two store instances over one file behave like two uvicorn workers
+    path = str(tmp_path / "db_users.json")
+    write_json_atomic(path, [{f"user{i:03d}": user(f"user{i:03d}").to_dict() for i in range(100)}])
+    if request.param == "json":
+        stores = [JsonUserStore(path, check_interval=0), JsonUserStore(path, check_interval=0)]
+    else:
+        stores = [JournaledUserStore(path, check_interval=0, compact_interval=0) for _ in range(2)]
+    yield stores
+    for store in stores:
+        store.close()
+
+
+def names(records):
+    return [record.username for record in records]
+
+
+def test_changes_from_another_worker_update_the_index_in_place(two_workers):
+    reader, writer = two_workers
+    assert names(reader.query(role="admin")) == []
+    index = reader._index
+    writer.put("zed", user("zed", role="admin", domain="corp.io"))
+    writer.update("user007", role="admin", disabled=True)
+    writer.update("user008", email="user008@corp.io")
+
+    assert names(reader.query(role="admin")) == ["user007", "zed"]
+    assert names(reader.query(disabled=True)) == ["user007"]
+    assert names(reader.query(email_domain="corp.io")) == ["user008", "zed"]
+    assert names(reader.query(prefix="z")) == ["zed"]
+    assert reader._index is index
+
+
+def test_index_after_compaction_matches_a_fresh_build(tmp_path):
+    path = str(tmp_path / "db_users.json")
+    write_json_atomic(path, [{f"user{i:03d}": user(f"user{i:03d}").to_dict() for i in range(50)}])
+    reader = JournaledUserStore(path, check_interval=0, compact_interval=0)
+    writer = JournaledUserStore(path, check_interval=0, compact_interval=0)
+    reader.query()
+    for i in range(0, 50, 5):
+        writer.update(f"user{i:03d}", role="auditor")
+    writer.put("new", user("new", disabled=True))
+    writer.compact()  # a new snapshot, so the reader loads it from scratch
+    fresh = JsonUserStore(path)
+    for filters in ({"role": "auditor"}, {"disabled": True}, {"disabled": False, "limit": 100}, {"after": "user040"}):
+        assert names(reader.query(**filters)) == names(fresh.query(**filters))
+    for store in (reader, writer, fresh):
+        store.close()
+
+
+def test_removed_users_rebuild_the_index(tmp_path):
+    path = str(tmp_path / "db_users.json")
+    write_json_atomic(path, [{"a": user("a").to_dict(), "b": user("b").to_dict()}])
+    store = JsonUserStore(path, check_interval=0)
+    assert names(store.query()) == ["a", "b"]
+    write_json_atomic(path, [{"b": user("b").to_dict()}])
+    assert names(store.query()) == ["b"]
+    store.close()
@@ -0,0 +1,57 @@
+import pytest
+
+from models import UserInDB, UserRecord
+from storage import create_storage
+
+AMY = {"username": "amy", "email": "amy@example.com", "full_name": "Amy Pond", "role": "admin",
+       "disabled": True, "hashed_password": "hash", "token_version": 3}
+
+
+def test_dict_round_trip():
+    record = UserRecord.from_dict(AMY)
+    assert record.to_dict() == AMY
+    assert UserRecord.from_dict(record.to_dict()).to_dict() == AMY
+
+
+def test_legacy_fields_are_normalized():
+    legacy = {"email": "amy@example.com", "full_name": None, "role": None, "disabled": "False",
+              "hashed_password": "hash"}
+    record = UserRecord.from_dict(legacy, "amy")
+    assert record.to_dict() == {"username": "amy", "email": "amy@example.com", "full_name": "", "role": "user",
+                                "disabled": False, "hashed_password": "hash", "token_version": 0}
+    assert UserRecord.from_dict(dict(legacy, disabled="True"), "amy").disabled is True
+
+
+def test_model_round_trip():
+    model = UserInDB(**AMY)
+    record = UserRecord.from_model(model)
+    assert record.to_dict() == AMY
+    assert UserInDB(**record.to_dict()) == model
+
+
+def test_replace_builds_a_new_record():
+    record = UserRecord.from_dict(AMY)
+    changed = record.replace(hashed_password="new", token_version=4)
+    assert record.to_dict() == AMY
+    assert changed.to_dict() == dict(AMY, hashed_password="new", token_version=4)
+    assert changed.role is record.role  # interned, shared by every record
+
+
+def test_records_have_no_instance_dict():
+    with pytest.raises(AttributeError):
+        UserRecord.from_dict(AMY).extra = 1
+
+
+@pytest.mark.parametrize("backend", ["json", "journal", "sqlite", "sharded"])
+def test_store_round_trip(tmp_path, backend):
+    path = str(tmp_path / ("users.db" if backend == "sqlite" else "users"))
+    store = create_storage(backend, path, shards=4)
+    store.put("amy", UserRecord.from_dict(AMY))
+    store.close()
+
+    reopened = create_storage(backend, path, shards=4)
+    try:
+        assert reopened.get("amy").to_dict() == AMY
+        assert reopened.get_by_email("AMY@example.com").username == "amy"
+    finally:
+        reopened.close()
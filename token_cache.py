@@ -0,0 +1,141 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+class TokenCache:
+    """
+    Bounded LRU + TTL cache of verified bearer tokens.
+
+    Keyed by the SHA-256 of the token, an entry holds the decoded claims and the
+    resolved user so repeat requests skip both the JWT signature check and the
+    user lookup. Entries never outlive the token's own `exp`, and every entry of
+    a user is dropped when that user's password changes or the user is disabled.
+
+    A raised minimum token version is kept for `version_ttl` seconds, the lifetime
+    of an access token: after that every token with an older version has expired
+    anyway, so the entry is dropped and the table only holds recent changes.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 300, version_ttl: float = 900):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.version_ttl = version_ttl
+        self._entries = OrderedDict()  # digest -> (expires_at, claims, user)
+        self._by_user = {}  # username -> set of digests
+        self._generation = 0  # bumped by every invalidation
+        self._min_versions = OrderedDict()  # username -> (lowest token version still accepted, kept until)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.maxsize > 0 and self.ttl > 0
+
+    @staticmethod
+    def _digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def _drop(self, digest):
+        # caller holds self._lock
+        entry = self._entries.pop(digest, None)
+        if entry is not None:
+            username = entry[2].username
+            digests = self._by_user.get(username)
+            if digests is not None:
+                digests.discard(digest)
+                if not digests:
+                    del self._by_user[username]
+        return entry
+
+    def get(self, token: str):
+        """Return (claims, user) for a cached token, or None."""
+        if not self.enabled:
+            return None
+        digest = self._digest(token)
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] <= time.time():
+                self._drop(digest)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def generation(self, username: str) -> int:
+        # read before loading a user; put() ignores the result if any user changed meanwhile.
+        # one counter for all users keeps no per-user state, and invalidations are rare next to lookups
+        return self._generation
+
+    def put(self, token: str, claims: dict, user, generation: int = None):
+        if not self.enabled:
+            return
+        expires_at = time.time() + self.ttl
+        exp = claims.get("exp")
+        if exp is not None:
+            expires_at = min(expires_at, float(exp))
+        digest = self._digest(token)
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._drop(digest)
+            self._entries[digest] = (expires_at, claims, user)
+            self._by_user.setdefault(user.username, set()).add(digest)
+            while len(self._entries) > self.maxsize:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def min_token_version(self, username: str) -> int:
+        entry = self._min_versions.get(username)
+        if entry is None or entry[1] <= time.time():
+            return 0
+        return entry[0]
+
+    def _prune_min_versions(self, now: float):
+        # caller holds self._lock; entries are in the order they expire
+        while self._min_versions:
+            username, (_, until) = next(iter(self._min_versions.items()))
+            if until > now:
+                break
+            del self._min_versions[username]
+
+    def invalidate_user(self, username: str, min_version: int = None):
+        with self._lock:
+            if min_version is not None:
+                now = time.time()
+                self._prune_min_versions(now)
+                previous = self._min_versions.pop(username, (0, 0))[0]
+                self._min_versions[username] = (max(min_version, previous), now + self.version_ttl)
+            self._generation += 1
+            for digest in list(self._by_user.get(username, ())):
+                self._drop(digest)
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
@@ -1,20 +1,276 @@
 from datetime import datetime, timedelta
-from jose import JWTError, jwt
-from passlib.context import CryptContext
-from itsdangerous import URLSafeTimedSerializer
+from dataclasses import dataclass, field
+from keys import KeyRing
 import os
+import threading
+import uuid
 from dotenv import load_dotenv
 
 load_dotenv()
-SECRET_KEY = os.getenv("SECRET_KEY")
-ALGORITHM = os.getenv("ALGORITHM")
-ACCESS_TOKEN_EXPIRE_MINUTES = os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES")
-RESET_PASSWORD_SALT = os.getenv("RESET_PASSWORD_SALT")
-API_BASE = os.getenv("API_BASE")
-smtp_email = os.getenv("smtp_email")
-smtp_passkey = os.getenv("smtp_passkey")
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+_TRUE = ("1", "true", "yes")
+
+# default limits as "count/seconds"; RATE_LIMITS="login_ip=50/60,login_user=10/300" overrides single rules
+DEFAULT_RATE_LIMITS = {
+    "login_ip": "20/60",
+    "login_user": "5/60",
+    "forgot_ip": "5/60",
+    "forgot_user": "3/3600",
+}
+
+
+@dataclass(frozen=True)
+class Settings:
+    """
+    Every setting read from the environment (or .env), parsed and checked once at import.
+    A bad value fails startup with one error listing all problems, instead of surfacing
+    as a ValueError in whichever request first touches it.
+    """
+    secret_key: str | None
+    algorithm: str | None
+    # directory of <kid>.pem keys for RS256/ES256 signing; unset keeps HS256 with SECRET_KEY
+    jwt_keys_dir: str | None
+    access_token_expire_minutes: int
+    refresh_token_expire_days: float
+    reset_password_salt: str | None
+    api_base: str | None
+    smtp_email: str | None
+    smtp_passkey: str | None
+    # user storage backend: "json" (db_users.json), "journal" (db_users.json + append-only journal), "sqlite"
+    # or "sharded" (a directory of segment files)
+    user_storage: str
+    user_db_path: str | None
+    # sharded backend: number of segments a new store directory is created with
+    user_shards: int
+    # JSON backend only: seconds to gather a burst of user changes into one file write, 0 writes every change at once
+    user_store_flush_delay: float
+    # journal backend: fold the journal into the snapshot every N seconds once it holds this many records
+    journal_compact_interval: float
+    journal_compact_threshold: int
+    journal_fsync: bool
+    # password hashing pool: "thread" or "process", size defaults to the number of cores
+    hash_pool_kind: str
+    hash_pool_size: int
+    # hashing jobs allowed to wait or run at once before new ones are rejected with 503
+    hash_queue_limit: int
+    # verified token cache, a size or ttl (seconds) of 0 turns it off
+    token_cache_size: int
+    token_cache_ttl: float
+    # outbound email: "smtp", "file" (writes .eml files to EMAIL_OUTBOX_DIR) or "memory"
+    email_transport: str
+    email_outbox_dir: str
+    email_queue_size: int
+    smtp_host: str
+    smtp_port: int
+    rate_limit_enabled: bool
+    rate_limits: dict = field(default_factory=dict)
+    # password hashing policy: the first scheme hashes new passwords, the others still verify and get
+    # rehashed on the next successful login, as do hashes made with different cost settings
+    password_schemes: tuple = ("bcrypt",)
+    bcrypt_rounds: int = 12
+    argon2_time_cost: int = 3
+    argon2_memory_cost: int = 65536  # KiB
+    argon2_parallelism: int = 4
+    scrypt_rounds: int = 16  # log2 of the scrypt N parameter
+    # set METRICS_ENABLED=false to turn off /metrics and all request/stage instrumentation
+    metrics_enabled: bool = True
+    # "store" loads the user for every authorized request, "claims" authorizes role-gated routes from the JWT alone
+    auth_mode: str = "store"
+    # state shared by all workers (rate limits, refresh tokens, revocations, cache invalidation):
+    # "memory://" for a single worker, "redis://host:port/db" when running several (see serve.py)
+    shared_state_url: str = "memory://"
+    # seconds a password reset link stays valid; each link works once
+    reset_token_max_age: int = 3600
+
+    @classmethod
+    def from_env(cls, env=None) -> "Settings":
+        env = os.environ if env is None else env
+        errors = []
+
+        def number(name, default, kind=int, minimum=0):
+            raw = env.get(name)
+            if raw is None or raw == "":
+                return default
+            try:
+                value = kind(raw)
+            except ValueError:
+                errors.append(f"{name}={raw!r} is not a valid {kind.__name__}")
+                return default
+            if value < minimum:
+                errors.append(f"{name}={raw!r} must be at least {minimum}")
+            return value
+
+        def choice(name, default, choices):
+            value = env.get(name) or default
+            if value not in choices:
+                errors.append(f"{name}={value!r} must be one of {', '.join(choices)}")
+            return value
+
+        def flag(name, default):
+            raw = env.get(name)
+            return default if raw is None or raw == "" else raw.strip().lower() in _TRUE
+
+        rate_limits = dict(DEFAULT_RATE_LIMITS)
+        for item in env.get("RATE_LIMITS", "").split(","):
+            if "=" not in item:
+                continue
+            rule, spec = (part.strip() for part in item.split("=", 1))
+            count, _, seconds = spec.partition("/")
+            if not (count.isdigit() and seconds.replace(".", "", 1).isdigit()):
+                errors.append(f"RATE_LIMITS rule {rule}={spec!r} must look like count/seconds")
+                continue
+            rate_limits[rule] = spec
+
+        password_schemes = tuple(
+            scheme.strip() for scheme in env.get("PASSWORD_SCHEMES", "bcrypt").split(",") if scheme.strip()
+        ) or ("bcrypt",)
+        for scheme in password_schemes:
+            if scheme not in ("bcrypt", "argon2", "scrypt"):
+                errors.append(f"PASSWORD_SCHEMES contains unsupported scheme {scheme!r}")
+
+        secret_key = env.get("SECRET_KEY") or None
+        if secret_key is None:
+            # reset links are always signed with it, access tokens too unless JWT_KEYS_DIR is set
+            errors.append("SECRET_KEY is required")
+        jwt_keys_dir = env.get("JWT_KEYS_DIR") or None
+        if jwt_keys_dir and not os.path.isdir(jwt_keys_dir):
+            errors.append(f"JWT_KEYS_DIR={jwt_keys_dir!r} is not a directory")
+        shared_state_url = env.get("SHARED_STATE_URL") or "memory://"
+        if not shared_state_url.startswith(("memory://", "redis://", "rediss://", "unix://")):
+            errors.append(f"SHARED_STATE_URL={shared_state_url!r} must be memory://, redis://, rediss:// or unix://")
+
+        settings = cls(
+            secret_key=secret_key,
+            algorithm=env.get("ALGORITHM"),
+            jwt_keys_dir=jwt_keys_dir,
+            access_token_expire_minutes=number("ACCESS_TOKEN_EXPIRE_MINUTES", 15, minimum=1),
+            refresh_token_expire_days=number("REFRESH_TOKEN_EXPIRE_DAYS", 7.0, float),
+            reset_password_salt=env.get("RESET_PASSWORD_SALT"),
+            api_base=env.get("API_BASE"),
+            smtp_email=env.get("smtp_email"),
+            smtp_passkey=env.get("smtp_passkey"),
+            user_storage=choice("USER_STORAGE", "json", ("json", "journal", "sqlite", "sharded")),
+            user_db_path=env.get("USER_DB_PATH") or None,
+            user_shards=number("USER_SHARDS", 16, minimum=1),
+            user_store_flush_delay=number("USER_STORE_FLUSH_DELAY", 0.0, float),
+            journal_compact_interval=number("JOURNAL_COMPACT_INTERVAL", 60.0, float),
+            journal_compact_threshold=number("JOURNAL_COMPACT_THRESHOLD", 1000),
+            journal_fsync=flag("JOURNAL_FSYNC", False),
+            hash_pool_kind=choice("HASH_POOL_KIND", "thread", ("thread", "process")),
+            hash_pool_size=number("HASH_POOL_SIZE", os.cpu_count() or 1, minimum=1),
+            hash_queue_limit=number("HASH_QUEUE_LIMIT", 64, minimum=1),
+            token_cache_size=number("TOKEN_CACHE_SIZE", 10000),
+            token_cache_ttl=number("TOKEN_CACHE_TTL", 300.0, float),
+            email_transport=choice("EMAIL_TRANSPORT", "smtp", ("smtp", "file", "memory")),
+            email_outbox_dir=env.get("EMAIL_OUTBOX_DIR") or "outbox",
+            email_queue_size=number("EMAIL_QUEUE_SIZE", 1000, minimum=1),
+            smtp_host=env.get("SMTP_HOST") or "smtp.gmail.com",
+            smtp_port=number("SMTP_PORT", 465, minimum=1),
+            rate_limit_enabled=flag("RATE_LIMIT_ENABLED", True),
+            rate_limits=rate_limits,
+            password_schemes=password_schemes,
+            bcrypt_rounds=number("BCRYPT_ROUNDS", 12, minimum=4),
+            argon2_time_cost=number("ARGON2_TIME_COST", 3, minimum=1),
+            argon2_memory_cost=number("ARGON2_MEMORY_COST", 65536, minimum=8),
+            argon2_parallelism=number("ARGON2_PARALLELISM", 4, minimum=1),
+            scrypt_rounds=number("SCRYPT_ROUNDS", 16, minimum=1),
+            metrics_enabled=flag("METRICS_ENABLED", True),
+            auth_mode=choice("AUTH_MODE", "store", ("store", "claims")),
+            shared_state_url=shared_state_url,
+            reset_token_max_age=number("RESET_TOKEN_MAX_AGE", 3600, minimum=1),
+        )
+        if errors:
+            raise ValueError("Invalid configuration:\n  " + "\n  ".join(errors))
+        return settings
+
+
+settings = Settings.from_env()
+
+# module level names kept for the modules that import them directly
+SECRET_KEY = settings.secret_key
+ALGORITHM = settings.algorithm
+JWT_KEYS_DIR = settings.jwt_keys_dir
+ACCESS_TOKEN_EXPIRE_MINUTES = settings.access_token_expire_minutes
+REFRESH_TOKEN_EXPIRE_DAYS = settings.refresh_token_expire_days
+RESET_PASSWORD_SALT = settings.reset_password_salt
+RESET_TOKEN_MAX_AGE = settings.reset_token_max_age
+API_BASE = settings.api_base
+smtp_email = settings.smtp_email
+smtp_passkey = settings.smtp_passkey
+USER_STORAGE = settings.user_storage
+USER_DB_PATH = settings.user_db_path
+USER_SHARDS = settings.user_shards
+USER_STORE_FLUSH_DELAY = settings.user_store_flush_delay
+JOURNAL_COMPACT_INTERVAL = settings.journal_compact_interval
+JOURNAL_COMPACT_THRESHOLD = settings.journal_compact_threshold
+JOURNAL_FSYNC = settings.journal_fsync
+HASH_POOL_KIND = settings.hash_pool_kind
+HASH_POOL_SIZE = settings.hash_pool_size
+HASH_QUEUE_LIMIT = settings.hash_queue_limit
+TOKEN_CACHE_SIZE = settings.token_cache_size
+TOKEN_CACHE_TTL = settings.token_cache_ttl
+EMAIL_TRANSPORT = settings.email_transport
+EMAIL_OUTBOX_DIR = settings.email_outbox_dir
+EMAIL_QUEUE_SIZE = settings.email_queue_size
+SMTP_HOST = settings.smtp_host
+SMTP_PORT = settings.smtp_port
+RATE_LIMIT_ENABLED = settings.rate_limit_enabled
+RATE_LIMITS = settings.rate_limits
+PASSWORD_SCHEMES = list(settings.password_schemes)
+BCRYPT_ROUNDS = settings.bcrypt_rounds
+ARGON2_TIME_COST = settings.argon2_time_cost
+ARGON2_MEMORY_COST = settings.argon2_memory_cost
+ARGON2_PARALLELISM = settings.argon2_parallelism
+SCRYPT_ROUNDS = settings.scrypt_rounds
+METRICS_ENABLED = settings.metrics_enabled
+AUTH_MODE = settings.auth_mode
+SHARED_STATE_URL = settings.shared_state_url
+
+def build_password_context(schemes=None, bcrypt_rounds=None, argon2_time_cost=None, argon2_memory_cost=None,
+                           argon2_parallelism=None, scrypt_rounds=None):
+    schemes = list(schemes or PASSWORD_SCHEMES)
+    # bcrypt stays verifiable so existing users can still log in after switching schemes
+    if "bcrypt" not in schemes:
+        schemes.append("bcrypt")
+    from passlib.context import CryptContext
+    options = {"bcrypt__rounds": bcrypt_rounds or BCRYPT_ROUNDS}
+    if "argon2" in schemes:
+        options.update({
+            "argon2__type": "ID",
+            "argon2__time_cost": argon2_time_cost or ARGON2_TIME_COST,
+            "argon2__memory_cost": argon2_memory_cost or ARGON2_MEMORY_COST,
+            "argon2__parallelism": argon2_parallelism or ARGON2_PARALLELISM,
+        })
+    if "scrypt" in schemes:
+        options["scrypt__rounds"] = scrypt_rounds or SCRYPT_ROUNDS
+    return CryptContext(schemes=schemes, deprecated="auto", **options)
+
+class LazyPasswordContext:
+    """
+    Stands in for the CryptContext until a password is first hashed or checked, so
+    passlib and the hash backends are not imported at startup.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._context = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        if self._context is None:
+            with self._lock:
+                if self._context is None:
+                    self._context = self._factory()
+        return self._context
+
+    def __getattr__(self, name):
+        return getattr(self.load(), name)
+
+# the one hashing policy used everywhere passwords are hashed or checked
+pwd_context = LazyPasswordContext(build_password_context)
+
+# keys are parsed once here; tokens name their key in the "kid" header
+key_ring = KeyRing(SECRET_KEY, ALGORITHM, JWT_KEYS_DIR)
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
@@ -22,32 +278,13 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+def password_needs_rehash(hashed_password):
+    return pwd_context.needs_update(hashed_password)
+
 def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=15))
     to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-
-
-def generate_reset_token(user_data: str) -> str:
-    
-    """
-    In the context of using itsdangerous.URLSafeTimedSerializer, a salt is an extra string used to namespace or distinguish different kinds of tokens.
-
-    Think of it like a label that says what this token is for — so even if two parts of app generate tokens with the same secret key, the salt ensures they don’t get confused or misused.
-    only tokens generated with "reset-password-salt" can be verified using that salt. It's an extra layer of security and prevents token collisions.
-    """
-    serializer = URLSafeTimedSerializer(SECRET_KEY)
-    return serializer.dumps(
-                            {"email": user_data.email, "username": user_data.username},
-                            salt=RESET_PASSWORD_SALT
-                        )
-
-# Decoding the token
-def verify_reset_token(token: str, expiration: int = 3600) -> str:
-    serializer = URLSafeTimedSerializer(SECRET_KEY)
-    try:
-        decoded_data = serializer.loads(token, salt=RESET_PASSWORD_SALT, max_age=expiration)
-        return decoded_data
-    except Exception:
-        return None
\ No newline at end of file
+    # unique token id, used to revoke a single token
+    to_encode.setdefault("jti", uuid.uuid4().hex)
+    return key_ring.sign(to_encode)